@@ -1,31 +1,68 @@
 #!/usr/bin/env python3
 
-from typing import Annotated, Generator
+from functools import partial
+from typing import (
+    Annotated,
+    Any,
+    AsyncGenerator,
+    BinaryIO,
+    Callable,
+    Generator,
+    TypedDict,
+)
+import asyncio
+import hashlib
 import json
 import logging
 import os
-import subprocess
 import sys
-import tempfile
+import time
 
+from anyio import CapacityLimiter, to_thread
+from cachetools import TTLCache
 from celery.result import AsyncResult
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, Form, HTTPException, Request, Response, UploadFile
+from fastapi import (
+    Depends,
+    FastAPI,
+    Form,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+)
 from fastapi.exception_handlers import request_validation_exception_handler
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
-from sqlmodel import Session, select, func
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlmodel import Session, col, select
+from starlette.datastructures import FormData, UploadFile as StarletteUploadFile
 import sentry_sdk
 
 load_dotenv()
 
-from app.search.helpers import get_default_index_name
 from app.utils.exceptions import before_send
+from app.utils.conversion import decode_audio, get_duration
+from app.utils.fingerprint import (
+    DuplicateIndex,
+    Fingerprint,
+    RecentCall,
+    fingerprint,
+)
+from app.utils.metrics import generate_metrics
 from app.models.database import engine
 from app.models.metadata import Metadata
 from app.utils import storage
 from app import worker
 from app.models import models
+from app.utils.task_status import (
+    FAILED,
+    FINAL_STATUSES,
+    SUCCEEDED,
+    TaskStatus,
+    TaskStatusHub,
+)
+from app.whisper.base import TranscribeOptions
 
 sentry_dsn = os.getenv("SENTRY_DSN")
 if sentry_dsn:
@@ -61,6 +98,110 @@ def get_db() -> Generator[Session, None, None]:
         yield session
 
 
+# Recent calls are only tracked in this process, so run a single API worker for deduplication to catch everything
+duplicate_index = DuplicateIndex(
+    window=float(os.getenv("DEDUP_WINDOW", 30)),
+    threshold=float(os.getenv("DEDUP_THRESHOLD", 0.3)),
+)
+
+
+# Ingest runs its blocking work in these bounded pools instead of FastAPI's shared threadpool,
+# so a burst of uploads can't starve the other endpoints (or /healthz) of threads
+ingest_limiter = CapacityLimiter(int(os.getenv("API_INGEST_CONCURRENCY", 32)))
+db_limiter = CapacityLimiter(int(os.getenv("API_DB_CONCURRENCY", 16)))
+# Publishing draws connections from Celery's producer pool, so don't have more publishing at once than it holds
+publish_limiter = CapacityLimiter(worker.celery.conf.broker_pool_limit or 10)
+
+
+async def run_blocking[T](
+    limiter: CapacityLimiter, func: Callable[..., T], *args: Any
+) -> T:
+    return await to_thread.run_sync(func, *args, limiter=limiter)
+
+
+def get_fingerprint(audio: BinaryIO) -> Fingerprint | None:
+    try:
+        return fingerprint(decode_audio(audio.read()))
+    except Exception as e:
+        logging.warning(f"Could not fingerprint call audio: {repr(e)}")
+        return None
+    finally:
+        audio.seek(0)
+
+
+async def check_duplicate(
+    metadata: Metadata, audio: BinaryIO, owner: object | None = None
+) -> tuple[RecentCall | None, RecentCall | None]:
+    """
+    Look for a copy of this call uploaded by another recorder (e.g. a simulcast site) in the last DEDUP_WINDOW seconds.
+    Returns the call to track, which has to be passed to duplicate_index.finish once it's ingested or failed to be,
+    or the call this is a copy of. Copies wait for the first one to be ingested, so they can be pointed at its task,
+    and are ingested themselves if it fails.
+    """
+    if os.getenv("DEDUP_CALLS", "").lower() != "true":
+        return None, None
+    audio_fingerprint = await run_blocking(ingest_limiter, get_fingerprint, audio)
+    if audio_fingerprint is None:
+        return None, None
+
+    deadline = time.monotonic() + float(os.getenv("DEDUP_WAIT_TIMEOUT", 30))
+    while True:
+        recent_call, is_duplicate = await run_blocking(
+            ingest_limiter,
+            duplicate_index.check_and_add,
+            (metadata["short_name"], metadata["talkgroup"]),
+            metadata["start_time"],
+            audio_fingerprint,
+            owner,
+        )
+        if not is_duplicate:
+            return recent_call, None
+        if owner is not None and recent_call["owner"] is owner:
+            # The first copy is being ingested by the same request, which can't be waited for
+            return None, recent_call
+
+        while not recent_call["done"].is_set() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if recent_call["task_id"]:
+            return None, recent_call
+        if not recent_call["done"].is_set():
+            logging.warning(
+                "Timed out waiting for the first copy of a call to be ingested, ingesting this copy too"
+            )
+            return None, None
+        # The first copy failed, so this one can take its place
+
+
+def save_call(metadata: Metadata, audio_url: str) -> int | None:
+    with Session(engine) as db:
+        call = models.CallCreate(raw_metadata=metadata, raw_audio_url=audio_url)
+        return models.create_call(db=db, call=call).id
+
+
+def get_transcribe_options(metadata: Metadata) -> TranscribeOptions:
+    if "digital" in metadata["audio_type"]:
+        from app.radio.digital import build_transcribe_options
+    elif metadata["audio_type"] == "analog":
+        from app.radio.analog import build_transcribe_options
+    else:
+        raise HTTPException(
+            status_code=400, detail=f"Audio type {metadata['audio_type']} not supported"
+        )
+    return build_transcribe_options(metadata)
+
+
+async def upload_audio(
+    metadata: Metadata, audio: BinaryIO, options: TranscribeOptions
+) -> str:
+    """Upload the audio of a call, telling workers through its options if there's a rendition for them"""
+    audio_url, worker_format = await run_blocking(
+        ingest_limiter, storage.upload_raw_audio_stream, metadata, audio
+    )
+    if worker_format:
+        options["worker_audio_format"] = worker_format
+    return audio_url
+
+
 @app.middleware("http")
 async def authenticate(request: Request, call_next) -> Response:
     api_key = os.getenv("API_KEY", "")
@@ -88,12 +229,18 @@ async def validation_exception_handler(
 
 
 @app.get("/healthz")
-def healthz() -> JSONResponse:
+async def healthz() -> JSONResponse:
     return JSONResponse({"status": "ok"})
 
 
+@app.get("/metrics")
+def metrics() -> Response:
+    content, content_type = generate_metrics()
+    return Response(content=content, media_type=content_type)
+
+
 @app.post("/api/call-upload")
-def create_call_from_sdrtrunk(
+async def create_call_from_sdrtrunk(
     talkgroup: Annotated[int, Form()],
     source: Annotated[int, Form()],
     system: Annotated[int, Form()],
@@ -104,13 +251,11 @@ def create_call_from_sdrtrunk(
     talkgroupLabel: Annotated[str, Form()],
     talkgroupGroup: Annotated[str, Form()],
     audio: UploadFile,
-    db: Session = Depends(get_db),
 ) -> Response:
-    if len(audio.file.read()) <= 44:
+    # Anything up to the size of a WAV header has no audio in it
+    if len(await audio.read(45)) <= 44:
         return Response("Incomplete call data: no audio", status_code=417)
-    else:
-        # Reset file pointer after reading
-        audio.file.seek(0)
+    await audio.seek(0)
 
     if key != os.getenv("API_KEY", None):
         return Response(
@@ -118,29 +263,7 @@ def create_call_from_sdrtrunk(
             status_code=401,
         )
 
-    raw_audio = tempfile.NamedTemporaryFile(delete=False, suffix=f"_{audio.filename}")
-    while True:
-        data = audio.file.read(1024 * 1024)
-        if not data:
-            raw_audio.close()
-            break
-        raw_audio.write(data)
-
-    cmd = [
-        "ffprobe",
-        "-i",
-        raw_audio.file.name,
-        "-show_entries",
-        "format=duration",
-        "-v",
-        "quiet",
-        "-of",
-        "csv=p=0",
-    ]
-
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    result.check_returncode()
-    duration = float(result.stdout.decode("utf-8").strip())
+    duration = await run_blocking(ingest_limiter, get_duration, audio.file)
 
     if duration < float(os.getenv("MIN_CALL_LENGTH", "2")):
         raise HTTPException(status_code=400, detail="Call too short to transcribe")
@@ -178,77 +301,138 @@ def create_call_from_sdrtrunk(
         ],
     }
 
+    recent_call, original = await check_duplicate(metadata, audio.file)
+    if original:
+        return Response("Duplicate call skipped.", status_code=200)
     try:
-        audio_url = storage.upload_raw_audio(metadata, raw_audio.name)
-    finally:
-        os.unlink(raw_audio.name)
-
-    call = models.CallCreate(raw_metadata=metadata, raw_audio_url=audio_url)
-
-    db_call = models.create_call(db=db, call=call)
-
-    if "digital" in metadata["audio_type"]:
-        from app.radio.digital import build_transcribe_options
-    elif metadata["audio_type"] == "analog":
-        from app.radio.analog import build_transcribe_options
-    else:
-        raise HTTPException(
-            status_code=400, detail=f"Audio type {metadata['audio_type']} not supported"
+        options = get_transcribe_options(metadata)
+        audio_url = await upload_audio(metadata, audio.file, options)
+
+        call_id = await run_blocking(db_limiter, save_call, metadata, audio_url)
+
+        task = await run_blocking(
+            publish_limiter,
+            partial(
+                worker.queue_task,
+                audio_url,
+                metadata,
+                options,
+                whisper_implementation=None,
+                id=call_id,
+            ),
         )
-
-    worker.queue_task(
-        audio_url,
-        metadata,
-        build_transcribe_options(metadata),
-        whisper_implementation=None,
-        id=db_call.id,
-    )
+        if recent_call:
+            recent_call["call_id"] = call_id
+            recent_call["task_id"] = task.id
+    finally:
+        if recent_call:
+            duplicate_index.finish(recent_call)
 
     return Response("Call imported successfully.", status_code=200)
 
 
 @app.post("/tasks")
-def queue_for_transcription(
+async def queue_for_transcription(
     call_audio: UploadFile,
     call_json: UploadFile,
     whisper_implementation: str | None = None,
+    batch: bool | None = None,
 ) -> JSONResponse:
-    metadata = json.loads(call_json.file.read())
+    metadata = json.loads(await call_json.read())
 
     if metadata["call_length"] < float(os.getenv("MIN_CALL_LENGTH", "2")):
         raise HTTPException(status_code=400, detail="Call too short to transcribe")
 
-    if "digital" in metadata["audio_type"]:
-        from app.radio.digital import build_transcribe_options
-    elif metadata["audio_type"] == "analog":
-        from app.radio.analog import build_transcribe_options
-    else:
-        raise HTTPException(
-            status_code=400, detail=f"Audio type {metadata['audio_type']} not supported"
-        )
+    options = get_transcribe_options(metadata)
 
-    raw_audio = tempfile.NamedTemporaryFile(
-        delete=False, suffix=f"_{call_audio.filename}"
-    )
-    while True:
-        data = call_audio.file.read(1024 * 1024)
-        if not data:
-            raw_audio.close()
-            break
-        raw_audio.write(data)
+    audio_url = await upload_audio(metadata, call_audio.file, options)
 
-    try:
-        audio_url = storage.upload_raw_audio(metadata, raw_audio.name)
-    finally:
-        os.unlink(raw_audio.name)
-
-    task = worker.queue_task(
-        audio_url, metadata, build_transcribe_options(metadata), whisper_implementation
+    task = await run_blocking(
+        publish_limiter,
+        partial(
+            worker.queue_task,
+            audio_url,
+            metadata,
+            options,
+            whisper_implementation,
+            batch=batch,
+        ),
     )
 
     return JSONResponse({"task_id": task.id}, status_code=201)
 
 
+# Follows task status events from the workers for /tasks/stream
+task_status_hub = TaskStatusHub(
+    worker.celery, ttl=float(os.getenv("TASK_STATUS_TTL", 3600))
+)
+
+
+def get_final_status(task_id: str) -> TaskStatus | None:
+    """Look up a task that may have finished before this process was following it"""
+    task_result: AsyncResult = AsyncResult(task_id, app=worker.celery)
+    if task_result.state == "SUCCESS":
+        return {"task_id": task_id, "status": SUCCEEDED}
+    if task_result.state == "FAILURE":
+        return {"task_id": task_id, "status": FAILED, "error": repr(task_result.result)}
+    return None
+
+
+@app.get("/tasks/stream")
+async def stream_status(task_id: Annotated[list[str], Query()]) -> StreamingResponse:
+    """
+    Stream the status of one or more tasks as server-sent events until they've all succeeded or failed,
+    instead of polling /tasks/{task_id}. Each event is JSON with the task_id and its status: queued,
+    transcribing, post-processing, indexed, succeeded or failed (with an error). Streams end with a timeout
+    event listing the tasks that are still pending after TASK_STATUS_STREAM_TIMEOUT seconds.
+    """
+    task_ids = list(dict.fromkeys(task_id))
+    queue = task_status_hub.subscribe(task_ids)
+    keepalive = float(os.getenv("TASK_STATUS_KEEPALIVE", 15))
+    deadline = time.monotonic() + float(os.getenv("TASK_STATUS_STREAM_TIMEOUT", 3600))
+
+    async def check_backend(ids: list[str]) -> None:
+        for id in ids:
+            status = await to_thread.run_sync(get_final_status, id)
+            if status:
+                queue.put_nowait(status)
+
+    async def events() -> AsyncGenerator[str, None]:
+        try:
+            await check_backend(
+                [id for id in task_ids if not task_status_hub.is_known(id)]
+            )
+
+            pending = set(task_ids)
+            while pending:
+                timeout = min(keepalive, deadline - time.monotonic())
+                if timeout <= 0:
+                    # Unknown or expired tasks would never finish, so don't hold the connection forever
+                    yield f"event: timeout\ndata: {json.dumps({'task_ids': sorted(pending)})}\n\n"
+                    break
+                try:
+                    status = await asyncio.wait_for(queue.get(), timeout=timeout)
+                except TimeoutError:
+                    # Keep proxies from closing the connection while a call waits in the queue
+                    yield ": keepalive\n\n"
+                    # and catch tasks that finished before the hub was receiving their events
+                    await check_backend(sorted(pending))
+                    continue
+                if status["task_id"] not in pending:
+                    continue
+                yield f"event: status\ndata: {json.dumps(status)}\n\n"
+                if status["status"] in FINAL_STATUSES:
+                    pending.discard(status["task_id"])
+        finally:
+            task_status_hub.unsubscribe(task_ids, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/tasks/{task_id}")
 def get_status(task_id: str) -> JSONResponse:
     task_result: AsyncResult = AsyncResult(task_id, app=worker.celery)
@@ -266,15 +450,56 @@ def get_status(task_id: str) -> JSONResponse:
 
 @app.get("/calls/", response_model=models.CallsPublic)
 def read_calls(
-    skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
+    cursor: str | None = None,
+    limit: int = 100,
+    order: models.CallOrder = "id",
+    short_name: str | None = None,
+    talkgroup: int | None = None,
+    start_time_from: int | None = None,
+    start_time_to: int | None = None,
+    talkgroup_tag: str | None = None,
+    audio_type: str | None = None,
+    transcript: str | None = None,
+    count: models.CountMode = "estimate",
+    skip: int = 0,
+    db: Session = Depends(get_db),
 ) -> models.CallsPublic:
-    count_statement = select(func.count()).select_from(models.Call)
-    count = db.exec(count_statement).one()
-
-    statement = select(models.Call).offset(skip).limit(limit)
-    calls = db.exec(statement).all()
-
-    return models.CallsPublic(data=calls, count=count)
+    filters: models.CallFilters = {}
+    if short_name is not None:
+        filters["short_name"] = short_name
+    if talkgroup is not None:
+        filters["talkgroup"] = talkgroup
+    if start_time_from is not None:
+        filters["start_time_from"] = start_time_from
+    if start_time_to is not None:
+        filters["start_time_to"] = start_time_to
+    if talkgroup_tag is not None:
+        filters["talkgroup_tag"] = talkgroup_tag
+    if audio_type is not None:
+        filters["audio_type"] = audio_type
+    if transcript:
+        filters["transcript"] = transcript
+
+    if skip and not cursor:
+        # Deprecated, since OFFSET has to read through every skipped call
+        statement = models.filter_calls(select(models.Call), filters)
+        calls = list(
+            db.exec(
+                statement.order_by(col(models.Call.id)).offset(skip).limit(limit)
+            ).all()
+        )
+        next_cursor = None
+    else:
+        try:
+            calls, next_cursor = models.get_calls(db, filters, order, cursor, limit)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return models.CallsPublic(
+        data=calls,
+        count=models.count_calls(db, filters, count),
+        next_cursor=next_cursor,
+    )
 
 
 @app.get("/calls/{call_id}", response_model=models.CallPublic)
@@ -286,63 +511,255 @@ def read_call(call_id: int, db: Session = Depends(get_db)) -> models.Call:
 
 
 @app.post("/calls")
-def create_call(
+async def create_call(
     call_json: UploadFile,
     call_audio_url: Annotated[str, Form()] | None = None,
     call_audio: UploadFile | None = None,
-    db: Session = Depends(get_db),
     whisper_implementation: str | None = None,
-    batch: bool = False,
+    batch: bool | None = None,
 ) -> JSONResponse:
-    metadata = json.loads(call_json.file.read())
+    metadata = json.loads(await call_json.read())
 
     if metadata["call_length"] < float(os.getenv("MIN_CALL_LENGTH", "2")):
         raise HTTPException(status_code=400, detail="Call too short to transcribe")
 
-    if "digital" in metadata["audio_type"]:
-        from app.radio.digital import build_transcribe_options
-    elif metadata["audio_type"] == "analog":
-        from app.radio.analog import build_transcribe_options
-    else:
-        raise HTTPException(
-            status_code=400, detail=f"Audio type {metadata['audio_type']} not supported"
-        )
+    options = get_transcribe_options(metadata)
 
+    recent_call = None
     if call_audio:
-        raw_audio = tempfile.NamedTemporaryFile(
-            delete=False, suffix=f"_{call_audio.filename}"
-        )
-        while True:
-            data = call_audio.file.read(1024 * 1024)
-            if not data:
-                raw_audio.close()
-                break
-            raw_audio.write(data)
-
-        try:
-            audio_url = storage.upload_raw_audio(metadata, raw_audio.name)
-        finally:
-            os.unlink(raw_audio.name)
+        recent_call, original = await check_duplicate(metadata, call_audio.file)
+        if original:
+            # Point the client at the copy that is already being transcribed
+            return JSONResponse(
+                {"task_id": original["task_id"], "duplicate_of": original["call_id"]},
+                status_code=200,
+            )
     elif call_audio_url:
+        # Calls that are already uploaded would have to be downloaded to be fingerprinted, so aren't deduplicated
         audio_url = call_audio_url
     else:
         raise HTTPException(status_code=400, detail="No audio provided")
 
-    call = models.CallCreate(raw_metadata=metadata, raw_audio_url=audio_url)
+    try:
+        if call_audio:
+            audio_url = await upload_audio(metadata, call_audio.file, options)
+
+        call_id = await run_blocking(db_limiter, save_call, metadata, audio_url)
+
+        task = await run_blocking(
+            publish_limiter,
+            partial(
+                worker.queue_task,
+                audio_url,
+                metadata,
+                options,
+                whisper_implementation,
+                call_id,
+                batch=batch,
+            ),
+        )
+        if recent_call:
+            recent_call["call_id"] = call_id
+            recent_call["task_id"] = task.id
+    finally:
+        if recent_call:
+            duplicate_index.finish(recent_call)
+
+    return JSONResponse(
+        {"task_id": task.id},
+        status_code=201,
+    )
+
+
+class BatchCallResult(TypedDict, total=False):
+    # queued, duplicate or error
+    status: str
+    call_id: int
+    task_id: str | None
+    duplicate_of: int | None
+    error: str
+
+
+class BatchCall(TypedDict):
+    metadata: Metadata
+    options: TranscribeOptions
+    audio_url: str
+    recent_call: RecentCall | None
+
+
+async def ingest_batch_call(
+    item: dict, form: FormData, owner: object
+) -> tuple[BatchCall | None, BatchCallResult, RecentCall | None]:
+    """
+    Validate and upload one call of a batch, returning it to be saved or why it won't be,
+    and the call it's a copy of if it's a duplicate
+    """
+    recent_call: RecentCall | None = None
+    uploaded = False
+    try:
+        metadata = item["metadata"]
+        if metadata["call_length"] < float(os.getenv("MIN_CALL_LENGTH", "2")):
+            raise HTTPException(status_code=400, detail="Call too short to transcribe")
+        options = get_transcribe_options(metadata)
+
+        audio = form.get(item["audio"]) if item.get("audio") else None
+        if isinstance(audio, StarletteUploadFile):
+            recent_call, original = await check_duplicate(metadata, audio.file, owner)
+            if original:
+                return None, {"status": "duplicate"}, original
+            audio_url = await upload_audio(metadata, audio.file, options)
+        elif item.get("audio_url"):
+            audio_url = item["audio_url"]
+        else:
+            raise HTTPException(status_code=400, detail="No audio provided")
+        uploaded = True
+    except HTTPException as e:
+        return None, {"status": "error", "error": e.detail}, None
+    except Exception as e:
+        logging.exception("Could not ingest call in batch")
+        return None, {"status": "error", "error": repr(e)}, None
+    finally:
+        if recent_call and not uploaded:
+            duplicate_index.finish(recent_call)
+
+    call: BatchCall = {
+        "metadata": metadata,
+        "options": options,
+        "audio_url": audio_url,
+        "recent_call": recent_call,
+    }
+    return call, {"status": "queued"}, None
+
+
+def save_calls(calls: list[BatchCall]) -> list[int]:
+    with Session(engine) as db:
+        return models.create_calls(
+            db,
+            [
+                models.CallCreate(
+                    raw_metadata=call["metadata"], raw_audio_url=call["audio_url"]
+                )
+                for call in calls
+            ],
+        )
 
-    db_call = models.create_call(db=db, call=call)
 
-    task = worker.queue_task(
-        audio_url,
-        metadata,
-        build_transcribe_options(metadata),
-        whisper_implementation,
-        db_call.id,
+def queue_tasks(
+    calls: list[tuple[int, BatchCall]],
+    whisper_implementation: str | None,
+    batch: bool | None,
+) -> list[AsyncResult | Exception]:
+    """Publish the tasks for every call over one broker connection"""
+    results: list[AsyncResult | Exception] = []
+    with worker.celery.connection_for_write() as connection:
+        for call_id, call in calls:
+            try:
+                results.append(
+                    worker.queue_task(
+                        call["audio_url"],
+                        call["metadata"],
+                        call["options"],
+                        whisper_implementation,
+                        call_id,
+                        batch=batch,
+                        connection=connection,
+                    )
+                )
+            except Exception as e:
+                logging.exception("Could not queue call in batch")
+                results.append(e)
+    return results
+
+
+@app.post("/calls/batch")
+async def create_calls(
+    request: Request,
+    calls: Annotated[str, Form()],
+    whisper_implementation: str | None = None,
+    batch: bool | None = None,
+) -> JSONResponse:
+    """
+    Create many calls at once. calls is a JSON list with the metadata of each call, and either the name of
+    the form field with its audio (audio) or where it's already uploaded (audio_url):
+    [{"metadata": {...}, "audio": "call_audio_0"}, {"metadata": {...}, "audio_url": "https://..."}]
+    Audio is uploaded concurrently, the calls are inserted in one statement and their tasks are published
+    over one broker connection. The response has the status of each call in the same order.
+    """
+    try:
+        items = json.loads(calls)
+    except ValueError:
+        items = None
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise HTTPException(status_code=422, detail="calls must be a JSON list")
+    max_size = int(os.getenv("CALLS_BATCH_MAX_SIZE", 100))
+    if len(items) > max_size:
+        raise HTTPException(
+            status_code=413, detail=f"Batches can have at most {max_size} calls"
+        )
+
+    form = await request.form()
+    # Copies of a call in the same batch can't wait for it to be ingested, so are told apart by this
+    owner = object()
+    ingested = await asyncio.gather(
+        *(ingest_batch_call(item, form, owner) for item in items)
     )
+    results = [result for _, result, _ in ingested]
+    to_save = [(i, call) for i, (call, _, _) in enumerate(ingested) if call]
+
+    try:
+        call_ids: list[int] = []
+        if to_save:
+            try:
+                call_ids = await run_blocking(
+                    db_limiter, save_calls, [call for _, call in to_save]
+                )
+            except Exception as e:
+                logging.exception("Could not save calls in batch")
+                for i, _ in to_save:
+                    results[i] = {"status": "error", "error": repr(e)}
+
+        if call_ids:
+            tasks = await run_blocking(
+                publish_limiter,
+                queue_tasks,
+                [(call_id, call) for call_id, (_, call) in zip(call_ids, to_save)],
+                whisper_implementation,
+                batch,
+            )
+            for call_id, (i, call), task in zip(call_ids, to_save, tasks):
+                results[i]["call_id"] = call_id
+                if isinstance(task, Exception):
+                    results[i].update({"status": "error", "error": repr(task)})
+                    continue
+                results[i]["task_id"] = task.id
+                recent_call = call["recent_call"]
+                if recent_call:
+                    recent_call["call_id"] = call_id
+                    recent_call["task_id"] = task.id
+    finally:
+        # Calls that weren't queued are forgotten, so retrying the batch doesn't skip them as duplicates
+        for _, call in to_save:
+            if call["recent_call"]:
+                duplicate_index.finish(call["recent_call"])
+
+    for i, (_, _, original) in enumerate(ingested):
+        if not original:
+            continue
+        if original["task_id"]:
+            results[i].update(
+                {"task_id": original["task_id"], "duplicate_of": original["call_id"]}
+            )
+        else:
+            results[i] = {
+                "status": "error",
+                "error": "Copy of a call in the batch that failed",
+            }
 
     return JSONResponse(
-        {"task_id": task.id},
-        status_code=201,
+        {"calls": results},
+        status_code=201
+        if all(result["status"] == "queued" for result in results)
+        else 207,
     )
 
 
@@ -357,10 +774,24 @@ def update_call(
     return models.update_call(db=db, call=call, db_call=db_call)
 
 
+# Talkgroups only change when a new one shows up or one is renamed, so serve them from memory
+talkgroups_cache: TTLCache[str, tuple[bytes, str]] = TTLCache(
+    maxsize=1, ttl=float(os.getenv("TALKGROUPS_CACHE_TTL", 300))
+)
+
+
 @app.get("/talkgroups")
-def talkgroups(db: Session = Depends(get_db)) -> JSONResponse:
-    tgs = models.get_talkgroups(db, get_default_index_name())
-    return JSONResponse({"talkgroups": tgs})
+def talkgroups(request: Request, db: Session = Depends(get_db)) -> Response:
+    if "talkgroups" not in talkgroups_cache:
+        body = json.dumps({"talkgroups": models.get_talkgroups(db)}).encode()
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        talkgroups_cache["talkgroups"] = (body, etag)
+    body, etag = talkgroups_cache["talkgroups"]
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @app.get("/config/{filename}")
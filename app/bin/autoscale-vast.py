@@ -86,6 +86,13 @@ class Autoscaler:
 
         if os.getenv("SENTRY_DSN"):
             self.envs["SENTRY_DSN"] = os.getenv("SENTRY_DSN", "")
+        # Workers report when they've finished preloading, so scaling up waits for them
+        for key in ["WHISPER_PRELOAD", "WHISPER_PRELOAD_IMPLEMENTATIONS"]:
+            if os.getenv(key):
+                self.envs[key] = os.getenv(key, "")
+        self.envs["WORKER_READY_FILE"] = os.getenv(
+            "WORKER_READY_FILE", "/tmp/worker-ready"
+        )
 
         cuda_version = os.getenv("CUDA_VERSION", "12.1.0")
         cuda_version_matches = re.match(r"(\d+)\.(\d+)\.(\d+)", cuda_version)
@@ -172,6 +179,16 @@ class Autoscaler:
                 workers.append({"name": name, "stats": stats})
         return workers
 
+    def get_loading_workers(self) -> list[str]:
+        """Workers that are online but still preloading models"""
+        replies = worker.celery.control.broadcast("ready", reply=True, timeout=10)
+        return [
+            name
+            for reply in replies
+            for name, status in reply.items()
+            if not status.get("ready", True)
+        ]
+
     def get_queue_status(self) -> dict:
         broker_api = os.getenv("FLOWER_BROKER_API")
         url = f"{broker_api}queues/%2F/{worker.CELERY_GPU_QUEUE}"
@@ -469,6 +486,13 @@ class Autoscaler:
         target_instances = min(max(needed_instances, self.min), self.max)
 
         if target_instances > current_instances:
+            # The backlog won't start going down until new workers have loaded their models
+            loading_workers = self.get_loading_workers()
+            if loading_workers:
+                logging.info(
+                    f"Waiting for {len(loading_workers)} workers to finish loading before scaling up"
+                )
+                return 0
             return self.create_instances(target_instances - current_instances)
         if target_instances < current_instances:
             return -self.delete_instances(current_instances - target_instances)
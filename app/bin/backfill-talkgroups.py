@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+import argparse
+import logging
+import os
+
+from dotenv import load_dotenv
+from sqlmodel import Session
+
+# Load the .env file of our choice if specified before the regular .env can load
+load_dotenv(os.getenv("ENV"))
+
+from app.models import models
+from app.models.database import engine
+
+parser = argparse.ArgumentParser(
+    description="Build the talkgroup catalog served by /talkgroups from the calls already in the database"
+)
+parser.add_argument(
+    "--verbose", "-v", action="store_true", help="Print the talkgroups found"
+)
+
+
+def main():
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    with Session(engine) as db:
+        count = models.backfill_talkgroups(db)
+        logging.info(f"Talkgroup catalog has {count} talkgroups")
+        if args.verbose:
+            for talkgroup in models.get_talkgroups(db):
+                logging.info(
+                    f"{talkgroup['short_name']} {talkgroup['talkgroup']} {talkgroup['talkgroup_tag']}: {talkgroup['call_count']} calls"
+                )
+
+
+if __name__ == "__main__":
+    main()
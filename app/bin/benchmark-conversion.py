@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import time
+from typing import Callable
+
+from app.models.metadata import Metadata
+from app.utils.conversion import (
+    MP3_FORMAT,
+    OGG_FORMAT,
+    WAV_FORMAT,
+    OutputFormat,
+    _build_ffmpeg_args,
+    _convert_file,
+    _encode_file,
+)
+
+FORMATS: dict[str, OutputFormat] = {
+    "wav": WAV_FORMAT,
+    "mp3": MP3_FORMAT,
+    "ogg": OGG_FORMAT,
+}
+
+parser = argparse.ArgumentParser(
+    description="Compare converting calls in process with PyAV against starting ffmpeg for each call"
+)
+parser.add_argument(
+    "audio_files",
+    nargs="*",
+    help="WAV files to convert, with a JSON metadata file next to each one (defaults to tests/data)",
+)
+parser.add_argument(
+    "--iterations", type=int, default=10, help="Times to convert each file"
+)
+parser.add_argument(
+    "--formats",
+    default=",".join(FORMATS),
+    help="Comma separated formats to convert to",
+)
+
+
+def get_cpu_time() -> float:
+    # ffmpeg runs in child processes, so count their CPU time too
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def benchmark(
+    convert: Callable[[str, str, OutputFormat, Metadata | None], str],
+    calls: list[tuple[str, Metadata]],
+    format: str,
+    iterations: int,
+) -> tuple[float, float]:
+    """Return calls converted per second and CPU seconds per call"""
+    start_time = time.perf_counter()
+    start_cpu = get_cpu_time()
+    for _ in range(iterations):
+        for audio_file, metadata in calls:
+            os.remove(
+                convert(
+                    audio_file,
+                    format,
+                    FORMATS[format],
+                    None if format == "wav" else metadata,
+                )
+            )
+    elapsed = time.perf_counter() - start_time
+    cpu = get_cpu_time() - start_cpu
+    count = len(calls) * iterations
+    return count / elapsed, cpu / count
+
+
+def convert_ffmpeg(
+    audio_file: str,
+    format: str,
+    output_format: OutputFormat,
+    metadata: Metadata | None = None,
+) -> str:
+    return _convert_file(
+        audio_file, format, _build_ffmpeg_args(output_format), metadata
+    )
+
+
+def main():
+    args = parser.parse_args()
+
+    calls = []
+    for audio_file in args.audio_files or sorted(glob.glob("tests/data/*.wav")):
+        with open(os.path.splitext(audio_file)[0] + ".json") as file:
+            calls.append((audio_file, json.load(file)))
+
+    engines = {"av": _encode_file}
+    if shutil.which("ffmpeg"):
+        engines["ffmpeg"] = convert_ffmpeg
+    else:
+        print("ffmpeg not found, only benchmarking PyAV")
+
+    print(f"{'format':<8}{'engine':<8}{'calls/sec':>12}{'CPU ms/call':>14}")
+    for format in args.formats.split(","):
+        for engine, convert in engines.items():
+            calls_per_second, cpu_per_call = benchmark(
+                convert, calls, format, args.iterations
+            )
+            print(
+                f"{format:<8}{engine:<8}{calls_per_second:>12.1f}{cpu_per_call * 1000:>14.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
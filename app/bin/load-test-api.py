@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+parser = argparse.ArgumentParser(
+    description="Upload calls to a running API concurrently and report throughput and latency"
+)
+parser.add_argument(
+    "audio_files",
+    nargs="*",
+    help="WAV files to upload, with a JSON metadata file next to each one (defaults to tests/data)",
+)
+parser.add_argument(
+    "--api-base-url",
+    default=os.getenv("API_BASE_URL", "http://localhost:8000"),
+    help="URL of the API server",
+)
+parser.add_argument(
+    "--endpoint",
+    choices=["calls", "tasks"],
+    default="calls",
+    help="Endpoint to upload calls to",
+)
+parser.add_argument(
+    "--requests", type=int, default=200, help="Number of calls to upload"
+)
+parser.add_argument(
+    "--concurrency", type=int, default=32, help="Uploads to have in flight at once"
+)
+
+
+def percentile(latencies: list[float], percent: int) -> float:
+    if len(latencies) < 2:
+        return latencies[0] if latencies else 0
+    return statistics.quantiles(latencies, n=100)[percent - 1]
+
+
+def upload(
+    session: requests.Session,
+    url: str,
+    audio_file: str,
+    metadata: dict,
+    i: int,
+) -> tuple[float, int]:
+    # Move each call far enough apart that the API doesn't skip them as duplicates
+    metadata = {
+        **metadata,
+        "start_time": metadata["start_time"] + i * 3600,
+        "stop_time": metadata["stop_time"] + i * 3600,
+    }
+    start = time.perf_counter()
+    with open(audio_file, "rb") as audio:
+        r = session.post(
+            url,
+            files={
+                "call_audio": audio,
+                "call_json": ("call.json", json.dumps(metadata)),
+            },
+        )
+    return time.perf_counter() - start, r.status_code
+
+
+def poll_healthz(
+    session: requests.Session, url: str, done: threading.Event
+) -> list[float]:
+    # Shows whether uploads are holding up requests that should be instant
+    latencies = []
+    while not done.is_set():
+        start = time.perf_counter()
+        session.get(url)
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.1)
+    return latencies
+
+
+def main():
+    args = parser.parse_args()
+
+    calls = []
+    for audio_file in args.audio_files or sorted(glob.glob("tests/data/*.wav")):
+        with open(os.path.splitext(audio_file)[0] + ".json") as file:
+            calls.append((audio_file, json.load(file)))
+
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {os.getenv('API_KEY', '')}"
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency + 1)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    url = f"{args.api_base_url}/{args.endpoint}"
+
+    done = threading.Event()
+    with ThreadPoolExecutor(args.concurrency + 1) as executor:
+        healthz = executor.submit(
+            poll_healthz, session, f"{args.api_base_url}/healthz", done
+        )
+        start = time.perf_counter()
+        results = list(
+            executor.map(
+                lambda i: upload(session, url, *calls[i % len(calls)], i),
+                range(args.requests),
+            )
+        )
+        elapsed = time.perf_counter() - start
+        done.set()
+        healthz_latencies = healthz.result()
+
+    latencies = [latency for latency, _ in results]
+    errors = sum(1 for _, status in results if status >= 400)
+    print(f"{args.requests} uploads to /{args.endpoint} in {elapsed:.1f}s")
+    print(f"requests/sec: {args.requests / elapsed:.1f}")
+    print(
+        f"latency ms: p50 {percentile(latencies, 50) * 1000:.0f}, p99 {percentile(latencies, 99) * 1000:.0f}"
+    )
+    print(
+        f"/healthz latency ms: p50 {percentile(healthz_latencies, 50) * 1000:.0f}, p99 {percentile(healthz_latencies, 99) * 1000:.0f}"
+    )
+    if errors:
+        print(f"errors: {errors}")
+
+
+if __name__ == "__main__":
+    main()
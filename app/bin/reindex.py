@@ -20,6 +20,7 @@ from app.models.metadata import Metadata
 from app.models.transcript import Transcript
 from app.search import helpers
 from app.search.adapters import MeilisearchAdapter, SearchAdapter, TypesenseAdapter
+from app.utils.circuit_breaker import CircuitOpenException
 
 
 class SrcListItemUpdate(TypedDict):
@@ -89,7 +90,11 @@ def update_document(
             geo_formatted_address=document["geo_formatted_address"],
         )
     elif should_lookup_geo:
-        geo = lookup_geo(metadata, transcript)
+        try:
+            geo = lookup_geo(metadata, transcript)
+        except CircuitOpenException as e:
+            logging.warning(f"Skipping geocoding: {e}")
+            geo = None
     else:
         geo = None
 
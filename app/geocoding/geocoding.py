@@ -14,6 +14,8 @@ from app.models.metadata import Metadata
 from app.models.transcript import Transcript
 from app.geocoding import llm
 from app.geocoding.types import AddressParts, GeoResponse
+from app.utils.circuit_breaker import CircuitOpenException, get_breaker
+from app.utils.metrics import time_stage
 
 
 def build_address_regex(include_intersections: bool = True) -> str:
@@ -228,8 +230,15 @@ def geocode(
 
 
 def lookup_geo(
-    metadata: Metadata, transcript: Transcript, geocoder: str | None = None
+    metadata: Metadata,
+    transcript: Transcript,
+    geocoder: str | None = None,
+    use_llm: bool = True,
 ) -> GeoResponse | None:
+    """
+    Find the location mentioned in a call, if any.
+    Raises CircuitOpenException while the geocoder is down, so the lookup can be tried again later.
+    """
     geocoding_systems = os.getenv("GEOCODING_ENABLED_SYSTEMS", "")
     if geocoding_systems == "*" or metadata["short_name"] in filter(
         lambda name: len(name), geocoding_systems.split(",")
@@ -247,17 +256,21 @@ def lookup_geo(
         else:
             default_address_parts["bounds"] = None
 
-        llm_model = llm.create_model()
+        llm_model = llm.create_model() if use_llm else None
 
         transcript_txt = transcript.txt_nosrc
 
         address_parts: AddressParts = default_address_parts.copy()
         # TODO: how can we extract the city and state from the metadata?
-        address_parts["address"] = extract_address(transcript_txt)
+        with time_stage("geocoding_regex"):
+            address_parts["address"] = extract_address(transcript_txt)
         if address_parts["address"]:
             logging.debug(f"Extracted address with regex: {address_parts['address']}")
             try:
-                geo = geocode(address_parts, geocoder=geocoder)
+                with time_stage("geocoder"):
+                    geo = get_breaker("geocoder").call(
+                        geocode, address_parts, geocoder=geocoder
+                    )
             except Exception:
                 geo = None
             if geo:
@@ -269,14 +282,20 @@ def lookup_geo(
             and re.search(r"[0-9]", transcript_txt)
             and len(transcript_txt) > 20
         ):
-            result = llm.extract_address(llm_model, transcript_txt, metadata)
+            with time_stage("geocoding_llm"):
+                result = llm.extract_address(llm_model, transcript_txt, metadata)
             if result:
                 logging.debug(f"LLM extracted address: {result}")
                 address_parts.update(result)
 
         if address_parts["address"]:
             try:
-                return geocode(address_parts, geocoder=geocoder)
+                with time_stage("geocoder"):
+                    return get_breaker("geocoder").call(
+                        geocode, address_parts, geocoder=geocoder
+                    )
+            except CircuitOpenException:
+                raise
             except Exception as e:
                 sentry_sdk.capture_exception(e)
                 logging.error(f"Got exception while geocoding: {repr(e)}", exc_info=e)
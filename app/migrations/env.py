@@ -0,0 +1,39 @@
+from logging.config import fileConfig
+import os
+
+from alembic import context
+from dotenv import load_dotenv
+from sqlmodel import SQLModel
+
+# Load the .env file of our choice if specified before the regular .env can load
+load_dotenv(os.getenv("ENV"))
+
+from app.models import models  # noqa: F401 - registers the tables on SQLModel.metadata
+from app.models.database import engine
+
+if context.config.config_file_name is not None:
+    fileConfig(context.config.config_file_name)
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=engine.url.render_as_string(hide_password=False),
+        target_metadata=SQLModel.metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=SQLModel.metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,52 @@
+"""calls
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-15 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases created from docker/init-db.sql before migrations existed already have these
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS calls (
+            id serial PRIMARY KEY,
+            raw_metadata jsonb,
+            raw_audio_url text,
+            raw_transcript jsonb,
+            geo jsonb
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS calls_start_time_idx
+        ON calls ((CAST(raw_metadata ->> 'start_time' AS BIGINT)), id)
+        """
+    )
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS calls_talkgroup_start_time_idx ON calls (
+            (raw_metadata ->> 'short_name'),
+            (CAST(raw_metadata ->> 'talkgroup' AS INTEGER)),
+            (CAST(raw_metadata ->> 'start_time' AS BIGINT)),
+            id
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("calls")
@@ -0,0 +1,37 @@
+"""talkgroups
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-15 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "talkgroups",
+        sa.Column("short_name", sa.Text(), nullable=False),
+        sa.Column("talkgroup", sa.Integer(), nullable=False),
+        sa.Column("talkgroup_group", sa.Text(), nullable=False, server_default=""),
+        sa.Column("talkgroup_tag", sa.Text(), nullable=False, server_default=""),
+        sa.Column("first_seen", sa.BigInteger(), nullable=False),
+        sa.Column("last_seen", sa.BigInteger(), nullable=False),
+        sa.Column("call_count", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.PrimaryKeyConstraint("short_name", "talkgroup"),
+    )
+    # Fill the catalog from existing calls with app/bin/backfill-talkgroups.py
+
+
+def downgrade() -> None:
+    op.drop_table("talkgroups")
@@ -0,0 +1,101 @@
+"""call columns
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-15 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Kept in sync with Call in app/models/models.py
+COLUMNS = {
+    "start_time": "BIGINT GENERATED ALWAYS AS (CAST(raw_metadata ->> 'start_time' AS BIGINT)) STORED",
+    "short_name": "TEXT GENERATED ALWAYS AS (raw_metadata ->> 'short_name') STORED",
+    "talkgroup": "INTEGER GENERATED ALWAYS AS (CAST(raw_metadata ->> 'talkgroup' AS INTEGER)) STORED",
+    "talkgroup_tag": "TEXT GENERATED ALWAYS AS (raw_metadata ->> 'talkgroup_tag') STORED",
+    "audio_type": "TEXT GENERATED ALWAYS AS (raw_metadata ->> 'audio_type') STORED",
+    # The text of each transmission, for searching transcripts with a trigram index
+    "transcript_plaintext": "TEXT GENERATED ALWAYS AS (CAST(jsonb_path_query_array(raw_transcript, '$[*][1]') AS TEXT)) STORED",
+}
+
+
+def upgrade() -> None:
+    # Adding stored columns rewrites the table while holding an exclusive lock on calls,
+    # so on large databases run this by hand while calls aren't coming in (see README.md)
+    op.execute(
+        "ALTER TABLE calls "
+        + ", ".join(
+            f"ADD COLUMN IF NOT EXISTS {name} {definition}"
+            for name, definition in COLUMNS.items()
+        )
+    )
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Build the indexes without blocking writes, which can't be done inside a transaction.
+    # If a build fails this revision isn't recorded, so everything here can be re-run (after
+    # dropping the invalid index the failed build leaves behind)
+    with op.get_context().autocommit_block():
+        # Replaced by indexes on the columns
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS calls_start_time_idx")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS calls_talkgroup_start_time_idx")
+
+        # Calls are mostly inserted in order, so a BRIN index covers time ranges in a tiny fraction of the space
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS calls_start_time_brin ON calls USING brin (start_time)"
+        )
+        # For ordering and paging by time
+        op.create_index(
+            "calls_start_time_id",
+            "calls",
+            ["start_time", "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "calls_talkgroup_start_time",
+            "calls",
+            ["short_name", "talkgroup", "start_time", "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "calls_talkgroup_tag_start_time",
+            "calls",
+            ["talkgroup_tag", "start_time"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS calls_transcript_plaintext_trgm ON calls USING gin (transcript_plaintext gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    op.execute(
+        "ALTER TABLE calls " + ", ".join(f"DROP COLUMN {name}" for name in COLUMNS)
+    )
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS calls_start_time_idx
+        ON calls ((CAST(raw_metadata ->> 'start_time' AS BIGINT)), id)
+        """
+    )
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS calls_talkgroup_start_time_idx ON calls (
+            (raw_metadata ->> 'short_name'),
+            (CAST(raw_metadata ->> 'talkgroup' AS INTEGER)),
+            (CAST(raw_metadata ->> 'start_time' AS BIGINT)),
+            id
+        )
+        """
+    )
@@ -1,6 +1,26 @@
-from sqlalchemy import Column, text
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlmodel import SQLModel, Session, Field
+import base64
+import json
+import os
+import re
+from threading import Lock
+from typing import Any, Literal, TypedDict
+
+from cachetools import TTLCache
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    ColumnElement,
+    Computed,
+    Integer,
+    Text,
+    case,
+    select as sa_select,
+    text,
+    tuple_,
+)
+from sqlalchemy.dialects.postgresql import JSONB, Insert, aggregate_order_by, insert
+from sqlmodel import SQLModel, Session, Field, col, func, select
+from sqlmodel.sql.expression import SelectOfScalar
 
 from app.geocoding.types import GeoResponse
 from .metadata import Metadata
@@ -22,9 +42,50 @@ class CallBase(Base):
     )
 
 
-class Call(CallBase, table=True):
+def generated(type: Any, expression: str) -> Any:
+    # Postgres fills these in from the JSONB whenever a call is written, so they're never set here
+    return Field(
+        default=None,
+        sa_column=Column(type, Computed(expression, persisted=True), nullable=True),
+    )
+
+
+class CallColumns(Base):
+    """Columns generated from the metadata, so calls can be filtered and sorted with indexes"""
+
+    start_time: int | None = generated(
+        BigInteger, "CAST(raw_metadata ->> 'start_time' AS BIGINT)"
+    )
+    short_name: str | None = generated(Text, "raw_metadata ->> 'short_name'")
+    talkgroup: int | None = generated(
+        Integer, "CAST(raw_metadata ->> 'talkgroup' AS INTEGER)"
+    )
+    talkgroup_tag: str | None = generated(Text, "raw_metadata ->> 'talkgroup_tag'")
+    audio_type: str | None = generated(Text, "raw_metadata ->> 'audio_type'")
+
+
+class Call(CallBase, CallColumns, table=True):
     __tablename__ = "calls"
     id: int | None = Field(default=None, primary_key=True)
+    # The text of each transmission, for searching with a trigram index
+    transcript_plaintext: str | None = generated(
+        Text,
+        "CAST(jsonb_path_query_array(raw_transcript, '$[*][1]') AS TEXT)",
+    )
+
+
+class Talkgroup(Base, table=True):
+    """Every talkgroup that calls have been received on, kept up to date as calls are created"""
+
+    __tablename__ = "talkgroups"
+    short_name: str = Field(primary_key=True)
+    talkgroup: int = Field(primary_key=True)
+    talkgroup_group: str = ""
+    talkgroup_tag: str = ""
+    # Unix timestamps of the first and last calls
+    first_seen: int = Field(sa_type=BigInteger)
+    last_seen: int = Field(sa_type=BigInteger)
+    call_count: int = Field(default=0, sa_type=BigInteger)
 
 
 class CallCreate(CallBase):
@@ -38,23 +99,65 @@ class CallUpdate(Base):
     geo: GeoResponse | None = None
 
 
-class CallPublic(CallBase):
+class CallPublic(CallBase, CallColumns):
     id: int
 
 
 class CallsPublic(Base):
     data: list[CallPublic]
-    count: int
+    # Estimated unless the exact count was requested, and None when no count was requested
+    count: int | None
+    # Pass as cursor to get the next page, None on the last page
+    next_cursor: str | None = None
+
+
+class CallFilters(TypedDict, total=False):
+    short_name: str
+    talkgroup: int
+    talkgroup_tag: str
+    audio_type: str
+    # Unix timestamps, inclusive
+    start_time_from: int
+    start_time_to: int
+    # Text the transcript contains, ignoring case
+    transcript: str
+
+
+CallOrder = Literal["id", "-id", "start_time", "-start_time"]
+CountMode = Literal["estimate", "exact", "none"]
+
+call_start_time: ColumnElement = Call.__table__.c.start_time  # type: ignore[attr-defined]
 
 
 def create_call(db: Session, call: CallCreate) -> Call:
     db_call = Call.model_validate(call)
     db.add(db_call)
+    db.execute(upsert_talkgroups([call.raw_metadata]))
     db.commit()
     db.refresh(db_call)
     return db_call
 
 
+def create_calls(db: Session, calls: list[CallCreate]) -> list[int]:
+    """Insert calls with one multi-row INSERT, returning their IDs in the same order as the calls"""
+    statement = insert(Call).returning(
+        Call.__table__.c.id,  # type: ignore[attr-defined]
+        sort_by_parameter_order=True,
+    )
+    ids = list(
+        db.execute(
+            statement,
+            [
+                {"raw_metadata": call.raw_metadata, "raw_audio_url": call.raw_audio_url}
+                for call in calls
+            ],
+        ).scalars()
+    )
+    db.execute(upsert_talkgroups([call.raw_metadata for call in calls]))
+    db.commit()
+    return ids
+
+
 def update_call(db: Session, call: CallUpdate, db_call: Call) -> Call:
     call_data = call.model_dump(exclude_unset=True)
     db_call.sqlmodel_update(call_data)
@@ -64,20 +167,255 @@ def update_call(db: Session, call: CallUpdate, db_call: Call) -> Call:
     return db_call
 
 
-def get_talkgroups(db: Session, table_name: str) -> list[dict]:
-    query = f"""
-        SELECT
-            raw_metadata::jsonb ->> 'short_name' AS short_name,
-            raw_metadata::jsonb ->> 'talkgroup_group' AS talkgroup_group,
-            raw_metadata::jsonb ->> 'talkgroup_tag' AS talkgroup_tag,
-            raw_metadata::jsonb ->> 'talkgroup' AS talkgroup
-        FROM
-            {table_name}
-        WHERE
-            raw_metadata::jsonb ->> 'talkgroup_tag' != ''
-        GROUP BY
-            short_name, talkgroup_group, talkgroup_tag, talkgroup
+def encode_cursor(call: Call, order: CallOrder) -> str:
+    key = [call.id]
+    if order.endswith("start_time"):
+        key.insert(0, call.raw_metadata["start_time"])
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str, order: CallOrder) -> list[int]:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if (
+        not isinstance(key, list)
+        or len(key) != (2 if order.endswith("start_time") else 1)
+        or not all(isinstance(value, int) for value in key)
+    ):
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def filter_calls(statement: SelectOfScalar, filters: CallFilters) -> SelectOfScalar:
+    if "short_name" in filters:
+        statement = statement.where(Call.short_name == filters["short_name"])
+    if "talkgroup" in filters:
+        statement = statement.where(Call.talkgroup == filters["talkgroup"])
+    if "talkgroup_tag" in filters:
+        statement = statement.where(Call.talkgroup_tag == filters["talkgroup_tag"])
+    if "audio_type" in filters:
+        statement = statement.where(Call.audio_type == filters["audio_type"])
+    if "start_time_from" in filters:
+        statement = statement.where(call_start_time >= filters["start_time_from"])
+    if "start_time_to" in filters:
+        statement = statement.where(call_start_time <= filters["start_time_to"])
+    if "transcript" in filters:
+        # Escaped so the text is matched literally
+        pattern = "%" + re.sub(r"([\\%_])", r"\\\1", filters["transcript"]) + "%"
+        statement = statement.where(col(Call.transcript_plaintext).ilike(pattern))
+    return statement
+
+
+def get_calls_statement(
+    filters: CallFilters,
+    order: CallOrder = "id",
+    cursor: str | None = None,
+    limit: int = 100,
+) -> SelectOfScalar[Call]:
+    """
+    Select a page of calls, continuing after the call the cursor came from. Since the cursor is the sort key
+    of the last call on the previous page, every page is found with an index seek instead of scanning past
+    all the earlier ones like OFFSET does.
     """
+    descending = order.startswith("-")
+    # Calls can share a start time, so the ID breaks ties
+    key: list[ColumnElement] = [Call.__table__.c.id]  # type: ignore[attr-defined]
+    if order.endswith("start_time"):
+        key.insert(0, call_start_time)
+
+    statement = filter_calls(select(Call), filters)
+    if cursor:
+        after = tuple_(*key) if len(key) > 1 else key[0]
+        value = decode_cursor(cursor, order)
+        position = tuple(value) if len(value) > 1 else value[0]
+        statement = statement.where(
+            after < position if descending else after > position
+        )
+    return statement.order_by(
+        *(column.desc() if descending else column.asc() for column in key)
+    ).limit(limit)
+
+
+def get_calls(
+    db: Session,
+    filters: CallFilters,
+    order: CallOrder = "id",
+    cursor: str | None = None,
+    limit: int = 100,
+) -> tuple[list[Call], str | None]:
+    """Return a page of calls and the cursor for the next page"""
+    calls = list(db.exec(get_calls_statement(filters, order, cursor, limit)).all())
+    next_cursor = encode_cursor(calls[-1], order) if len(calls) == limit else None
+    return calls, next_cursor
+
+
+count_cache: TTLCache[str, int] = TTLCache(
+    maxsize=1024, ttl=float(os.getenv("CALLS_COUNT_CACHE_TTL", 60))
+)
+# Requests are handled in a thread pool, and TTLCache isn't thread safe
+count_cache_lock = Lock()
+
+
+def count_calls(db: Session, filters: CallFilters, mode: CountMode) -> int | None:
+    """
+    Count the calls matching the filters. Estimates come from the table statistics (or the planner's estimate
+    when filtering), which are cheap but can be off by a few percent. Exact counts scan every matching call,
+    so they're cached for CALLS_COUNT_CACHE_TTL seconds.
+    """
+    if mode == "none":
+        return None
+
+    if mode == "estimate":
+        if not filters:
+            estimate = db.execute(
+                text(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = 'calls'::regclass"
+                )
+            ).scalar()
+            # The table hasn't been analyzed yet, so it should be small enough to count
+            if estimate is not None and estimate >= 0:
+                return estimate
+        else:
+            statement = filter_calls(select(Call.id), filters)
+            # The filters come from the request, so they're passed as parameters to the driver
+            compiled = statement.compile(db.get_bind())
+            plan = (
+                db.connection()
+                .exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params)
+                .scalar_one()
+            )
+            return int(plan[0]["Plan"]["Plan Rows"])
+
+    key = json.dumps(filters, sort_keys=True)
+    with count_cache_lock:
+        count = count_cache.get(key)
+    if count is None:
+        # Counted outside the lock, so a slow count doesn't hold up other requests
+        statement = filter_calls(select(func.count()).select_from(Call), filters)
+        count = db.exec(statement).one()
+        with count_cache_lock:
+            count_cache[key] = count
+    return count
+
+
+def upsert_talkgroups(metadata_list: list[Metadata]) -> Insert:
+    """
+    Add the talkgroups of new calls to the catalog, counting the calls. The group and tag are taken from
+    the most recent call, so renamed talkgroups don't show up twice.
+    """
+    rows: dict[tuple[str, int], dict] = {}
+    for metadata in metadata_list:
+        key = (metadata["short_name"], int(metadata["talkgroup"]))
+        row = rows.setdefault(
+            key,
+            {
+                "short_name": key[0],
+                "talkgroup": key[1],
+                "first_seen": metadata["start_time"],
+                "last_seen": metadata["start_time"],
+                "call_count": 0,
+            },
+        )
+        row["call_count"] += 1
+        row["first_seen"] = min(row["first_seen"], metadata["start_time"])
+        if metadata["start_time"] >= row["last_seen"]:
+            row["last_seen"] = metadata["start_time"]
+            row["talkgroup_group"] = metadata.get("talkgroup_group", "")
+            row["talkgroup_tag"] = metadata.get("talkgroup_tag", "")
+        row.setdefault("talkgroup_group", metadata.get("talkgroup_group", ""))
+        row.setdefault("talkgroup_tag", metadata.get("talkgroup_tag", ""))
+
+    # Lock rows in the same order in every transaction, so concurrent batches can't deadlock
+    statement = insert(Talkgroup).values([rows[key] for key in sorted(rows)])
+    return on_conflict_merge_talkgroup(
+        statement, call_count=Talkgroup.call_count + statement.excluded.call_count
+    )
+
+
+def on_conflict_merge_talkgroup(statement: Insert, call_count: Any) -> Insert:
+    newer = statement.excluded.last_seen >= Talkgroup.last_seen
+    return statement.on_conflict_do_update(
+        index_elements=["short_name", "talkgroup"],
+        set_={
+            "talkgroup_group": case(
+                (newer, statement.excluded.talkgroup_group),
+                else_=Talkgroup.talkgroup_group,
+            ),
+            "talkgroup_tag": case(
+                (newer, statement.excluded.talkgroup_tag),
+                else_=Talkgroup.talkgroup_tag,
+            ),
+            "first_seen": func.least(
+                Talkgroup.first_seen, statement.excluded.first_seen
+            ),
+            "last_seen": func.greatest(
+                Talkgroup.last_seen, statement.excluded.last_seen
+            ),
+            "call_count": call_count,
+        },
+    )
+
+
+def backfill_talkgroups(db: Session) -> int:
+    """Rebuild the talkgroup catalog from every call, returning how many talkgroups it has"""
+
+    def latest(field: str) -> ColumnElement:
+        value = Call.__table__.c.raw_metadata[field].astext  # type: ignore[attr-defined]
+        return func.coalesce(
+            func.array_agg(aggregate_order_by(value, call_start_time.desc()))[1], ""
+        )
+
+    select_calls = (
+        sa_select(
+            col(Call.short_name),
+            col(Call.talkgroup),
+            latest("talkgroup_group"),
+            latest("talkgroup_tag"),
+            func.min(call_start_time),
+            func.max(call_start_time),
+            func.count(),
+        )
+        .where(col(Call.short_name).isnot(None), col(Call.talkgroup).isnot(None))
+        .group_by(col(Call.short_name), col(Call.talkgroup))
+    )
+    statement = insert(Talkgroup).from_select(
+        [
+            "short_name",
+            "talkgroup",
+            "talkgroup_group",
+            "talkgroup_tag",
+            "first_seen",
+            "last_seen",
+            "call_count",
+        ],
+        select_calls,
+    )
+    # Counting every call again, so the counts replace what's there rather than adding to it
+    db.execute(
+        on_conflict_merge_talkgroup(statement, call_count=statement.excluded.call_count)
+    )
+    db.commit()
+    return db.exec(select(func.count()).select_from(Talkgroup)).one()
+
 
-    result = db.execute(text(query)).fetchall()
-    return [dict(row._mapping) for row in result]
+def get_talkgroups(db: Session) -> list[dict]:
+    talkgroups = db.exec(
+        select(Talkgroup)
+        .where(Talkgroup.talkgroup_tag != "")
+        .order_by(col(Talkgroup.short_name), col(Talkgroup.talkgroup))
+    ).all()
+    return [
+        {
+            "short_name": talkgroup.short_name,
+            "talkgroup_group": talkgroup.talkgroup_group,
+            "talkgroup_tag": talkgroup.talkgroup_tag,
+            # Kept as a string like it was when this was read straight out of the calls
+            "talkgroup": str(talkgroup.talkgroup),
+            "first_seen": talkgroup.first_seen,
+            "last_seen": talkgroup.last_seen,
+            "call_count": talkgroup.call_count,
+        }
+        for talkgroup in talkgroups
+    ]
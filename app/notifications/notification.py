@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import os
 import re
@@ -20,6 +21,12 @@ from .config import (
 from app.models.metadata import Metadata
 from app.models.transcript import Transcript
 from app.utils.cache import get_ttl_hash
+from app.utils.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenException,
+    get_breaker,
+)
+from app.utils.metrics import NOTIFICATIONS_EXPIRED
 
 
 # TODO: write tests
@@ -99,31 +106,60 @@ def get_matching_config(
     ]
 
 
+def get_channel_breaker(channel: str) -> CircuitBreaker:
+    """Each channel gets its own breaker, so one that is down doesn't hold up the rest"""
+    # Channel URLs have tokens in them, so they're hashed to name the breaker in logs and metrics
+    scheme = channel.split("://", 1)[0]
+    return get_breaker(
+        f"notifications_{scheme}_{hashlib.sha1(channel.encode()).hexdigest()[:8]}"
+    )
+
+
 def send_notifications(
     raw_audio_url: str,
     metadata: Metadata,
     transcript: Transcript,
     geo: geocoding.GeoResponse | None,
     search_url: str,
-) -> None:  # pragma: no cover
+    channels: list[str] | None = None,
+) -> list[str]:  # pragma: no cover
+    """
+    Send the call and any alerts for it to the channels configured for its talkgroup, or only to channels if given.
+    Returns the channels that were skipped since their circuit breaker is open, to send to again later.
+    """
     # If delayed over our MAX_CALL_AGE, don't bother sending to Telegram
     max_age = float(os.getenv("MAX_CALL_AGE", 1200))
     if max_age > 0 and time() - metadata["stop_time"] > max_age:
-        logging.debug("Not sending notifications since call is too old")
-        return
+        logging.info("Not sending notifications since call is too old")
+        NOTIFICATIONS_EXPIRED.inc()
+        return []
 
     config = get_notifications_config(get_ttl_hash(cache_seconds=60))
 
     transcript_html = transcript.html
 
+    def targets(config_channels: list[str]) -> list[str]:
+        return [
+            channel
+            for channel in config_channels
+            if channels is None or channel in channels
+        ]
+
+    skipped: list[str] = []
     for match in get_matching_config(metadata, config):
-        if len(match["channels"]):
+        if len(targets(match["channels"])):
             logging.debug(
                 f"Detected match for {metadata}, sending call to {match['channels']}"
             )
-            notify(match, metadata, transcript_html, raw_audio_url)
+            skipped += notify(
+                match,
+                metadata,
+                transcript_html,
+                raw_audio_url,
+                channels=targets(match["channels"]),
+            )
         for alert_config in match["alerts"]:
-            if len(alert_config["channels"]):
+            if len(targets(alert_config["channels"])):
                 should_send, title, body = should_send_alert(
                     alert_config, transcript_html, geo
                 )
@@ -131,9 +167,16 @@ def send_notifications(
                     logging.debug(
                         f"Detected match for {metadata}, sending alert for config {alert_config} with title {title}"
                     )
-                    notify(
-                        alert_config, metadata, body, raw_audio_url, title, search_url
+                    skipped += notify(
+                        alert_config,
+                        metadata,
+                        body,
+                        raw_audio_url,
+                        title,
+                        search_url,
+                        channels=targets(alert_config["channels"]),
                     )
+    return list(dict.fromkeys(skipped))
 
 
 def notify(
@@ -143,22 +186,51 @@ def notify(
     audio_file: str,
     title: str = "",
     search_url: str = "",
-) -> None:  # pragma: no cover
-    # Captions are only 1024 chars max so we must truncate the transcript to fit for Telegram
-    if "tgram://" in str(config["channels"]):
-        body = truncate_transcript(body)
-
+    channels: list[str] | None = None,
+) -> list[str]:
+    """Send to each of the config's channels (or just channels), returning the ones skipped since their breaker is open"""
     should_add_talkgroup = (
         config["append_talkgroup"] if "append_talkgroup" in config else True
     )
     suffix = build_suffix(metadata, should_add_talkgroup, search_url)
-
-    add_channels(Apprise(), config["channels"]).notify(
-        body="<br />".join([body, suffix]),
-        body_format=NotifyFormat.HTML,
-        title=title,
-        attach=AppriseAttachment(audio_file),
-    )
+    attachment = AppriseAttachment(audio_file)
+
+    skipped = []
+    for channel in config["channels"] if channels is None else channels:
+        apprise = add_channels(Apprise(), [channel])
+        if not apprise:
+            # Apprise couldn't parse the URL, which isn't the service being down
+            logging.error(
+                f"Invalid notification channel {channel.split('://', 1)[0]}://..."
+            )
+            continue
+        breaker = get_channel_breaker(channel)
+        try:
+            breaker.before_call()
+        except CircuitOpenException as e:
+            logging.warning(f"{e}, skipping notification")
+            skipped.append(channel)
+            continue
+
+        # Captions are only 1024 chars max so we must truncate the transcript to fit for Telegram
+        channel_body = (
+            truncate_transcript(body) if channel.startswith("tgram://") else body
+        )
+        sent = False
+        try:
+            sent = apprise.notify(
+                body="<br />".join([channel_body, suffix]),
+                body_format=NotifyFormat.HTML,
+                title=title,
+                attach=attachment,
+            )
+        finally:
+            # Apprise logs failures itself rather than raising
+            if sent:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+    return skipped
 
 
 def should_send_alert(
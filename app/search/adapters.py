@@ -65,7 +65,9 @@ class SearchAdapter(ABC):
         pass
 
     @abstractmethod
-    def index_calls(self, documents: list[Document]) -> bool:
+    def index_calls(
+        self, documents: list[Document], index_name: str | None = None
+    ) -> bool:
         pass
 
     @abstractmethod
@@ -96,6 +98,12 @@ class SearchAdapter(ABC):
     ) -> Tuple[int, list[Document]]:
         pass
 
+    def get_index_name(self, metadata: Metadata, index_name: str | None = None) -> str:
+        if not index_name:
+            call_time = datetime.datetime.fromtimestamp(metadata["start_time"])
+            index_name = get_default_index_name(call_time)
+        return index_name
+
     def make_next_index(self) -> None:
         future_index_name = get_default_index_name(
             datetime.datetime.now() + datetime.timedelta(hours=1)
@@ -229,15 +237,8 @@ class MeilisearchAdapter(SearchAdapter):
 
         logging.debug(f"Sending document to be indexed: {str(doc)}")
 
-        if not index_name:
-            call_time = datetime.datetime.fromtimestamp(metadata["start_time"])
-            index_name = get_default_index_name(call_time)
-
-        # Since Meilisearch will create a new index with empty settings if we try to index a document into a non-existent index,
-        # we need to ensure the index exists before we try to index a document into it
-        if index_name not in self.created_indexes:
-            self.upsert_index(index_name, update=False)
-            self.created_indexes.add(index_name)
+        index_name = self.get_index_name(metadata, index_name)
+        self.ensure_index(index_name)
 
         try:
             self.client.index(index_name).add_documents([doc])
@@ -247,6 +248,13 @@ class MeilisearchAdapter(SearchAdapter):
 
         return self.build_search_url(doc, index_name)
 
+    def ensure_index(self, index_name: str) -> None:
+        # Since Meilisearch will create a new index with empty settings if we try to index a document into a non-existent index,
+        # we need to ensure the index exists before we try to index a document into it
+        if index_name not in self.created_indexes:
+            self.upsert_index(index_name, update=False)
+            self.created_indexes.add(index_name)
+
     def upsert_index(
         self,
         index_name: str | None = None,
@@ -348,8 +356,14 @@ class MeilisearchAdapter(SearchAdapter):
     def search(self, query: str, options: dict) -> dict:
         return self.index.search(query, options)
 
-    def index_calls(self, documents: list[Document]) -> bool:
-        taskinfo = self.index.add_documents(documents)
+    def index_calls(
+        self, documents: list[Document], index_name: str | None = None
+    ) -> bool:
+        index = self.index
+        if index_name:
+            self.ensure_index(index_name)
+            index = self.client.index(index_name)
+        taskinfo = index.add_documents(documents)
         task = self.client.get_task(taskinfo.task_uid)
         while task.status not in [
             "succeeded",
@@ -537,9 +551,7 @@ class TypesenseAdapter(SearchAdapter):
 
         logging.debug(f"Sending document to be indexed: {str(doc)}")
 
-        if not index_name:
-            call_time = datetime.datetime.fromtimestamp(metadata["start_time"])
-            index_name = get_default_index_name(call_time)
+        index_name = self.get_index_name(metadata, index_name)
 
         try:
             self.client.collections[index_name].documents.upsert(doc)
@@ -670,11 +682,24 @@ class TypesenseAdapter(SearchAdapter):
         except ObjectNotFound:
             pass
 
-    def index_calls(self, documents: list[Document]) -> bool:
+    def index_calls(
+        self, documents: list[Document], index_name: str | None = None
+    ) -> bool:
+        index = self.client.collections[index_name] if index_name else self.index
         try:
-            self.index.documents.import_(documents)
+            try:
+                results = index.documents.import_(documents, {"action": "upsert"})
+            except ObjectNotFound:
+                self.upsert_index(index_name)
+                results = index.documents.import_(documents, {"action": "upsert"})
         except TypesenseClientError as err:
             raise Exception(str(err))
+        # Imports report errors per document instead of raising
+        failures = [result for result in results if not result.get("success")]
+        if failures:
+            raise Exception(
+                f"Failed to index {len(failures)} of {len(documents)} documents: {failures[0]}"
+            )
         return True
 
     def search(self, query: str, options: dict) -> dict:
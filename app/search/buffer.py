@@ -0,0 +1,158 @@
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock, Timer
+from typing import Callable
+
+import sentry_sdk
+
+from app.geocoding.types import GeoResponse
+from app.models.metadata import Metadata
+from app.models.transcript import Transcript
+from app.search.adapters import SearchAdapter
+from app.search.helpers import Document
+from app.utils.metrics import time_stage
+
+
+class IndexBuffer:
+    """
+    Collects documents built by a search adapter and indexes them in bulk, once max_size documents
+    are waiting or max_delay seconds have passed since the first one was added.
+    Indexing happens in the background, so callers get the search URL back right away.
+    Documents that fail to index are retried with backoff up to max_retries times before they're dropped.
+    """
+
+    def __init__(
+        self,
+        adapter: SearchAdapter,
+        max_size: int = 100,
+        max_delay: float = 5,
+        max_retries: int = 5,
+        on_indexed: Callable[[list[Document]], None] | None = None,
+    ):
+        self.adapter = adapter
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.on_indexed = on_indexed
+        # Keyed by index name and then document ID, so a call indexed twice is only sent once
+        self.documents: dict[str, dict[str, Document]] = {}
+        # Failed attempts to index each document, by index name and document ID
+        self.failures: dict[tuple[str, str], int] = {}
+        self.lock = Lock()
+        self.timer: Timer | None = None
+        self.closed = False
+        # A single thread keeps flushes in the order they were made
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="index_buffer"
+        )
+
+    def index_call(
+        self,
+        id: int | str,
+        metadata: Metadata,
+        raw_audio_url: str,
+        transcript: Transcript,
+        geo: GeoResponse | None = None,
+        index_name: str | None = None,
+    ) -> str:
+        doc = self.adapter.build_document(id, metadata, raw_audio_url, transcript, geo)
+        index_name = self.adapter.get_index_name(metadata, index_name)
+        self.add(index_name, doc)
+        return self.adapter.build_search_url(doc, index_name)
+
+    def add(self, index_name: str, document: Document) -> None:
+        with self.lock:
+            if not self.closed:
+                self.documents.setdefault(index_name, {})[str(document["id"])] = (
+                    document
+                )
+                size = sum(len(documents) for documents in self.documents.values())
+                if size < self.max_size:
+                    self._schedule_flush(self.max_delay)
+                    return
+        if self.closed:
+            # Nothing is left to flush the buffer, so index it now and let the caller handle failures
+            self._index_documents([document], index_name)
+            return
+        self.flush()
+
+    def flush(self) -> Future:
+        """Send everything in the buffer to be indexed in the background"""
+        with self.lock:
+            documents, self.documents = self.documents, {}
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+            if not self.closed:
+                return self.executor.submit(self._index, documents)
+        # Once closed there's no background thread, so index on this one
+        future: Future = Future()
+        self._index(documents)
+        future.set_result(None)
+        return future
+
+    def close(self) -> None:
+        """Wait for indexing in progress to finish and index what's left in the buffer"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.executor.shutdown(wait=True)
+        self.flush()
+
+    def _schedule_flush(self, delay: float) -> None:
+        # Called with the lock held
+        if not self.timer and not self.closed:
+            self.timer = Timer(delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _index_documents(self, docs: list[Document], index_name: str) -> None:
+        with time_stage("bulk_index"):
+            if self.adapter.index_calls(docs, index_name) is False:
+                raise Exception(f"Search engine failed to index into {index_name}")
+        if self.on_indexed:
+            self.on_indexed(docs)
+
+    def _index(self, documents: dict[str, dict[str, Document]]) -> None:
+        for index_name, docs in documents.items():
+            if not docs:
+                continue
+            logging.debug(f"Indexing {len(docs)} buffered documents into {index_name}")
+            try:
+                self._index_documents(list(docs.values()), index_name)
+            except Exception as e:
+                logging.error(
+                    f"Failed to index {len(docs)} buffered documents into {index_name}: {repr(e)}"
+                )
+                sentry_sdk.capture_exception(e)
+                self._requeue(index_name, docs)
+                continue
+            with self.lock:
+                for id in docs:
+                    self.failures.pop((index_name, id), None)
+
+    def _requeue(self, index_name: str, docs: dict[str, Document]) -> None:
+        dropped = []
+        with self.lock:
+            pending = self.documents.setdefault(index_name, {})
+            attempts = 0
+            for id, doc in docs.items():
+                failures = self.failures.get((index_name, id), 0) + 1
+                if self.closed or failures > self.max_retries:
+                    self.failures.pop((index_name, id), None)
+                    if id not in pending:
+                        dropped.append(id)
+                    continue
+                self.failures[(index_name, id)] = failures
+                attempts = max(attempts, failures)
+                # Anything added since the flush is newer than what failed
+                pending.setdefault(id, doc)
+            if not pending:
+                del self.documents[index_name]
+            if attempts:
+                self._schedule_flush(self.max_delay * 2**attempts)
+        if dropped:
+            logging.error(
+                f"Gave up indexing {len(dropped)} documents into {index_name}: {', '.join(dropped)}"
+            )
@@ -4,6 +4,8 @@ import os
 
 import requests
 
+from app.utils.circuit_breaker import get_breaker
+
 
 def call(method: str, path: str, **kwargs):
     """Constructs and sends a :class:`Request <Request>`.
@@ -48,12 +50,23 @@ def call(method: str, path: str, **kwargs):
     if "url" not in kwargs:
         kwargs["url"] = f"{os.getenv('API_BASE_URL')}/{path}"
 
-    r = requests.request(
-        method=method,
-        timeout=60,
-        headers=headers,
-        **kwargs,
-    )
+    breaker = get_breaker("api")
+    breaker.before_call()
+    failed = True
+    try:
+        r = requests.request(
+            method=method,
+            timeout=60,
+            headers=headers,
+            **kwargs,
+        )
+        # Only server errors mean the API is down, a 4xx is a problem with the request
+        failed = r.status_code >= 500
+    finally:
+        if failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
     if r.status_code >= 400:
         try:
             logging.error(json.dumps(r.json(), indent=2))
@@ -0,0 +1,120 @@
+import logging
+import os
+import time
+from functools import lru_cache
+from threading import Lock
+from typing import Callable, ParamSpec, TypeVar
+
+from app.utils.exceptions import BaseException
+from app.utils.metrics import CIRCUIT_BREAKER_STATE, CIRCUIT_BREAKER_TRANSITIONS
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+STATES = [CLOSED, HALF_OPEN, OPEN]
+
+
+class CircuitOpenException(BaseException):
+    def __init__(self, breaker: "CircuitBreaker"):
+        super().__init__(f"Circuit breaker for {breaker.name} is open")
+        self.breaker = breaker
+
+
+class CircuitBreaker:
+    """
+    Stops calling a service after it fails failure_threshold times in a row, so tasks fail fast instead of
+    waiting on timeouts. Once recovery_timeout seconds have passed, one call is let through to check
+    whether the service is back: if it succeeds the circuit closes again, otherwise it stays open.
+    A probe that never reports back (e.g. its worker was killed) is given up on after another recovery_timeout.
+    """
+
+    def __init__(
+        self, name: str, failure_threshold: int = 5, recovery_timeout: float = 60
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at = 0.0
+        self.lock = Lock()
+        CIRCUIT_BREAKER_STATE.labels(name).set(STATES.index(CLOSED))
+
+    def call(self, func: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+        self.before_call()
+        succeeded = False
+        try:
+            result = func(*args, **kwargs)
+            succeeded = True
+        finally:
+            # Whatever was raised, the call has to be recorded or a probe would never finish
+            if succeeded:
+                self.record_success()
+            else:
+                self.record_failure()
+        return result
+
+    def is_open(self) -> bool:
+        """Whether calls would be rejected right now, without letting a probe through"""
+        with self.lock:
+            return not self._can_probe() and self.state != CLOSED
+
+    def before_call(self) -> None:
+        """
+        Raise CircuitOpenException if the service shouldn't be called right now.
+        Otherwise record_success or record_failure must be called once the call finishes.
+        """
+        with self.lock:
+            if self.state == CLOSED:
+                return
+            if self._can_probe():
+                # Let this call through as a probe, anything else waits for its result
+                self.probe_started_at = time.time()
+                if self.state == OPEN:
+                    self._transition(HALF_OPEN)
+                return
+            raise CircuitOpenException(self)
+
+    def _can_probe(self) -> bool:
+        now = time.time()
+        if self.state == OPEN:
+            return now - self.opened_at >= self.recovery_timeout
+        return (
+            self.state == HALF_OPEN
+            and now - self.probe_started_at >= self.recovery_timeout
+        )
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            if self.state != CLOSED:
+                self._transition(CLOSED)
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (
+                self.state == CLOSED and self.failures >= self.failure_threshold
+            ):
+                self.opened_at = time.time()
+                self._transition(OPEN)
+
+    def _transition(self, state: str) -> None:
+        log = logging.warning if state == OPEN else logging.info
+        log(f"Circuit breaker for {self.name} is now {state}")
+        self.state = state
+        CIRCUIT_BREAKER_TRANSITIONS.labels(self.name, state).inc()
+        CIRCUIT_BREAKER_STATE.labels(self.name).set(STATES.index(state))
+
+
+@lru_cache()
+def get_breaker(name: str) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        failure_threshold=int(os.getenv("CIRCUIT_BREAKER_THRESHOLD", 5)),
+        recovery_timeout=float(os.getenv("CIRCUIT_BREAKER_TIMEOUT", 60)),
+    )
@@ -1,20 +1,61 @@
+import io
+import logging
+import os
+import shutil
 import subprocess
 import tempfile
+import wave
 from datetime import datetime
-from functools import lru_cache
+from typing import BinaryIO, NotRequired, TypedDict, cast
 
+import numpy as np
+import numpy.typing as npt
 import pytz
-from cachetools import cached
-from cachetools.keys import hashkey
 
 from app.models.metadata import Metadata
+from app.utils.conversion_cache import get_conversion_cache, link_temp_file
 
+# Whisper models expect 16 kHz mono audio
+SAMPLE_RATE = 16000
+# "av" converts audio in process with PyAV, "ffmpeg" starts an ffmpeg process for each file
+AUDIO_CONVERSION_ENGINE = os.getenv("AUDIO_CONVERSION_ENGINE", "av")
 
-def _build_metadata_args(metadata: Metadata) -> list[str]:
+
+class OutputFormat(TypedDict):
+    codec: str
+    bit_rate: NotRequired[int]
+    # Keep the input's sample rate and channels unless these are set
+    sample_rate: NotRequired[int]
+    layout: NotRequired[str]
+
+
+WAV_FORMAT: OutputFormat = {
+    "codec": "pcm_s16le",
+    "sample_rate": SAMPLE_RATE,
+    "layout": "mono",
+}
+MP3_FORMAT: OutputFormat = {"codec": "libmp3lame", "bit_rate": 32000}
+OGG_FORMAT: OutputFormat = {"codec": "libopus", "bit_rate": 128000}
+# Renditions stored for workers alongside the MP3, already at the sample rate Whisper uses, by file extension
+WORKER_FORMATS: dict[str, tuple[str, OutputFormat]] = {
+    "flac": (
+        "flac",
+        {"codec": "flac", "sample_rate": SAMPLE_RATE, "layout": "mono"},
+    ),
+    "opus": (
+        "ogg",
+        {
+            "codec": "libopus",
+            "bit_rate": 24000,
+            "sample_rate": SAMPLE_RATE,
+            "layout": "mono",
+        },
+    ),
+}
+
+
+def _build_metadata_tags(metadata: Metadata) -> dict[str, str]:
     start_time = datetime.fromtimestamp(metadata["start_time"], tz=pytz.UTC)
-    creation_time = start_time.strftime("%Y-%m-%d %H:%M:%S")
-    date = start_time.strftime("%Y-%m-%d")
-    year = start_time.strftime("%Y")
     artist = ""
     if len(metadata["srcList"]):
         artist = ", ".join(
@@ -26,22 +67,33 @@ def _build_metadata_args(metadata: Metadata) -> list[str]:
         )
     if not len(artist):
         artist = metadata["talkgroup_description"]
-    return [
-        "-metadata",
-        "composer=trunk-recorder",
-        "-metadata",
-        f"creation_time={creation_time}",
-        "-metadata",
-        f"date={date}",
-        "-metadata",
-        f"year={year}",
-        "-metadata",
-        f'title={metadata["talkgroup_tag"]}',
-        "-metadata",
-        f"artist={artist}",
-        "-metadata",
-        f'album={metadata["talkgroup_group"]}',
-    ]
+    return {
+        "composer": "trunk-recorder",
+        "creation_time": start_time.strftime("%Y-%m-%d %H:%M:%S"),
+        "date": start_time.strftime("%Y-%m-%d"),
+        "year": start_time.strftime("%Y"),
+        "title": metadata["talkgroup_tag"],
+        "artist": artist,
+        "album": metadata["talkgroup_group"],
+    }
+
+
+def _build_metadata_args(metadata: Metadata) -> list[str]:
+    args = []
+    for key, value in _build_metadata_tags(metadata).items():
+        args += ["-metadata", f"{key}={value}"]
+    return args
+
+
+def _build_ffmpeg_args(output_format: OutputFormat) -> list[str]:
+    args = ["-c:a", output_format["codec"]]
+    if "bit_rate" in output_format:
+        args += ["-b:a", f"{output_format['bit_rate'] // 1000}k"]
+    if "sample_rate" in output_format:
+        args += ["-ar", str(output_format["sample_rate"])]
+    if output_format.get("layout") == "mono":
+        args += ["-ac", "1"]
+    return args
 
 
 def _convert_file(
@@ -72,47 +124,271 @@ def _convert_file(
     return file.name
 
 
-@lru_cache()
-def convert_to_wav(audio_file: str) -> str:  # pragma: no cover
+def _choose_rate(supported: list[int] | None, rate: int) -> int:
+    """Use the input rate if the encoder supports it, otherwise the next highest rate it does, like ffmpeg"""
+    if not supported or rate in supported:
+        return rate
+    higher = [supported_rate for supported_rate in supported if supported_rate > rate]
+    return min(higher) if higher else max(supported)
+
+
+def _encode(
+    input: str | BinaryIO,
+    output: str | BinaryIO,
+    format: str,
+    output_format: OutputFormat,
+    metadata: Metadata | None = None,
+) -> None:
+    """Decode, resample and encode in this process with libav, instead of starting ffmpeg"""
+    import av
+    from av.audio.stream import AudioStream
+
+    with (
+        av.open(input, "r") as input_container,
+        av.open(output, "w", format=format) as output_container,
+    ):
+        input_stream = input_container.streams.audio[0]
+        codec = av.Codec(output_format["codec"], "w")
+        rate = output_format.get(
+            "sample_rate",
+            _choose_rate(codec.audio_rates, input_stream.rate),
+        )
+        stream = cast(
+            AudioStream, output_container.add_stream(output_format["codec"], rate=rate)
+        )
+        # WAV files without a channel mask have an unspecified layout, so use the default for the channel count
+        default_layout = {1: "mono", 2: "stereo"}.get(
+            input_stream.channels, input_stream.layout.name
+        )
+        stream.layout = output_format.get("layout", default_layout)
+        formats = [sample_format.name for sample_format in codec.audio_formats or []]
+        input_format = input_stream.format
+        stream.format = next(
+            (
+                name
+                for name in [
+                    input_format.name,
+                    input_format.planar.name,
+                    input_format.packed.name,
+                ]
+                if name in formats
+            ),
+            formats[0] if formats else input_format.name,
+        )
+        if "bit_rate" in output_format:
+            stream.bit_rate = output_format["bit_rate"]
+        if metadata:
+            output_container.metadata.update(_build_metadata_tags(metadata))
+
+        # The encoder resamples frames to its own format, layout, rate and frame size
+        for frame in input_container.decode(input_stream):
+            frame.pts = None
+            output_container.mux(stream.encode(frame))
+        output_container.mux(stream.encode(None))
+
+
+def _encode_file(
+    audio_file: str,
+    format: str,
+    output_format: OutputFormat,
+    metadata: Metadata | None = None,
+) -> str:
+    file = tempfile.NamedTemporaryFile(delete=False, suffix=f".{format}")
+    file.close()
+    try:
+        _encode(audio_file, file.name, format, output_format, metadata)
+    except BaseException:
+        os.remove(file.name)
+        raise
+    return file.name
+
+
+def _encode_ffmpeg_stream(
+    audio: BinaryIO,
+    output: BinaryIO,
+    format: str,
+    output_format: OutputFormat,
+    metadata: Metadata | None = None,
+) -> None:
+    metadata_args = _build_metadata_args(metadata) if metadata else []
+    p = subprocess.Popen(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0"]
+        + _build_ffmpeg_args(output_format)
+        + metadata_args
+        + ["-f", format, "pipe:1"],
+        stdin=subprocess.PIPE,
+        stdout=output,
+    )
+    assert p.stdin is not None
+    try:
+        shutil.copyfileobj(audio, p.stdin)
+    finally:
+        p.stdin.close()
+    if p.wait():
+        raise subprocess.CalledProcessError(p.returncode, p.args)
+
+
+def encode_stream(
+    audio: BinaryIO,
+    output: BinaryIO,
+    format: str,
+    output_format: OutputFormat,
+    metadata: Metadata | None = None,
+) -> None:
+    """
+    Encode audio read from a file object, writing it to another as it's encoded (e.g. a pipe to an upload).
+    The output can't be taken back once written, so this doesn't fall back to ffmpeg when PyAV fails.
+    """
+    if AUDIO_CONVERSION_ENGINE == "av":
+        _encode(audio, output, format, output_format, metadata)
+    else:
+        _encode_ffmpeg_stream(audio, output, format, output_format, metadata)
+
+
+def encode_mp3_stream(audio: BinaryIO, output: BinaryIO, metadata: Metadata) -> None:
+    encode_stream(audio, output, "mp3", MP3_FORMAT, metadata)
+
+
+def _convert(
+    audio_file: str,
+    format: str,
+    output_format: OutputFormat,
+    metadata: Metadata | None = None,
+) -> str:
+    if AUDIO_CONVERSION_ENGINE == "av":
+        try:
+            return _encode_file(audio_file, format, output_format, metadata)
+        except ImportError:  # pragma: no cover
+            pass
+        except Exception as e:
+            logging.warning(
+                f"Could not convert {audio_file} to {format} in process, falling back to ffmpeg: {repr(e)}"
+            )
     return _convert_file(
+        audio_file, format, _build_ffmpeg_args(output_format), metadata
+    )
+
+
+def is_wav(audio_file: str) -> bool:
+    """Whether a file is already a 16 kHz mono 16-bit WAV, like convert_to_wav writes"""
+    try:
+        with wave.open(audio_file) as wav:
+            return (
+                wav.getnchannels() == 1
+                and wav.getsampwidth() == 2
+                and wav.getframerate() == SAMPLE_RATE
+            )
+    except (OSError, wave.Error, EOFError):
+        return False
+
+
+def convert_to_wav(audio_file: str) -> str:
+    if is_wav(audio_file):
+        # Nothing to convert, so don't spend time hashing it for the cache either
+        return link_temp_file(audio_file, "wav")
+    return get_conversion_cache().convert(
         audio_file,
         "wav",
-        [
-            "-c:a",
-            "pcm_s16le",
-            "-ar",
-            "16000",
-            "-ac",
-            "1",
-        ],
+        dict(WAV_FORMAT),
+        lambda: _convert(audio_file, "wav", WAV_FORMAT),
     )
 
 
-@cached(cache={}, key=lambda audio_file, metadata: hashkey(audio_file))
-def convert_to_mp3(audio_file: str, metadata: Metadata) -> str:  # pragma: no cover
-    return _convert_file(
+def convert_to_mp3(audio_file: str, metadata: Metadata) -> str:
+    return get_conversion_cache().convert(
         audio_file,
         "mp3",
-        [
-            "-c:a",
-            "libmp3lame",
-            "-b:a",
-            "32k",
-        ],
-        metadata,
+        {**MP3_FORMAT, **_build_metadata_tags(metadata)},
+        lambda: _convert(audio_file, "mp3", MP3_FORMAT, metadata),
     )
 
 
-@cached(cache={}, key=lambda audio_file, metadata: hashkey(audio_file))
-def convert_to_ogg(audio_file: str, metadata: Metadata) -> str:  # pragma: no cover
-    return _convert_file(
+def convert_to_ogg(audio_file: str, metadata: Metadata) -> str:
+    return get_conversion_cache().convert(
         audio_file,
         "ogg",
+        {**OGG_FORMAT, **_build_metadata_tags(metadata)},
+        lambda: _convert(audio_file, "ogg", OGG_FORMAT, metadata),
+    )
+
+
+def get_duration(audio: str | BinaryIO) -> float:
+    """Read the duration of an audio file or file object in seconds"""
+    if AUDIO_CONVERSION_ENGINE == "av":
+        try:
+            import av
+
+            with av.open(audio, "r") as container:
+                if container.duration is not None:
+                    return container.duration / av.time_base
+                stream = container.streams.audio[0]
+                if stream.duration is not None and stream.time_base is not None:
+                    return float(stream.duration * stream.time_base)
+        except ImportError:  # pragma: no cover
+            pass
+        except Exception as e:
+            logging.warning(
+                f"Could not read the duration of {audio}, falling back to ffprobe: {repr(e)}"
+            )
+        finally:
+            if not isinstance(audio, str):
+                audio.seek(0)
+    return _get_duration_ffprobe(audio)
+
+
+def _get_duration_ffprobe(audio: str | BinaryIO) -> float:  # pragma: no cover
+    p = subprocess.run(
         [
-            "-c:a",
-            "libopus",
-            "-b:a",
-            "128k",
+            "ffprobe",
+            "-i",
+            audio if isinstance(audio, str) else "pipe:0",
+            "-show_entries",
+            "format=duration",
+            "-v",
+            "quiet",
+            "-of",
+            "csv=p=0",
         ],
-        metadata,
+        input=None if isinstance(audio, str) else audio.read(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
     )
+    if not isinstance(audio, str):
+        audio.seek(0)
+    p.check_returncode()
+    return float(p.stdout.decode("utf-8").strip())
+
+
+def decode_audio(
+    data: bytes, sample_rate: int = SAMPLE_RATE
+) -> npt.NDArray[np.float32]:
+    """Decode an audio file held in memory into mono float32 PCM at the given sample rate"""
+    import av
+
+    resampler = av.AudioResampler(format="s16", layout="mono", rate=sample_rate)
+    chunks = []
+    with av.open(io.BytesIO(data), mode="r") as container:
+        for frame in container.decode(audio=0):
+            for resampled in resampler.resample(frame):
+                chunks.append(resampled.to_ndarray())
+    # Flush any samples still buffered in the resampler
+    for resampled in resampler.resample(None):
+        chunks.append(resampled.to_ndarray())
+
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    pcm = np.concatenate(chunks, axis=1).flatten()
+    return pcm.astype(np.float32) / 32768.0
+
+
+def write_wav(audio: npt.NDArray[np.float32], sample_rate: int = SAMPLE_RATE) -> str:
+    """Write decoded PCM to a 16-bit WAV file for backends that can only read files"""
+    file = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(file, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    file.close()
+    return file.name
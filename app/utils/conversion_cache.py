@@ -0,0 +1,148 @@
+import atexit
+import json
+import logging
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from functools import lru_cache
+from hashlib import sha256
+from threading import Lock
+from typing import Any, Callable, TypedDict
+
+from app.utils.metrics import CONVERSION_CACHE_EVENTS
+
+
+class CachedFile(TypedDict):
+    path: str
+    size: int
+
+
+class ConversionCache:
+    """
+    Converted audio files keyed on the content of the source file and the output format, so converting the same
+    call again (e.g. when a task is retried) reuses the earlier result. The cache owns its files, and is limited
+    to max_entries files and max_bytes on disk, removing the least recently used files to stay within both.
+    Callers get their own hard link to the cached file, which they can delete once they're done with it.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.files: OrderedDict[str, CachedFile] = OrderedDict()
+        self.size = 0
+        self.lock = Lock()
+        self.directory: str | None = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def build_key(audio_file: str, format: str, params: dict[str, Any]) -> str:
+        audio_hash = sha256()
+        with open(audio_file, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                audio_hash.update(chunk)
+        return sha256(
+            (
+                audio_hash.hexdigest() + format + json.dumps(params, sort_keys=True)
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def convert(
+        self,
+        audio_file: str,
+        format: str,
+        params: dict[str, Any],
+        converter: Callable[[], str],
+    ) -> str:
+        """Return a copy of the cached conversion of audio_file, or convert it with the converter and cache it"""
+        if not self.max_entries or not self.max_bytes:
+            return converter()
+
+        key = self.build_key(audio_file, format, params)
+        cached = self.get(key, format)
+        if cached is not None:
+            return cached
+        return self.put(key, format, converter())
+
+    def get(self, key: str, format: str) -> str | None:
+        with self.lock:
+            cached = self.files.get(key)
+            if cached is not None:
+                try:
+                    valid = os.path.getsize(cached["path"]) == cached["size"]
+                except OSError:
+                    valid = False
+                if valid:
+                    # The temp file cleaner only removes cached files that haven't been used in a while
+                    os.utime(cached["path"])
+                    self.files.move_to_end(key)
+                    self.hits += 1
+                    CONVERSION_CACHE_EVENTS.labels("hit").inc()
+                    return link_temp_file(cached["path"], format)
+                logging.warning(
+                    f"Cached conversion {cached['path']} is missing or changed"
+                )
+                self._evict(key)
+            self.misses += 1
+        CONVERSION_CACHE_EVENTS.labels("miss").inc()
+        return None
+
+    def put(self, key: str, format: str, output: str) -> str:
+        """Take ownership of the converted file and return a copy of it for the caller"""
+        size = os.path.getsize(output)
+        if size > self.max_bytes:
+            return output
+
+        with self.lock:
+            if key in self.files:
+                # Another thread converted the same file at the same time, keep the one already cached
+                os.unlink(output)
+                self.files.move_to_end(key)
+                return link_temp_file(self.files[key]["path"], format)
+
+            if self.directory is None:
+                self.directory = tempfile.mkdtemp(prefix="conversion-cache-")
+                atexit.register(shutil.rmtree, self.directory, ignore_errors=True)
+            path = os.path.join(self.directory, f"{key}.{format}")
+            shutil.move(output, path)
+
+            while self.files and (
+                len(self.files) >= self.max_entries or self.size + size > self.max_bytes
+            ):
+                self._evict(next(iter(self.files)))
+            self.files[key] = CachedFile(path=path, size=size)
+            self.size += size
+            return link_temp_file(path, format)
+
+    def _evict(self, key: str) -> None:
+        cached = self.files.pop(key)
+        self.size -= cached["size"]
+        self.evictions += 1
+        CONVERSION_CACHE_EVENTS.labels("eviction").inc()
+        try:
+            os.unlink(cached["path"])
+        except FileNotFoundError:
+            pass
+
+
+def link_temp_file(path: str, format: str) -> str:
+    """Make a temp file with the same content as path, which the caller can delete without affecting path"""
+    file = tempfile.NamedTemporaryFile(delete=False, suffix=f".{format}")
+    file.close()
+    os.unlink(file.name)
+    try:
+        os.link(path, file.name)
+    except OSError:
+        # The temp directory is on a filesystem without hard links
+        shutil.copyfile(path, file.name)
+    return file.name
+
+
+@lru_cache()
+def get_conversion_cache() -> ConversionCache:
+    return ConversionCache(
+        max_entries=int(os.getenv("CONVERSION_CACHE_SIZE", 256)),
+        max_bytes=int(os.getenv("CONVERSION_CACHE_MAX_MB", 256)) * 1024 * 1024,
+    )
@@ -0,0 +1,127 @@
+import json
+import logging
+import os
+import time
+from functools import lru_cache
+from threading import Lock
+from typing import Any, NotRequired, TypedDict
+
+import requests
+
+from app.utils.cache import get_ttl_hash
+from app.utils.metrics import DEGRADATION_LEVEL
+
+
+class DegradationLevel(TypedDict):
+    # The level applies once either threshold is reached
+    min_queue_depth: NotRequired[int]
+    min_queue_age: NotRequired[float]
+    # What to change at this level
+    whisper_model: NotRequired[str]
+    decode_options: NotRequired[dict[str, Any]]
+    skip_llm: NotRequired[bool]
+    # Send notifications from the deferred queue once the backlog has cleared
+    defer_notifications: NotRequired[bool]
+
+
+@lru_cache()
+def get_degradation_config(ttl_hash=None) -> list[DegradationLevel]:
+    del ttl_hash
+
+    config = "config/degradation.json"
+    if os.path.isfile(config):
+        with open(config) as file:
+            return json.load(file)
+    return []
+
+
+@lru_cache()
+def get_queue_depth(queue: str, ttl_hash=None) -> int | None:
+    """Read the number of messages waiting in the queue from the RabbitMQ management API"""
+    del ttl_hash
+
+    broker_api = os.getenv("FLOWER_BROKER_API")
+    if not broker_api:
+        return None
+    try:
+        r = requests.get(f"{broker_api}queues/%2F/{queue}", timeout=5)
+        r.raise_for_status()
+        return r.json()["messages_ready"]
+    except Exception as e:
+        logging.warning(f"Could not get status of queue {queue}: {repr(e)}")
+        return None
+
+
+class DegradationController:
+    """
+    Steps through the levels in config/degradation.json as the queue backs up, trading transcription quality
+    for throughput. The level goes up as soon as a threshold is reached, but only comes back down one level
+    at a time once the queue has stayed below the current level's thresholds for the cooldown period,
+    so it doesn't flap while a backlog is draining.
+    """
+
+    def __init__(self, queue: str, cooldown: float = 60):
+        self.queue = queue
+        self.cooldown = cooldown
+        self.level = 0
+        self.queue_age = 0.0
+        # The age is only observed as tasks arrive, so this tells when it went out of date
+        self.queue_age_at = 0.0
+        self.below_since: float | None = None
+        self.lock = Lock()
+
+    def observe_queue_age(self, age: float) -> None:
+        """Record how long the last task waited in the queue"""
+        self.queue_age = age
+        self.queue_age_at = time.time()
+
+    def get_queue_age(self) -> float:
+        """How long the last task waited in the queue, or 0 once no task has arrived for the cooldown period"""
+        if time.time() - self.queue_age_at >= self.cooldown:
+            return 0.0
+        return self.queue_age
+
+    def get_level(self) -> tuple[int, DegradationLevel]:
+        levels = get_degradation_config(get_ttl_hash(cache_seconds=60))
+        if not levels:
+            return 0, {}
+
+        depth = get_queue_depth(self.queue, get_ttl_hash(cache_seconds=10))
+        age = self.get_queue_age()
+        with self.lock:
+            target = 0
+            for i, level in enumerate(levels, start=1):
+                if self.is_reached(level, depth, age):
+                    target = i
+
+            now = time.time()
+            if target >= self.level:
+                if target > self.level:
+                    logging.warning(
+                        f"Queue {self.queue} backed up ({depth} waiting, {age:.0f}s behind), degrading to level {target}"
+                    )
+                self.level = target
+                self.below_since = None
+            elif self.below_since is None:
+                self.below_since = now
+            elif now - self.below_since >= self.cooldown:
+                self.level -= 1
+                self.below_since = now
+                logging.info(
+                    f"Queue {self.queue} recovering, back to level {self.level}"
+                )
+
+            self.level = min(self.level, len(levels))
+            DEGRADATION_LEVEL.set(self.level)
+            return self.level, levels[self.level - 1] if self.level else {}
+
+    def is_reached(
+        self, level: DegradationLevel, depth: int | None, age: float
+    ) -> bool:
+        if (
+            "min_queue_depth" in level
+            and depth is not None
+            and depth >= level["min_queue_depth"]
+        ):
+            return True
+        return "min_queue_age" in level and age >= level["min_queue_age"]
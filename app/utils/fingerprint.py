@@ -0,0 +1,169 @@
+import time
+from collections import Counter
+from threading import Event, Lock
+from typing import TypedDict
+
+import numpy as np
+import numpy.typing as npt
+
+from .conversion import SAMPLE_RATE
+
+FRAME_SIZE = 512
+HOP_SIZE = 256
+# Radio voice is band limited, so only look for peaks where there's speech
+MIN_FREQ = 300
+MAX_FREQ = 3400
+PEAKS_PER_FRAME = 3
+# Each peak is paired with the peaks in the next few frames
+FAN_OUT_FRAMES = 4
+
+
+# Hashes of pairs of spectral peaks, with the frame the pair starts in
+type Fingerprint = list[tuple[int, int]]
+
+
+def fingerprint(
+    audio: npt.NDArray[np.float32], sample_rate: int = SAMPLE_RATE
+) -> Fingerprint:
+    """
+    Hash pairs of nearby spectral peaks, along with the time between them.
+    Copies of the same transmission (e.g. recorded at different sites) share many hashes at a consistent
+    time offset even when they have different noise, while different calls only share a few by chance.
+    """
+    if len(audio) < FRAME_SIZE:
+        return []
+
+    frames = np.lib.stride_tricks.sliding_window_view(audio, FRAME_SIZE)[::HOP_SIZE]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(FRAME_SIZE), axis=1))
+    freqs = np.fft.rfftfreq(FRAME_SIZE, 1 / sample_rate)
+    spectrum = spectrum[:, (freqs >= MIN_FREQ) & (freqs <= MAX_FREQ)]
+
+    # Skip frames that are mostly silence, their peaks are just noise
+    energy = spectrum.sum(axis=1)
+    voiced = energy > np.median(energy) * 0.5
+
+    peaks = np.argsort(spectrum, axis=1)[:, -PEAKS_PER_FRAME:]
+
+    hashes: Fingerprint = []
+    for t in np.flatnonzero(voiced):
+        for dt in range(1, FAN_OUT_FRAMES + 1):
+            if t + dt >= len(peaks) or not voiced[t + dt]:
+                continue
+            for f1 in peaks[t]:
+                for f2 in peaks[t + dt]:
+                    hashes.append(((int(f1) << 16) | (int(f2) << 8) | dt, int(t)))
+    return hashes
+
+
+def similarity(a: Fingerprint, b: Fingerprint) -> float:
+    """
+    Fraction of hashes in the shorter fingerprint that match the other at the same time offset,
+    allowing a frame either way since the copies won't line up exactly
+    """
+    if not a or not b:
+        return 0
+    times: dict[int, list[int]] = {}
+    for hash, t in b:
+        times.setdefault(hash, []).append(t)
+    offsets: Counter[int] = Counter()
+    for hash, t in a:
+        for other_t in times.get(hash, []):
+            offsets[other_t - t] += 1
+    if not offsets:
+        return 0
+    matches = max(
+        offsets[offset - 1] + offsets[offset] + offsets[offset + 1]
+        for offset in list(offsets)
+    )
+    return min(matches / min(len(a), len(b)), 1)
+
+
+class RecentCall(TypedDict):
+    key: tuple[str, int]
+    start_time: float
+    fingerprint: Fingerprint
+    added_at: float
+    call_id: int | None
+    task_id: str | None
+    # Set once the call is ingested, or failed to be
+    done: Event
+    # Whoever is ingesting the call, to tell copies in the same request apart from ones to wait for
+    owner: object | None
+
+
+class DuplicateIndex:
+    """
+    Fingerprints of recent calls on each talkgroup, to find copies of the same transmission
+    uploaded by more than one recorder. Calls are kept for the window (in seconds),
+    and only match calls that started within the window of each other.
+    """
+
+    def __init__(self, window: float = 30, threshold: float = 0.3):
+        self.window = window
+        self.threshold = threshold
+        self.calls: dict[tuple[str, int], list[RecentCall]] = {}
+        self.lock = Lock()
+
+    def check_and_add(
+        self,
+        key: tuple[str, int],
+        start_time: float,
+        audio_fingerprint: Fingerprint,
+        owner: object | None = None,
+    ) -> tuple[RecentCall, bool]:
+        """
+        Return the call this is a duplicate of and True, or add it and return it with False.
+        Checking and adding happen together so two copies arriving at once can't both be let through.
+        Calls that are added have to be passed to finish once they're ingested or failed to be.
+        """
+        now = time.time()
+        with self.lock:
+            for talkgroup_key in list(self.calls):
+                recent = [
+                    call
+                    for call in self.calls[talkgroup_key]
+                    if now - call["added_at"] <= self.window
+                ]
+                if recent:
+                    self.calls[talkgroup_key] = recent
+                else:
+                    del self.calls[talkgroup_key]
+
+            for call in self.calls.get(key, []):
+                if (
+                    abs(call["start_time"] - start_time) <= self.window
+                    and similarity(call["fingerprint"], audio_fingerprint)
+                    >= self.threshold
+                ):
+                    return call, True
+
+            call = RecentCall(
+                key=key,
+                start_time=start_time,
+                fingerprint=audio_fingerprint,
+                added_at=now,
+                call_id=None,
+                task_id=None,
+                done=Event(),
+                owner=owner,
+            )
+            self.calls.setdefault(key, []).append(call)
+            return call, False
+
+    def finish(self, call: RecentCall) -> None:
+        """
+        Mark a call as done being ingested. Calls that never got a task are forgotten,
+        so the next copy to arrive is ingested in their place instead of being skipped.
+        """
+        if not call["task_id"]:
+            with self.lock:
+                calls = [
+                    other
+                    for other in self.calls.get(call["key"], [])
+                    if other is not call
+                ]
+                if calls:
+                    self.calls[call["key"]] = calls
+                else:
+                    self.calls.pop(call["key"], None)
+        call["done"].set()
@@ -0,0 +1,180 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Generator
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+
+from app.models.metadata import SearchableMetadata
+
+# Most stages take well under a second, but inference and geocoding with an LLM can take much longer
+STAGE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LATENCY_BUCKETS = (1, 2.5, 5, 10, 15, 30, 60, 120, 300, 600, 1200, 3600)
+
+STAGE_DURATION = Histogram(
+    "transcribe_stage_duration_seconds",
+    "Time spent in each stage of processing a call",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+STAGE_FAILURES = Counter(
+    "transcribe_stage_failures_total",
+    "Number of times each stage of processing a call raised an exception",
+    ["stage"],
+)
+INFERENCE_DURATION = Histogram(
+    "transcribe_inference_duration_seconds",
+    "Time spent running the Whisper model, per implementation",
+    ["implementation"],
+    buckets=STAGE_BUCKETS,
+)
+REAL_TIME_FACTOR = Histogram(
+    "transcribe_real_time_factor",
+    "Inference time divided by the duration of the audio, per implementation",
+    ["implementation"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2),
+)
+QUEUE_WAIT = Histogram(
+    "transcribe_queue_wait_seconds",
+    "Time tasks spent waiting in the queue before a worker started them",
+    ["task"],
+    buckets=LATENCY_BUCKETS,
+)
+CALL_LATENCY = Histogram(
+    "transcribe_call_latency_seconds",
+    "Time from the end of a call until it reached each stage",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "transcribe_cache_requests_total",
+    "Transcription cache lookups, by whether they were a hit or a miss",
+    ["result"],
+)
+
+SILENCE_TRIMMED = Counter(
+    "transcribe_silence_trimmed_seconds_total",
+    "Seconds of silence or noise cut from calls before inference, including rejected calls",
+)
+SILENCE_REJECTED = Counter(
+    "transcribe_silence_rejected_total",
+    "Calls not transcribed because they had no speech",
+)
+
+CONVERSION_CACHE_EVENTS = Counter(
+    "transcribe_conversion_cache_events_total",
+    "Converted audio cache hits, misses and evictions",
+    ["event"],
+)
+
+MODEL_CACHE_EVENTS = Counter(
+    "transcribe_model_cache_events_total",
+    "Model cache hits, loads and evictions",
+    ["event"],
+)
+MODEL_LOAD_DURATION = Histogram(
+    "transcribe_model_load_duration_seconds",
+    "Time spent loading and warming up models when a worker starts",
+    ["implementation", "phase"],
+    buckets=STAGE_BUCKETS + (120, 300),
+)
+DEGRADATION_LEVEL = Gauge(
+    "transcribe_degradation_level",
+    "Degradation level the worker is running at, where 0 is full quality",
+    multiprocess_mode="livemax",
+)
+
+NOTIFICATIONS_EXPIRED = Counter(
+    "transcribe_notifications_expired_total",
+    "Calls whose notifications weren't sent since they were older than MAX_CALL_AGE by then",
+)
+
+CIRCUIT_BREAKER_STATE = Gauge(
+    "transcribe_circuit_breaker_state",
+    "State of the circuit breaker for each downstream service (0 closed, 1 half open, 2 open)",
+    ["breaker"],
+    multiprocess_mode="livemax",
+)
+CIRCUIT_BREAKER_TRANSITIONS = Counter(
+    "transcribe_circuit_breaker_transitions_total",
+    "Number of times each circuit breaker changed to each state",
+    ["breaker", "state"],
+)
+
+
+@contextmanager
+def time_stage(stage: str) -> Generator[None, None, None]:
+    """Record how long the wrapped block takes, and count it as a failure if it raises"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_FAILURES.labels(stage).inc()
+        raise
+    finally:
+        STAGE_DURATION.labels(stage).observe(time.perf_counter() - start_time)
+
+
+def observe_inference(
+    implementation: str, execution_time: float, audio_duration: float | None
+) -> None:
+    INFERENCE_DURATION.labels(implementation).observe(execution_time)
+    if audio_duration:
+        REAL_TIME_FACTOR.labels(implementation).observe(execution_time / audio_duration)
+
+
+def observe_queue_wait(task: str, sent_at: float | None) -> None:
+    if sent_at:
+        QUEUE_WAIT.labels(task).observe(max(time.time() - sent_at, 0))
+
+
+def observe_call_latency(metadata: SearchableMetadata, stage: str) -> None:
+    CALL_LATENCY.labels(stage).observe(max(time.time() - metadata["stop_time"], 0))
+
+
+def get_registry() -> CollectorRegistry:
+    """
+    With PROMETHEUS_MULTIPROC_DIR set, each process writes its metrics to that directory,
+    so the metrics from every worker process or API server process have to be collected from there
+    """
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)  # type: ignore[no-untyped-call]
+    return registry
+
+
+def generate_metrics() -> tuple[bytes, str]:
+    return generate_latest(get_registry()), CONTENT_TYPE_LATEST
+
+
+def start_exporter(child_processes: bool = False) -> None:
+    """
+    Serve metrics on METRICS_PORT. Metrics from child processes (e.g. the prefork pool) can only be collected
+    through PROMETHEUS_MULTIPROC_DIR, so refuse to serve metrics that would always be empty without it.
+    """
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return
+    if child_processes and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        raise RuntimeError(
+            "PROMETHEUS_MULTIPROC_DIR has to be set to serve metrics from child processes"
+        )
+    logging.info(f"Serving metrics on port {port}")
+    start_http_server(int(port), registry=get_registry())
+
+
+def mark_process_dead(pid: int) -> None:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)  # type: ignore[no-untyped-call]
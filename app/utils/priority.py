@@ -0,0 +1,52 @@
+import logging
+import os
+
+from app.models.metadata import Metadata
+from app.notifications.config import get_notifications_config
+from app.notifications.notification import get_matching_config
+from app.utils.cache import get_ttl_hash
+
+# Message priorities, where higher is more urgent (as in RabbitMQ)
+EMERGENCY_PRIORITY = 9
+ALERT_PRIORITY = 6
+TALKGROUP_TAG_PRIORITY = 3
+DEFAULT_PRIORITY = 0
+
+
+def has_alerts(metadata: Metadata) -> bool:
+    """Whether the notifications config has any alerts that could be sent for this call"""
+    try:
+        config = get_notifications_config(get_ttl_hash(cache_seconds=60))
+    except Exception as e:
+        logging.warning(f"Could not load notifications config for priority: {repr(e)}")
+        return False
+    return any(
+        len(alert["channels"])
+        for match in get_matching_config(metadata, config)
+        for alert in match["alerts"]
+    )
+
+
+def get_priority(metadata: Metadata) -> int:
+    """
+    Pick a priority for transcribing a call, so emergencies and calls on talkgroups that can trigger alerts
+    don't have to wait behind routine traffic.
+    Talkgroup tags (e.g. "Fire Dispatch") to prioritize can be set in PRIORITY_TALKGROUP_TAGS.
+    """
+    if metadata.get("emergency"):
+        return EMERGENCY_PRIORITY
+    if has_alerts(metadata):
+        return ALERT_PRIORITY
+    tags = filter(len, os.getenv("PRIORITY_TALKGROUP_TAGS", "").split(","))
+    if metadata["talkgroup_group_tag"] in [tag.strip() for tag in tags]:
+        return TALKGROUP_TAG_PRIORITY
+    return DEFAULT_PRIORITY
+
+
+def to_broker_priority(priority: int, max_priority: int, broker_url: str) -> int:
+    """Scale a priority to the range the broker supports"""
+    priority = round(priority * max_priority / EMERGENCY_PRIORITY)
+    # Redis emulates priorities with separate lists, where 0 is the most urgent
+    if broker_url.startswith(("redis://", "rediss://")):
+        return max_priority - priority
+    return priority
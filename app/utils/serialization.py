@@ -0,0 +1,46 @@
+import zlib
+from datetime import date, datetime
+from typing import Any
+
+import msgpack
+from kombu.serialization import register
+
+SERIALIZER = "msgpack-zlib"
+# Payloads smaller than this don't shrink enough to be worth compressing
+COMPRESSION_THRESHOLD = 1024
+
+# First byte of each payload, saying whether the rest is compressed
+UNCOMPRESSED = b"\x00"
+COMPRESSED = b"\x01"
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    data = msgpack.packb(obj, default=_default)
+    if len(data) >= COMPRESSION_THRESHOLD:
+        return COMPRESSED + zlib.compress(data)
+    return UNCOMPRESSED + data
+
+
+def loads(data: bytes | str) -> Any:
+    if isinstance(data, str):
+        data = data.encode("latin-1")
+    body = data[1:]
+    if data[:1] == COMPRESSED:
+        body = zlib.decompress(body)
+    return msgpack.unpackb(body)
+
+
+def register_serializer() -> None:
+    register(
+        SERIALIZER,
+        dumps,  # type: ignore[arg-type]
+        loads,
+        content_type="application/x-msgpack-zlib",
+        content_encoding="binary",
+    )
@@ -1,19 +1,38 @@
+import io
+import logging
 import os
+import shutil
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime
 from functools import lru_cache
 from mimetypes import guess_type
 import tempfile
+from typing import IO, BinaryIO, Callable
 
 import boto3
 import pytz
 from botocore.config import Config
 from datauri import DataURI
+import numpy as np
+import numpy.typing as npt
 import requests
 
-from .conversion import convert_to_mp3, convert_to_wav
+from .conversion import (
+    WORKER_FORMATS,
+    convert_to_mp3,
+    convert_to_wav,
+    decode_audio,
+    encode_mp3_stream,
+    encode_stream,
+)
+from .exceptions import BaseException
+from .metrics import time_stage
 from app.models.metadata import Metadata
 
 
+class EncodeException(BaseException): ...
+
+
 @lru_cache()
 def get_storage_client():
     return boto3.resource(
@@ -39,42 +58,248 @@ def upload_file(filename: str, remote_path: str | None = None) -> str:
     return f"{os.getenv('S3_PUBLIC_URL', '')}/{remote_path}"
 
 
-def upload_raw_audio(metadata: Metadata, audio_file: str) -> str:
+def upload_fileobj(file: BinaryIO, remote_path: str) -> str:
+    """Upload from a file object as it's read, in parts if it's large, without needing to know its size"""
+    mime_type = guess_type(remote_path)
+    get_storage_client().Bucket(os.getenv("S3_BUCKET")).upload_fileobj(
+        Fileobj=file,
+        Key=remote_path,
+        ExtraArgs={"ACL": "public-read", "ContentType": mime_type[0]},
+    )
+    return f"{os.getenv('S3_PUBLIC_URL', '')}/{remote_path}"
+
+
+def delete_file(remote_path: str) -> None:
+    get_storage_client().Bucket(os.getenv("S3_BUCKET")).Object(remote_path).delete()
+
+
+def get_raw_audio_path(metadata: Metadata) -> str:
     start_time = datetime.fromtimestamp(metadata["start_time"], tz=pytz.UTC)
-    uploaded_audio_path = (
+    return (
         start_time.strftime("%Y/%m/%d/%H/%Y%m%d_%H%M%S")
         + f"_{metadata['short_name']}_{metadata['talkgroup']}.mp3"
     )
 
-    mp3 = convert_to_mp3(audio_file, metadata)
-    url = upload_file(mp3, uploaded_audio_path)
+
+def upload_raw_audio(metadata: Metadata, audio_file: str) -> str:
+    with time_stage("convert_audio"):
+        mp3 = convert_to_mp3(audio_file, metadata)
+    with time_stage("upload_audio"):
+        url = upload_file(mp3, get_raw_audio_path(metadata))
     os.unlink(mp3)
 
     return url
 
 
-def fetch_audio(audio_url: str) -> str:
-    mp3_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-    if audio_url.startswith("data:"):
-        uri = DataURI(audio_url)
-        mp3_file.write(uri.data)
-        mp3_file.close()
-    else:
-        # Do this replacement so we can use the correct URL inside of Docker
-        localhost_url = "http://127.0.0.1:9000"
-        if audio_url.startswith(localhost_url):
-            audio_url = audio_url.replace(
-                localhost_url, os.getenv("S3_ENDPOINT", "http://minio:9000")
+@lru_cache()
+def get_encoder_executor() -> ThreadPoolExecutor:
+    # One encoder for every upload the API runs at once (the MP3 and the rendition for workers),
+    # so no upload sits waiting on an empty pipe
+    return ThreadPoolExecutor(
+        max_workers=int(os.getenv("API_INGEST_CONCURRENCY", 32)) * 2,
+        thread_name_prefix="encode",
+    )
+
+
+@lru_cache()
+def get_upload_executor() -> ThreadPoolExecutor:
+    # Uploads the rendition for workers while the API uploads the MP3
+    return ThreadPoolExecutor(
+        max_workers=int(os.getenv("API_INGEST_CONCURRENCY", 32)),
+        thread_name_prefix="upload",
+    )
+
+
+def stream_upload(
+    audio: BinaryIO, remote_path: str, encode: Callable[[BinaryIO, BinaryIO], None]
+) -> str:
+    """
+    Encode audio and send it to S3 at the same time, through a pipe, so the encoded audio
+    never has to be written out to a temp file. Nothing is left uploaded if encoding fails.
+    """
+    read_fd, write_fd = os.pipe()
+    reader = os.fdopen(read_fd, "rb")
+    writer = os.fdopen(write_fd, "wb")
+
+    def encode_to_pipe() -> None:
+        # Closing the pipe ends the upload, whether or not encoding finished
+        with writer:
+            encode(audio, writer)
+
+    encoding = get_encoder_executor().submit(encode_to_pipe)
+    try:
+        url = upload_fileobj(reader, remote_path)
+    finally:
+        # If the upload failed, this stops the encoder with a broken pipe. It has to stop
+        # before returning, since the caller goes on to reuse or close the audio.
+        reader.close()
+        wait([encoding])
+
+    try:
+        encoding.result()
+    except Exception as e:
+        # What was uploaded is incomplete
+        delete_file(remote_path)
+        raise EncodeException(f"Could not encode audio for {remote_path}") from e
+    return url
+
+
+def upload_raw_audio_stream(
+    metadata: Metadata, audio: BinaryIO
+) -> tuple[str, str | None]:
+    """
+    Upload the MP3 of a call as it's encoded, and the rendition for workers at the same time if one is configured.
+    Returns the URL of the MP3 and the format of the rendition for workers, if it was uploaded.
+    """
+    remote_path = get_raw_audio_path(metadata)
+    worker_format = get_worker_audio_format()
+    worker_upload: Future[bool] | None = None
+    if worker_format:
+        # The encoders can't share a file object, so the rendition is encoded from a copy
+        audio.seek(0)
+        worker_upload = get_upload_executor().submit(
+            upload_worker_audio_stream,
+            remote_path,
+            io.BytesIO(audio.read()),
+            worker_format,
+        )
+        audio.seek(0)
+
+    try:
+        with time_stage("upload_audio_stream"):
+            try:
+                url = stream_upload(
+                    audio,
+                    remote_path,
+                    lambda audio, output: encode_mp3_stream(audio, output, metadata),
+                )
+            except EncodeException as e:
+                logging.warning(
+                    f"Could not stream audio to {remote_path}, uploading it from a file: {repr(e.__cause__)}"
+                )
+                audio.seek(0)
+                with tempfile.NamedTemporaryFile(suffix=".audio") as file:
+                    shutil.copyfileobj(audio, file)
+                    file.flush()
+                    url = upload_raw_audio(metadata, file.name)
+    finally:
+        worker_uploaded = worker_upload.result() if worker_upload else False
+    return url, worker_format if worker_uploaded else None
+
+
+def get_worker_audio_format() -> str | None:
+    worker_format = os.getenv("WORKER_AUDIO_FORMAT", "").lower()
+    if not worker_format:
+        return None
+    if worker_format not in WORKER_FORMATS:
+        raise RuntimeError(f"Unknown worker audio format {worker_format}")
+    return worker_format
+
+
+def get_worker_audio_path(path: str, worker_format: str) -> str:
+    """Where the rendition for workers is stored, next to the MP3"""
+    return f"{path.removesuffix('.mp3')}.{WORKER_FORMATS[worker_format][0]}"
+
+
+def upload_worker_audio_stream(
+    raw_audio_path: str, audio: BinaryIO, worker_format: str
+) -> bool:
+    """
+    Store 16 kHz mono audio for workers, so they skip decoding the MP3 and don't transcribe a second lossy generation.
+    Workers fall back to the MP3 without it, so a failure here doesn't fail the upload. Returns whether it was stored.
+    """
+    container, output_format = WORKER_FORMATS[worker_format]
+    remote_path = get_worker_audio_path(raw_audio_path, worker_format)
+    try:
+        with time_stage("upload_worker_audio"):
+            stream_upload(
+                audio,
+                remote_path,
+                lambda audio, output: encode_stream(
+                    audio, output, container, output_format
+                ),
             )
+    except Exception as e:
+        logging.warning(f"Could not upload worker audio to {remote_path}: {repr(e)}")
+        return False
+    return True
+
+
+def download_audio(audio_url: str, file: IO[bytes]) -> None:
+    """Write the audio at a URL to a file as it's downloaded"""
+    if audio_url.startswith("data:"):
+        file.write(DataURI(audio_url).data)
+        return
+
+    # Do this replacement so we can use the correct URL inside of Docker
+    localhost_url = "http://127.0.0.1:9000"
+    if audio_url.startswith(localhost_url):
+        audio_url = audio_url.replace(
+            localhost_url, os.getenv("S3_ENDPOINT", "http://minio:9000")
+        )
+    with time_stage("fetch_audio"):
         with requests.get(audio_url, stream=True) as r:
             r.raise_for_status()
             for chunk in r.iter_content(chunk_size=1024 * 1024):
-                mp3_file.write(chunk)
-            mp3_file.close()
+                file.write(chunk)
+
 
+def fetch_audio_data(audio_url: str) -> bytes:
+    data = io.BytesIO()
+    download_audio(audio_url, data)
+    return data.getvalue()
+
+
+def download_worker_audio(
+    audio_url: str, file: IO[bytes], worker_format: str | None = None
+) -> str:
+    """
+    Download the 16 kHz rendition stored for workers if the call has one, or the MP3 otherwise.
+    Returns the file extension of the audio.
+    """
+    if worker_format and audio_url.endswith(".mp3"):
+        worker_audio_url = get_worker_audio_path(audio_url, worker_format)
+        try:
+            download_audio(worker_audio_url, file)
+            return WORKER_FORMATS[worker_format][0]
+        except requests.RequestException as e:
+            logging.warning(
+                f"Could not fetch {worker_audio_url}, using the MP3: {repr(e)}"
+            )
+            # Drop whatever was downloaded before it failed
+            file.seek(0)
+            file.truncate()
+    download_audio(audio_url, file)
+    return "mp3"
+
+
+def fetch_worker_audio_data(
+    audio_url: str, worker_format: str | None = None
+) -> tuple[bytes, str]:
+    """Fetch the audio download_worker_audio would download into memory, with its file extension"""
+    data = io.BytesIO()
+    extension = download_worker_audio(audio_url, data, worker_format)
+    return data.getvalue(), extension
+
+
+def fetch_audio(audio_url: str, worker_format: str | None = None) -> str:
+    # The extension is only known once it's downloaded, but the format is read from the file itself
+    downloaded_file = tempfile.NamedTemporaryFile(delete=False, suffix=".audio")
     try:
-        audio_file = convert_to_wav(mp3_file.name)
+        with downloaded_file:
+            download_worker_audio(audio_url, downloaded_file, worker_format)
+        with time_stage("convert_audio"):
+            audio_file = convert_to_wav(downloaded_file.name)
     finally:
-        os.unlink(mp3_file.name)
+        os.unlink(downloaded_file.name)
 
     return audio_file
+
+
+def fetch_audio_array(
+    audio_url: str, worker_format: str | None = None
+) -> npt.NDArray[np.float32]:
+    """Fetch audio and decode it in memory, without writing any temp files"""
+    data, _ = fetch_worker_audio_data(audio_url, worker_format)
+    with time_stage("decode_audio"):
+        return decode_audio(data)
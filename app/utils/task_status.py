@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, TypedDict
+
+from cachetools import TTLCache
+from celery import Celery
+from celery.events import EventDispatcher, EventReceiver
+
+# Events are sent for the ID of the task returned when a call is queued (the post_transcribe task),
+# whichever task is running, so clients only have to follow the one ID
+QUEUED = "queued"
+TRANSCRIBING = "transcribing"
+POST_PROCESSING = "post-processing"
+INDEXED = "indexed"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINAL_STATUSES = [SUCCEEDED, FAILED]
+
+# Outside the task- namespace, which Celery's event consumers (e.g. Flower) treat as task state changes
+EVENT_TYPE = "call-status"
+
+# One dispatcher for each process, which every thread sends through (it serializes sends itself)
+dispatchers: dict[tuple[int, int], EventDispatcher] = {}
+dispatchers_lock = threading.Lock()
+
+
+class TaskStatus(TypedDict, total=False):
+    task_id: str
+    status: str
+    timestamp: float
+    error: str
+
+
+def get_dispatcher(app: Celery) -> EventDispatcher:
+    # Forked worker processes can't use their parent's connection, so each process gets its own
+    key = (id(app), os.getpid())
+    with dispatchers_lock:
+        if key not in dispatchers:
+            dispatchers[key] = EventDispatcher(app.connection_for_write(), app=app)
+        return dispatchers[key]
+
+
+def send_status(app: Celery, task_id: str | None, status: str, **fields: Any) -> None:
+    """Broadcast a status change to anyone streaming it, without ever failing the task over it"""
+    if not task_id:
+        return
+    try:
+        get_dispatcher(app).send(
+            EVENT_TYPE,
+            retry=True,
+            retry_policy={"max_retries": 1},
+            uuid=task_id,
+            status=status,
+            **fields,
+        )
+    except Exception as e:
+        logging.warning(f"Could not send {status} status for task {task_id}: {repr(e)}")
+
+
+def get_result_id(request: Any) -> str | None:
+    """The ID of the last task in the chain the running task is part of, which is what clients were given"""
+    chain = getattr(request, "chain", None)
+    if chain:
+        # Celery keeps the rest of the chain in reverse, so the last task is first
+        return chain[0].get("options", {}).get("task_id")
+    return request.id
+
+
+class TaskStatusHub:
+    """
+    Hands status events from the broker out to the clients streaming them. The last status of each task
+    is kept for ttl seconds, so clients that subscribe after a task has moved on still get its status.
+    """
+
+    def __init__(self, app: Celery, maxsize: int = 100000, ttl: float = 3600):
+        self.app = app
+        self.statuses: TTLCache[str, TaskStatus] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.subscribers: dict[
+            str, set[tuple[asyncio.AbstractEventLoop, asyncio.Queue[TaskStatus]]]
+        ] = {}
+        self.lock = threading.Lock()
+        self.receiver: threading.Thread | None = None
+
+    def publish(self, status: TaskStatus) -> None:
+        with self.lock:
+            self.statuses[status["task_id"]] = status
+            subscribers = list(self.subscribers.get(status["task_id"], []))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, status)
+
+    def subscribe(self, task_ids: list[str]) -> asyncio.Queue[TaskStatus]:
+        """Get a queue of status changes for the tasks, starting with the last known status of each"""
+        self.start()
+        queue: asyncio.Queue[TaskStatus] = asyncio.Queue()
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self.lock:
+            for task_id in task_ids:
+                self.subscribers.setdefault(task_id, set()).add(subscriber)
+                if task_id in self.statuses:
+                    queue.put_nowait(self.statuses[task_id])
+        return queue
+
+    def unsubscribe(self, task_ids: list[str], queue: asyncio.Queue[TaskStatus]):
+        with self.lock:
+            for task_id in task_ids:
+                subscribers = self.subscribers.get(task_id, set())
+                subscribers.difference_update(
+                    [subscriber for subscriber in subscribers if subscriber[1] is queue]
+                )
+                if not subscribers:
+                    self.subscribers.pop(task_id, None)
+
+    def is_known(self, task_id: str) -> bool:
+        with self.lock:
+            return task_id in self.statuses
+
+    def start(self) -> None:
+        """Start listening for status events in the background, on first use so the API can start without the broker"""
+        with self.lock:
+            if self.receiver is None:
+                self.receiver = threading.Thread(
+                    target=self.receive, name="task-status-receiver", daemon=True
+                )
+                self.receiver.start()
+
+    def receive(self) -> None:
+        def on_event(event: dict) -> None:
+            status: TaskStatus = {
+                "task_id": event["uuid"],
+                "status": event["status"],
+                "timestamp": event.get("timestamp", time.time()),
+            }
+            if "error" in event:
+                status["error"] = event["error"]
+            self.publish(status)
+
+        while True:
+            try:
+                with self.app.connection_for_read() as connection:
+                    receiver = EventReceiver(
+                        connection,
+                        app=self.app,
+                        handlers={EVENT_TYPE: on_event},
+                        routing_key=EVENT_TYPE.replace("-", "."),
+                    )
+                    receiver.capture(limit=None, timeout=None, wakeup=False)
+            except Exception as e:
+                logging.warning(f"Lost connection for task status events: {repr(e)}")
+                time.sleep(5)
@@ -1,8 +1,14 @@
 from abc import ABC, abstractmethod
-from typing import Any, Optional, TypedDict
+from typing import Any, NotRequired, Optional, TypedDict
+
+import numpy as np
+import numpy.typing as npt
 
 from app.whisper.config import TranscriptCleanupConfig
 
+# Either a path to an audio file, or 16 kHz mono float32 PCM decoded in memory
+type Audio = str | npt.NDArray[np.float32]
+
 
 class WhisperSegment(TypedDict):
     start: float
@@ -10,10 +16,15 @@ class WhisperSegment(TypedDict):
     text: str
 
 
+# Bumped whenever the fields kept in compacted results change
+RESULT_VERSION = 1
+
+
 class WhisperResult(TypedDict):
     text: str
     segments: list[WhisperSegment]
     language: Optional[str]
+    version: NotRequired[int]
 
 
 class TranscribeOptions(TypedDict):
@@ -22,9 +33,14 @@ class TranscribeOptions(TypedDict):
     vad_filter: bool
     decode_options: dict[str, Any]
     cleanup_config: TranscriptCleanupConfig
+    # Set by the API when it stored a 16 kHz rendition of the call for workers next to the MP3
+    worker_audio_format: NotRequired[str]
 
 
 class BaseWhisper(ABC):
+    # Whether transcribe() can take decoded PCM (Audio) instead of a file path
+    accepts_array: bool = False
+
     @abstractmethod
     def transcribe(
         self,
@@ -33,3 +49,18 @@ class BaseWhisper(ABC):
         language: str = "en",
     ) -> WhisperResult:
         pass
+
+    def transcribe_bulk(
+        self,
+        audio_files: list[str],
+        options_list: list[TranscribeOptions],
+        language: str = "en",
+    ) -> list[WhisperResult]:
+        """
+        Transcribe several files at once. Implementations that can batch inference
+        on the GPU should override this; by default each file is transcribed in turn.
+        """
+        return [
+            self.transcribe(audio, options, language=language)
+            for audio, options in zip(audio_files, options_list)
+        ]
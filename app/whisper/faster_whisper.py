@@ -1,10 +1,12 @@
 import os
 import torch
-from .base import BaseWhisper, TranscribeOptions, WhisperResult
+from .base import Audio, BaseWhisper, TranscribeOptions, WhisperResult
 from faster_whisper import WhisperModel
 
 
 class FasterWhisper(BaseWhisper):
+    accepts_array = True
+
     def __init__(self, model_name: str):
         torch_device = os.getenv(
             "TORCH_DEVICE", "cuda:0" if torch.cuda.is_available() else "cpu"
@@ -29,7 +31,7 @@ class FasterWhisper(BaseWhisper):
 
     def transcribe(
         self,
-        audio: str,
+        audio: Audio,
         options: TranscribeOptions,
         language: str = "en",
     ) -> WhisperResult:
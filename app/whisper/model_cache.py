@@ -0,0 +1,146 @@
+import gc
+import logging
+import sys
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable
+
+from app.utils.metrics import MODEL_CACHE_EVENTS
+from .base import BaseWhisper
+
+# Approximate VRAM needed by the original Whisper implementation for each model size, in MB
+# https://github.com/openai/whisper#available-models-and-languages
+MODEL_FOOTPRINTS = {
+    "tiny": 1000,
+    "base": 1000,
+    "small": 2000,
+    "medium": 5000,
+    "large": 10000,
+    "turbo": 6000,
+}
+# CTranslate2 and ggml run in half precision or quantized, so need much less
+IMPLEMENTATION_SCALES = {
+    "whisper": 1.0,
+    "faster-whisper": 0.5,
+    "whispers2t": 0.5,
+    "whisper.cpp": 0.5,
+}
+
+
+def estimate_footprint(implementation: str) -> int:
+    """Estimate how much VRAM a model will take up in MB, or 0 if it doesn't run locally"""
+    backend, model = implementation.split(":", 1)
+    if backend not in IMPLEMENTATION_SCALES:
+        return 0
+    # Distilled models keep the large encoder but only have a couple decoder layers
+    if model.startswith("distil-"):
+        model = "turbo"
+    size = next(
+        (
+            footprint
+            for name, footprint in MODEL_FOOTPRINTS.items()
+            if model.split("/")[-1].startswith(name)
+        ),
+        MODEL_FOOTPRINTS["large"],
+    )
+    return int(size * IMPLEMENTATION_SCALES[backend])
+
+
+class ModelCache:
+    """
+    Keeps loaded models within a VRAM budget (in MB, 0 for no limit), unloading the least recently used
+    models to make room for new ones. Concurrent requests for a model that isn't loaded yet share one load.
+    """
+
+    def __init__(self, loader: Callable[[str], BaseWhisper], budget: int = 0):
+        self.loader = loader
+        self.budget = budget
+        self.models: OrderedDict[str, BaseWhisper] = OrderedDict()
+        # Includes models that are still loading, so concurrent loads don't overcommit
+        self.footprints: dict[str, int] = {}
+        self.lock = Lock()
+        self.load_locks: dict[str, Lock] = {}
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def __contains__(self, implementation: str) -> bool:
+        return implementation in self.models
+
+    def get(self, implementation: str) -> BaseWhisper:
+        model = self._get_loaded(implementation)
+        if model is not None:
+            return model
+
+        with self.lock:
+            load_lock = self.load_locks.setdefault(implementation, Lock())
+        with load_lock:
+            # Another thread may have loaded it while we waited
+            model = self._get_loaded(implementation)
+            if model is not None:
+                return model
+
+            footprint = estimate_footprint(implementation)
+            with self.lock:
+                evicted = self._make_room(footprint)
+                self.footprints[implementation] = footprint
+            if evicted:
+                self._free_memory()
+            try:
+                model = self.loader(implementation)
+            except BaseException:
+                with self.lock:
+                    del self.footprints[implementation]
+                raise
+
+            with self.lock:
+                self.models[implementation] = model
+                self.loads += 1
+            MODEL_CACHE_EVENTS.labels("load").inc()
+            return model
+
+    def evict(self, implementation: str) -> None:
+        with self.lock:
+            self._evict(implementation)
+        self._free_memory()
+
+    def _get_loaded(self, implementation: str) -> BaseWhisper | None:
+        with self.lock:
+            model = self.models.get(implementation)
+            if model is None:
+                return None
+            self.models.move_to_end(implementation)
+            self.hits += 1
+        MODEL_CACHE_EVENTS.labels("hit").inc()
+        return model
+
+    def _make_room(self, footprint: int) -> bool:
+        """Evict models until one of this size fits in the budget, returning whether any were evicted"""
+        if not self.budget:
+            return False
+        evicted = False
+        while self.models and sum(self.footprints.values()) + footprint > self.budget:
+            self._evict(next(iter(self.models)))
+            evicted = True
+        if sum(self.footprints.values()) + footprint > self.budget:
+            logging.warning(
+                f"Loading a model estimated at {footprint} MB will exceed the VRAM budget of {self.budget} MB"
+            )
+        return evicted
+
+    def _evict(self, implementation: str) -> None:
+        if implementation not in self.models:
+            return
+        logging.info(f"Unloading whisper model {implementation}")
+        del self.models[implementation]
+        del self.footprints[implementation]
+        self.evictions += 1
+        MODEL_CACHE_EVENTS.labels("eviction").inc()
+
+    @staticmethod
+    def _free_memory() -> None:
+        # Tasks still using an evicted model keep it alive until they finish, after that it can be freed
+        gc.collect()
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
@@ -0,0 +1,180 @@
+import json
+import os
+from typing import TypedDict
+
+import numpy as np
+import numpy.typing as npt
+
+from app.utils.conversion import SAMPLE_RATE
+from .base import Audio, BaseWhisper, TranscribeOptions, WhisperResult
+from .silence import read_wav
+
+
+class PackedCall(TypedDict):
+    # Position of the call in the list passed to pack_calls
+    index: int
+    # Where the call starts in the window, in seconds
+    start: float
+    duration: float
+
+
+class Pack(TypedDict):
+    audio: npt.NDArray[np.float32]
+    calls: list[PackedCall]
+
+
+def is_enabled() -> bool:
+    return os.getenv("WHISPER_PACK_CALLS", "").lower() == "true"
+
+
+def pack_calls(
+    calls: list[tuple[int, npt.NDArray[np.float32]]],
+    max_duration: float = 30,
+    gap: float = 1,
+    sample_rate: int = SAMPLE_RATE,
+) -> list[Pack]:
+    """
+    Put calls together into windows of up to max_duration seconds with gap seconds of silence between them,
+    since Whisper pads everything to 30 seconds anyway. The longest calls are placed first, each in the first
+    window with room for it. Calls longer than a window get one to themselves.
+    """
+    gap_samples = int(gap * sample_rate)
+    max_samples = int(max_duration * sample_rate)
+    windows: list[list[tuple[int, npt.NDArray[np.float32]]]] = []
+    lengths: list[int] = []
+    for index, audio in sorted(calls, key=lambda call: len(call[1]), reverse=True):
+        for window, length in enumerate(lengths):
+            if length + gap_samples + len(audio) <= max_samples:
+                windows[window].append((index, audio))
+                lengths[window] += gap_samples + len(audio)
+                break
+        else:
+            windows.append([(index, audio)])
+            lengths.append(len(audio))
+
+    packs: list[Pack] = []
+    silence = np.zeros(gap_samples, dtype=np.float32)
+    for window_calls in windows:
+        chunks: list[npt.NDArray[np.float32]] = []
+        packed_calls: list[PackedCall] = []
+        position = 0
+        for index, audio in window_calls:
+            if chunks:
+                chunks.append(silence)
+                position += gap_samples
+            chunks.append(audio)
+            packed_calls.append(
+                PackedCall(
+                    index=index,
+                    start=position / sample_rate,
+                    duration=len(audio) / sample_rate,
+                )
+            )
+            position += len(audio)
+        packs.append(Pack(audio=np.concatenate(chunks), calls=packed_calls))
+    return packs
+
+
+def split_result(
+    result: WhisperResult, pack: Pack, gap: float = 1
+) -> list[WhisperResult]:
+    """
+    Give each call in the pack the segments from its part of the window, with times relative to the start of
+    the call again. Segments belong to the call their midpoint falls in, or the nearest one if it's in a gap.
+    """
+    results: list[WhisperResult] = [
+        {"text": "", "segments": [], "language": result.get("language")}
+        for _ in pack["calls"]
+    ]
+    for segment in result["segments"]:
+        midpoint = (segment["start"] + segment["end"]) / 2
+        i = next(
+            (
+                i
+                for i, call in enumerate(pack["calls"])
+                if midpoint < call["start"] + call["duration"] + gap / 2
+            ),
+            len(pack["calls"]) - 1,
+        )
+        call = pack["calls"][i]
+        results[i]["segments"].append(
+            {
+                **segment,
+                "start": min(
+                    max(segment["start"] - call["start"], 0), call["duration"]
+                ),
+                "end": min(max(segment["end"] - call["start"], 0), call["duration"]),
+            }
+        )
+    for call_result in results:
+        call_result["text"] = "".join(
+            segment["text"] for segment in call_result["segments"]
+        )
+    return results
+
+
+def get_packing_key(options: TranscribeOptions) -> str:
+    # Only calls transcribed with the same settings can share a window
+    return json.dumps(
+        {
+            "initial_prompt": options["initial_prompt"],
+            "vad_filter": options["vad_filter"],
+            "decode_options": options["decode_options"],
+        },
+        sort_keys=True,
+    )
+
+
+def transcribe_packed(
+    model: BaseWhisper,
+    audio_files: list[Audio],
+    options_list: list[TranscribeOptions],
+    language: str = "en",
+) -> list[WhisperResult]:
+    """
+    Transcribe calls in bulk with several short calls packed into each window, splitting the results back out.
+    Files that can't be read into memory are transcribed on their own.
+    """
+    from .transcribe import prepare_audio
+
+    max_duration = float(os.getenv("WHISPER_PACK_MAX_DURATION", 30))
+    gap = float(os.getenv("WHISPER_PACK_GAP", 1))
+
+    groups: dict[str, list[tuple[int, npt.NDArray[np.float32]]]] = {}
+    unpacked: list[int] = []
+    for i, (audio, options) in enumerate(zip(audio_files, options_list)):
+        decoded = read_wav(audio) if isinstance(audio, str) else audio
+        if decoded is None:
+            unpacked.append(i)
+        else:
+            groups.setdefault(get_packing_key(options), []).append((i, decoded))
+    packs = [
+        pack
+        for calls in groups.values()
+        for pack in pack_calls(calls, max_duration, gap)
+    ]
+
+    windows = [prepare_audio(model, pack["audio"]) for pack in packs]
+    try:
+        transcribed = model.transcribe_bulk(
+            windows + [audio_files[i] for i in unpacked],  # type: ignore[arg-type]
+            [options_list[pack["calls"][0]["index"]] for pack in packs]
+            + [options_list[i] for i in unpacked],
+            language=language,
+        )
+    finally:
+        for window in windows:
+            if isinstance(window, str):
+                os.unlink(window)
+
+    results: list[WhisperResult | None] = [None for _ in audio_files]
+    for pack, result in zip(packs, transcribed):
+        for call, call_result in zip(pack["calls"], split_result(result, pack, gap)):
+            results[call["index"]] = call_result
+    for i, result in zip(unpacked, transcribed[len(packs) :]):
+        results[i] = result
+    packed_results = []
+    for packed in results:
+        assert packed is not None
+        packed_results.append(packed)
+    return packed_results
@@ -0,0 +1,153 @@
+import copy
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from hashlib import sha256
+from threading import Lock
+
+from cachetools import TTLCache
+from celery.backends.base import KeyValueStoreBackend  # type: ignore[attr-defined]
+
+from app.utils.metrics import CACHE_REQUESTS
+
+from .base import Audio, TranscribeOptions, WhisperResult
+
+
+class ResultStore(ABC):
+    @abstractmethod
+    def get(self, key: str) -> WhisperResult | None:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, result: WhisperResult) -> None:
+        pass
+
+
+class MemoryStore(ResultStore):
+    """LRU store local to this worker process, with entries expiring after the TTL"""
+
+    def __init__(self, maxsize: int = 1000, ttl: int = 3600):
+        self.cache: TTLCache[str, WhisperResult] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = Lock()
+
+    def get(self, key: str) -> WhisperResult | None:
+        with self.lock:
+            result = self.cache.get(key)
+        # Copy so later cleanup of the transcript can't modify what is stored
+        return copy.deepcopy(result)
+
+    def set(self, key: str, result: WhisperResult) -> None:
+        with self.lock:
+            self.cache[key] = copy.deepcopy(result)
+
+
+class BackendStore(ResultStore):
+    """
+    Store shared between all workers, kept in the Celery result backend.
+    Requires a key-value result backend such as Redis; the rpc:// backend can't store arbitrary keys.
+    """
+
+    prefix = "transcription-cache-"
+
+    def __init__(self, backend: KeyValueStoreBackend, ttl: int = 3600):
+        self.backend = backend
+        self.ttl = ttl
+
+    def get(self, key: str) -> WhisperResult | None:
+        value = self.backend.get(self.prefix + key)
+        return json.loads(value) if value else None
+
+    def set(self, key: str, result: WhisperResult) -> None:
+        self.backend.set(self.prefix + key, json.dumps(result))
+        self.backend.expire(self.prefix + key, self.ttl)
+
+
+class TranscriptionCache:
+    """
+    Caches transcription results keyed on the audio content and the options that affect the model output,
+    so the same call sent through again (retries, re-polls, duplicate uploads) skips inference.
+    Stores are checked in order, and a hit in a later store is copied to the earlier ones.
+    """
+
+    def __init__(self, stores: list[ResultStore]):
+        self.stores = stores
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def build_key(
+        audio: Audio, options: TranscribeOptions, implementation: str, language: str
+    ) -> str:
+        audio_hash = sha256()
+        if isinstance(audio, str):
+            with open(audio, "rb") as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                    audio_hash.update(chunk)
+        else:
+            audio_hash.update(audio.tobytes())
+
+        params = json.dumps(
+            {
+                "implementation": implementation,
+                "language": language,
+                "initial_prompt": options["initial_prompt"],
+                "vad_filter": options["vad_filter"],
+                "decode_options": options["decode_options"],
+            },
+            sort_keys=True,
+        )
+        return sha256((audio_hash.hexdigest() + params).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> WhisperResult | None:
+        for i, store in enumerate(self.stores):
+            try:
+                result = store.get(key)
+            except Exception as e:
+                logging.warning(f"Could not read from transcription cache: {repr(e)}")
+                continue
+            if result is not None:
+                self.hits += 1
+                CACHE_REQUESTS.labels("hit").inc()
+                for earlier_store in self.stores[:i]:
+                    earlier_store.set(key, result)
+                logging.debug(
+                    f"Transcription cache hit for {key} ({self.hits} hits, {self.misses} misses)"
+                )
+                return result
+        self.misses += 1
+        CACHE_REQUESTS.labels("miss").inc()
+        return None
+
+    def set(self, key: str, result: WhisperResult) -> None:
+        for store in self.stores:
+            try:
+                store.set(key, result)
+            except Exception as e:
+                logging.warning(f"Could not write to transcription cache: {repr(e)}")
+
+
+@lru_cache()
+def get_result_cache(backend=None) -> TranscriptionCache | None:
+    """
+    Build the cache from TRANSCRIBE_CACHE, a comma separated list of stores to use (memory, backend),
+    or return None if caching is disabled, which it is unless stores are given.
+    """
+    ttl = int(os.getenv("TRANSCRIBE_CACHE_TTL", 3600))
+    stores: list[ResultStore] = []
+    for store in filter(len, os.getenv("TRANSCRIBE_CACHE", "").split(",")):
+        if store == "memory":
+            stores.append(
+                MemoryStore(int(os.getenv("TRANSCRIBE_CACHE_SIZE", 1000)), ttl)
+            )
+        elif store == "backend":
+            if isinstance(backend, KeyValueStoreBackend):
+                stores.append(BackendStore(backend, ttl))
+            else:
+                logging.warning(
+                    "Result backend does not support key-value storage, not using it for the transcription cache"
+                )
+        else:
+            raise RuntimeError(f"Unknown transcription cache store {store}")
+    return TranscriptionCache(stores) if stores else None
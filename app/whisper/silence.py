@@ -0,0 +1,123 @@
+import os
+import wave
+
+import numpy as np
+import numpy.typing as npt
+
+from app.utils.conversion import SAMPLE_RATE
+from app.utils.metrics import SILENCE_REJECTED, SILENCE_TRIMMED
+from .base import Audio, WhisperResult
+from .exceptions import WhisperException
+
+# 25 ms frames every 10 ms
+FRAME_SIZE = 400
+HOP_SIZE = 160
+# Radio voice is band limited, so only look at the flatness where there's speech
+MIN_FREQ = 300
+MAX_FREQ = 3400
+# Frames quieter than this are silence however quiet the rest of the call is
+MIN_ENERGY_DB = -55
+# How far above the quietest part of the call a frame needs to be to count as speech
+NOISE_MARGIN_DB = 6
+# Noise has a flat spectrum (white noise is around 0.56), while speech has peaks at its harmonics and formants
+MAX_FLATNESS = 0.4
+# Frames count as speech when most of the surrounding 100 ms does
+SMOOTHING_FRAMES = 10
+
+
+def detect_speech(
+    audio: npt.NDArray[np.float32], sample_rate: int = SAMPLE_RATE
+) -> npt.NDArray[np.bool_]:
+    """Return whether each 10 ms frame of the audio looks like speech, from its energy and spectral flatness"""
+    if len(audio) < FRAME_SIZE:
+        return np.zeros(0, dtype=np.bool_)
+
+    frames = np.lib.stride_tricks.sliding_window_view(audio, FRAME_SIZE)[::HOP_SIZE]
+    energy = 10 * np.log10(np.mean(np.square(frames, dtype=np.float64), axis=1) + 1e-10)
+
+    power = np.square(np.abs(np.fft.rfft(frames * np.hanning(FRAME_SIZE), axis=1)))
+    freqs = np.fft.rfftfreq(FRAME_SIZE, 1 / sample_rate)
+    power = power[:, (freqs >= MIN_FREQ) & (freqs <= MAX_FREQ)] + 1e-12
+    flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+
+    noise_floor = np.percentile(energy, 10)
+    threshold = max(MIN_ENERGY_DB, noise_floor + NOISE_MARGIN_DB)
+    speech = (energy > threshold) & (flatness < MAX_FLATNESS)
+    # Noise occasionally has a frame that looks like speech, but speech lasts for more than a frame or two
+    window = np.ones(SMOOTHING_FRAMES) / SMOOTHING_FRAMES
+    return np.convolve(speech, window, mode="same") > 0.5
+
+
+def trim_silence(
+    audio: npt.NDArray[np.float32],
+    min_speech: float = 0.3,
+    padding: float = 0.2,
+    sample_rate: int = SAMPLE_RATE,
+) -> tuple[npt.NDArray[np.float32], float]:
+    """
+    Cut silence and noise from the start and end of a call, keeping padding seconds around the speech.
+    Returns the trimmed audio and how many seconds were cut from the start, or raises WhisperException
+    if the call has less than min_speech seconds of speech, since Whisper would only hallucinate on it.
+    """
+    speech = detect_speech(audio, sample_rate)
+    if np.count_nonzero(speech) * HOP_SIZE / sample_rate < min_speech:
+        SILENCE_REJECTED.inc()
+        SILENCE_TRIMMED.inc(len(audio) / sample_rate)
+        raise WhisperException("No speech detected in call")
+
+    speech_frames = np.flatnonzero(speech)
+    pad = int(padding * sample_rate)
+    start = max(speech_frames[0] * HOP_SIZE - pad, 0)
+    end = min(speech_frames[-1] * HOP_SIZE + FRAME_SIZE + pad, len(audio))
+    SILENCE_TRIMMED.inc((len(audio) - (end - start)) / sample_rate)
+    return audio[start:end], start / sample_rate
+
+
+def read_wav(audio_file: str) -> npt.NDArray[np.float32] | None:
+    """Read a 16 kHz mono 16-bit WAV like convert_to_wav writes, or return None for anything else"""
+    try:
+        with wave.open(audio_file) as wav:
+            if (
+                wav.getnchannels() != 1
+                or wav.getsampwidth() != 2
+                or wav.getframerate() != SAMPLE_RATE
+            ):
+                return None
+            pcm = np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2")
+    except (OSError, wave.Error, EOFError):
+        return None
+    return pcm.astype(np.float32) / 32768.0
+
+
+def is_enabled() -> bool:
+    return os.getenv("SILENCE_TRIM", "").lower() == "true"
+
+
+def trim_audio(audio: Audio) -> tuple[Audio, float]:
+    """
+    Trim the audio if SILENCE_TRIM is enabled, returning it with the seconds cut from the start.
+    Files are read into memory to be trimmed and then deleted, like transcribe() does with the files it's given.
+    """
+    if not is_enabled():
+        return audio, 0
+    decoded = read_wav(audio) if isinstance(audio, str) else audio
+    if decoded is None:
+        return audio, 0
+    trimmed = trim_silence(
+        decoded,
+        min_speech=float(os.getenv("SILENCE_MIN_SPEECH", 0.3)),
+        padding=float(os.getenv("SILENCE_PADDING", 0.2)),
+    )
+    if isinstance(audio, str):
+        os.unlink(audio)
+    return trimmed
+
+
+def offset_result(result: WhisperResult, offset: float) -> WhisperResult:
+    """Shift timestamps from the trimmed audio back to where they are in the original call"""
+    if not offset:
+        return result
+    for segment in result["segments"]:
+        segment["start"] += offset
+        segment["end"] += offset
+    return result
@@ -1,25 +1,43 @@
 import logging
 import os
+import time
 from threading import Lock
 
+import numpy as np
 from celery_batches import Batches
 
 from app.task import Task
-from .base import BaseWhisper
+from app.utils.conversion import SAMPLE_RATE
+from app.utils.metrics import MODEL_LOAD_DURATION
+from .base import BaseWhisper, TranscribeOptions
+from .config import get_whisper_config
+from .model_cache import ModelCache
+from .transcribe import prepare_audio
 
 API_IMPLEMENTATIONS = ["openai", "deepgram"]
+# Transcribed on another server, so there's nothing to warm up in the worker
+REMOTE_IMPLEMENTATIONS = API_IMPLEMENTATIONS + ["whisper-asr-api"]
 
 
 class WhisperTask(Task):
-    _models: dict[str, BaseWhisper] = {}
+    _model_cache: ModelCache | None = None
+    # Guards creating the shared model cache
     model_lock = Lock()
 
+    @property
+    def model_cache(self) -> ModelCache:
+        # Shared by every task in the process, so all the models loaded count towards the same budget
+        with self.model_lock:
+            if WhisperTask._model_cache is None:
+                WhisperTask._model_cache = ModelCache(
+                    self.initialize_model, int(os.getenv("WHISPER_VRAM_BUDGET_MB", 0))
+                )
+            return WhisperTask._model_cache
+
     def model(self, implementation: str | None = None) -> BaseWhisper:
         if not implementation:
             implementation = self.default_implementation
-        if implementation not in self._models:
-            self._models[implementation] = self.initialize_model(implementation)
-        return self._models[implementation]
+        return self.model_cache.get(implementation)
 
     @property
     def default_implementation(self) -> str:
@@ -38,50 +56,96 @@ class WhisperTask(Task):
         return f"{whisper_implementation}:{model_name}"
 
     def initialize_model(self, implementation: str) -> BaseWhisper:
-        with self.model_lock:
-            logging.info(f"Initializing whisper model {implementation}")
-            implementation, model = implementation.split(":", 1)
-            if implementation == "whisper.cpp":
-                from .whisper_cpp import WhisperCpp
-
-                return WhisperCpp(
-                    model,
-                    os.getenv("WHISPERCPP_MODEL_DIR", "/usr/local/lib/whisper-models"),
-                )
-            if implementation == "faster-whisper":
-                from .faster_whisper import FasterWhisper
-
-                return FasterWhisper(model)
-            if implementation == "whispers2t":
-                from .whisper_s2t import WhisperS2T
-
-                return WhisperS2T(model)
-            if implementation == "whisper":
-                from .whisper import Whisper
-
-                return Whisper(model)
-            if implementation == "openai":
-                api_key = os.getenv("OPENAI_API_KEY")
-                if not api_key:
-                    raise RuntimeError("OPENAI_API_KEY env must be set.")
-                from .openai import OpenAIApi
-
-                return OpenAIApi(api_key)
-            if implementation == "deepgram":
-                api_key = os.getenv("DEEPGRAM_API_KEY")
-                if not api_key:
-                    raise RuntimeError("DEEPGRAM_API_KEY env must be set.")
-                from .deepgram import DeepgramApi
-
-                return DeepgramApi(api_key, model)
-            if implementation == "whisper-asr-api":
-                from .whisper_asr_api import WhisperAsrApi
-
-                return WhisperAsrApi(
-                    base_url=os.getenv("ASR_API_URL", "http://localhost:5000")
-                )
-
-            raise RuntimeError(f"Unknown implementation {implementation}")
+        # ModelCache already makes loads of the same implementation wait for each other,
+        # so different implementations can load at the same time
+        logging.info(f"Initializing whisper model {implementation}")
+        implementation, model = implementation.split(":", 1)
+        if implementation == "whisper.cpp":
+            from .whisper_cpp import WhisperCpp
+
+            return WhisperCpp(
+                model,
+                os.getenv("WHISPERCPP_MODEL_DIR", "/usr/local/lib/whisper-models"),
+            )
+        if implementation == "faster-whisper":
+            from .faster_whisper import FasterWhisper
+
+            return FasterWhisper(model)
+        if implementation == "whispers2t":
+            from .whisper_s2t import WhisperS2T
+
+            return WhisperS2T(model)
+        if implementation == "whisper":
+            from .whisper import Whisper
+
+            return Whisper(model)
+        if implementation == "openai":
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise RuntimeError("OPENAI_API_KEY env must be set.")
+            from .openai import OpenAIApi
+
+            return OpenAIApi(api_key)
+        if implementation == "deepgram":
+            api_key = os.getenv("DEEPGRAM_API_KEY")
+            if not api_key:
+                raise RuntimeError("DEEPGRAM_API_KEY env must be set.")
+            from .deepgram import DeepgramApi
+
+            return DeepgramApi(api_key, model)
+        if implementation == "whisper-asr-api":
+            from .whisper_asr_api import WhisperAsrApi
+
+            return WhisperAsrApi(
+                base_url=os.getenv("ASR_API_URL", "http://localhost:5000")
+            )
+
+        raise RuntimeError(f"Unknown implementation {implementation}")
+
+    def preload(self, implementations: list[str]) -> None:
+        """
+        Load models and run a short inference through each of them, so the first call a worker gets
+        doesn't also pay for loading the model and initializing CUDA
+        """
+        for implementation in implementations:
+            start_time = time.perf_counter()
+            model = self.model(implementation)
+            load_time = time.perf_counter() - start_time
+            MODEL_LOAD_DURATION.labels(implementation, "load").observe(load_time)
+
+            # Don't pay for transcribing the warm-up clip with an API or another server
+            if implementation.split(":", 1)[0] in REMOTE_IMPLEMENTATIONS:
+                logging.info(f"Loaded {implementation} in {load_time:.2f}s")
+                continue
+
+            start_time = time.perf_counter()
+            self.warm_up(model)
+            warm_up_time = time.perf_counter() - start_time
+            MODEL_LOAD_DURATION.labels(implementation, "warm_up").observe(warm_up_time)
+            logging.info(
+                f"Loaded {implementation} in {load_time:.2f}s, warmed up in {warm_up_time:.2f}s"
+            )
+
+    @staticmethod
+    def warm_up(model: BaseWhisper) -> None:
+        # A couple seconds of faint noise runs the whole decoder without needing to ship an audio file
+        rng = np.random.default_rng(0)
+        audio = prepare_audio(
+            model,
+            (rng.standard_normal(SAMPLE_RATE * 2) * 0.01).astype(np.float32),
+        )
+        options: TranscribeOptions = {
+            "initial_prompt": "",
+            "cleanup": False,
+            "vad_filter": False,
+            "decode_options": get_whisper_config(),
+            "cleanup_config": [],
+        }
+        try:
+            model.transcribe(audio, options)  # type: ignore[arg-type]
+        finally:
+            if isinstance(audio, str):
+                os.unlink(audio)
 
 
 class WhisperBatchTask(Batches, WhisperTask):
@@ -2,85 +2,224 @@ import json
 import logging
 import os
 import time
+import wave
 
 
-from .base import TranscribeOptions, WhisperResult, BaseWhisper
+from app.utils.conversion import SAMPLE_RATE, write_wav
+from app.utils.metrics import observe_inference, time_stage
+from .base import (
+    RESULT_VERSION,
+    Audio,
+    TranscribeOptions,
+    WhisperResult,
+    BaseWhisper,
+)
 from .exceptions import WhisperException
 from .config import TranscriptCleanupConfig
+from . import packing
+from .result_cache import TranscriptionCache
+from .silence import offset_result, trim_audio
+
+
+def describe_audio(audio: Audio) -> str:
+    if isinstance(audio, str):
+        return audio
+    return f"<{len(audio) / SAMPLE_RATE:.2f}s of decoded audio>"
+
+
+def get_audio_duration(audio: Audio) -> float | None:
+    if not isinstance(audio, str):
+        return len(audio) / SAMPLE_RATE
+    try:
+        with wave.open(audio) as file:
+            return file.getnframes() / file.getframerate()
+    except (OSError, wave.Error, EOFError):
+        return None
+
+
+def compact_result(result: WhisperResult) -> WhisperResult:
+    """
+    Strip results down to what post-processing uses, since some implementations return tokens,
+    words and probabilities for every segment that would otherwise be passed through the broker.
+    Extra segment fields to keep can be listed in WHISPER_RESULT_FIELDS.
+    """
+    fields = ["start", "end", "text"] + list(
+        filter(len, os.getenv("WHISPER_RESULT_FIELDS", "").split(","))
+    )
+    segments = [
+        {field: value for field, value in segment.items() if field in fields}
+        for segment in result["segments"]
+    ]
+    return {
+        "text": result["text"],
+        "segments": segments,  # type: ignore[typeddict-item]
+        "language": result.get("language"),
+        "version": RESULT_VERSION,
+    }
+
+
+def prepare_audio(model: BaseWhisper, audio: Audio) -> Audio:
+    """
+    Write decoded audio out to a WAV file if the model can only read from files,
+    so only models with accepts_array set are ever handed an array
+    """
+    if isinstance(audio, str) or model.accepts_array:
+        return audio
+    return write_wav(audio)
 
 
 def transcribe(
     model: BaseWhisper,
-    audio_file: str,
+    audio: Audio,
     options: TranscribeOptions,
     language: str = "en",
+    cache: TranscriptionCache | None = None,
+    implementation: str = "",
 ) -> WhisperResult:
+    audio_name = describe_audio(audio)
     logging.debug(
-        f'Transcribing {audio_file} with language="{language}", initial_prompt="{options["initial_prompt"]}", vad_filter={options["vad_filter"]}'
+        f'Transcribing {audio_name} with language="{language}", initial_prompt="{options["initial_prompt"]}", vad_filter={options["vad_filter"]}'
     )
 
     # measure transcription time
     start_time = time.time()
 
     try:
-        result = model.transcribe(
-            audio_file,
-            options,
-            language=language,
+        cache_key = (
+            cache.build_key(audio, options, implementation, language) if cache else None
         )
+        result = cache.get(cache_key) if cache and cache_key else None
+        if result is None:
+            with time_stage("trim_silence"):
+                audio, offset = trim_audio(audio)
+            audio = prepare_audio(model, audio)
+            audio_duration = get_audio_duration(audio)
+            inference_start_time = time.perf_counter()
+            result = offset_result(
+                compact_result(
+                    model.transcribe(
+                        audio,  # type: ignore[arg-type]
+                        options,
+                        language=language,
+                    )
+                ),
+                offset,
+            )
+            observe_inference(
+                implementation,
+                time.perf_counter() - inference_start_time,
+                audio_duration,
+            )
+            if cache and cache_key:
+                cache.set(cache_key, result)
     finally:
-        os.unlink(audio_file)
-    logging.debug(f"{audio_file} transcription result: " + json.dumps(result, indent=4))
+        if isinstance(audio, str):
+            os.unlink(audio)
+    logging.debug(f"{audio_name} transcription result: " + json.dumps(result, indent=4))
 
     end_time = time.time()
     execution_time = end_time - start_time
     logging.debug(f"Transcription execution time: {execution_time} seconds")
 
-    return (
-        cleanup_transcript(result, options["cleanup_config"])
-        if options["cleanup"]
-        else result
+    if not options["cleanup"]:
+        return result
+    with time_stage("cleanup"):
+        return cleanup_transcript(result, options["cleanup_config"])
+
+
+def transcribe_bulk(
+    model: BaseWhisper,
+    audio_files: list[Audio],
+    options_list: list[TranscribeOptions],
+    language: str = "en",
+    cache: TranscriptionCache | None = None,
+    implementation: str = "",
+) -> list[WhisperResult | WhisperException]:
+    audio_names = [describe_audio(audio) for audio in audio_files]
+    logging.debug(f"Transcribing {len(audio_files)} files in bulk: {audio_names}")
+
+    # measure transcription time
+    start_time = time.time()
+
+    results: list[WhisperResult | None] = [None for _ in audio_files]
+    # Calls with no speech, which are never sent to the model
+    rejected: dict[int, WhisperException] = {}
+    try:
+        cache_keys = [
+            cache.build_key(audio, options, implementation, language) if cache else None
+            for audio, options in zip(audio_files, options_list)
+        ]
+        if cache:
+            results = [cache.get(key) if key else None for key in cache_keys]
+
+        # Only run inference on the calls we don't already have results for
+        misses = [i for i, result in enumerate(results) if result is None]
+        offsets = [0.0 for _ in audio_files]
+        for i in misses:
+            try:
+                with time_stage("trim_silence"):
+                    audio_files[i], offsets[i] = trim_audio(audio_files[i])
+            except WhisperException as e:
+                rejected[i] = e
+        misses = [i for i in misses if i not in rejected]
+        if misses:
+            durations = [get_audio_duration(audio_files[i]) for i in misses]
+            inference_start_time = time.perf_counter()
+            if packing.is_enabled():
+                transcribed = packing.transcribe_packed(
+                    model,
+                    [audio_files[i] for i in misses],
+                    [options_list[i] for i in misses],
+                    language=language,
+                )
+            else:
+                for i in misses:
+                    audio_files[i] = prepare_audio(model, audio_files[i])
+                transcribed = model.transcribe_bulk(
+                    [audio_files[i] for i in misses],  # type: ignore[misc]
+                    [options_list[i] for i in misses],
+                    language=language,
+                )
+            observe_inference(
+                implementation,
+                time.perf_counter() - inference_start_time,
+                None if None in durations else sum(filter(None, durations)),
+            )
+            for i, result in zip(misses, transcribed):
+                result = offset_result(compact_result(result), offsets[i])
+                results[i] = result
+                key = cache_keys[i]
+                if cache and key:
+                    cache.set(key, result)
+    finally:
+        for audio in audio_files:
+            if isinstance(audio, str):
+                os.unlink(audio)
+    logging.debug(
+        f"{audio_names} transcription result: " + json.dumps(results, indent=4)
     )
 
+    end_time = time.time()
+    execution_time = end_time - start_time
+    logging.debug(f"Bulk transcription execution time: {execution_time} seconds")
 
-# Commented out until this can be revisited
-# def transcribe_bulk(
-#     model: BaseWhisper,
-#     audio_files: list[str],
-#     initial_prompts: list[str] = [],
-#     cleanup: bool = False,
-#     vad_filter: bool = False,
-#     cleanup_config: TranscriptCleanupConfig = [],
-# ) -> list[WhisperResult | None]:
-#     # measure transcription time
-#     start_time = time.time()
-
-#     try:
-#         results = model.transcribe_bulk(
-#             audio_files=audio_files,
-#             initial_prompts=initial_prompts,
-#             vad_filter=vad_filter,
-#         )
-#     finally:
-#         for audio_file in audio_files:
-#             os.unlink(audio_file)
-#     logging.debug(
-#         f"{audio_files} transcription result: " + json.dumps(results, indent=4)
-#     )
-
-#     end_time = time.time()
-#     execution_time = end_time - start_time
-#     logging.debug(f"Transcription execution time: {execution_time} seconds")
-
-#     if cleanup:
-#         cleaned_results: list[WhisperResult | None] = []
-#         for result in results:
-#             try:
-#                 cleaned_results.append(cleanup_transcript(result, cleanup_config))
-#             except WhisperException:
-#                 cleaned_results.append(None)
-#         return cleaned_results
-#     return results
+    cleaned_results: list[WhisperResult | WhisperException] = []
+    for i, (bulk_result, options) in enumerate(zip(results, options_list)):
+        if i in rejected:
+            cleaned_results.append(rejected[i])
+            continue
+        assert bulk_result is not None
+        if not options["cleanup"]:
+            cleaned_results.append(bulk_result)
+            continue
+        try:
+            with time_stage("cleanup"):
+                cleaned_results.append(
+                    cleanup_transcript(bulk_result, options["cleanup_config"])
+                )
+        except WhisperException as e:
+            cleaned_results.append(e)
+    return cleaned_results
 
 
 def cleanup_transcript(
@@ -1,15 +1,17 @@
 import whisper
 
-from .base import BaseWhisper, TranscribeOptions, WhisperResult
+from .base import Audio, BaseWhisper, TranscribeOptions, WhisperResult
 
 
 class Whisper(BaseWhisper):
+    accepts_array = True
+
     def __init__(self, model_name: str):
         self.model = whisper.load_model(model_name)
 
     def transcribe(
         self,
-        audio: str,
+        audio: Audio,
         options: TranscribeOptions,
         language: str = "en",
     ) -> WhisperResult:
@@ -70,14 +70,13 @@ class WhisperS2T(BaseWhisper):
         self,
         audio_files: list[str],
         options_list: list[TranscribeOptions],
-        lang_codes: list[str] = [],
-        vad_filter: bool = False,
+        language: str = "en",
     ) -> list[WhisperResult]:
+        # The VAD setting applies to the whole batch, so callers should group by it
         method = self.model.transcribe
-        if vad_filter:
+        if options_list and options_list[0]["vad_filter"]:
             method = self.model.transcribe_with_vad
-        if not lang_codes:
-            lang_codes = ["en" for _ in audio_files]
+        lang_codes = [language for _ in audio_files]
         output = method(
             audio_files,
             lang_codes=lang_codes,
@@ -1,32 +1,71 @@
 #!/usr/bin/env python3
 
+import fcntl
 import json
 import logging
 import os
 import signal
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import lru_cache
 from hashlib import sha256
 from typing import Optional
 
 import requests
 import sentry_sdk
-from celery import Celery, signals, states
+from celery import Celery, current_task, signals, states
+from celery.canvas import Signature, signature
 from celery.exceptions import Reject
+from celery.worker.control import inspect_command
+from celery_batches import SimpleRequest
 from dotenv import load_dotenv
+from kombu import Connection
 from sentry_sdk.integrations.celery import CeleryIntegration
 
 load_dotenv()
 
 from app.geocoding.geocoding import lookup_geo
+from app.geocoding.types import GeoResponse
 from app.models.metadata import Metadata
-from app.notifications.notification import send_notifications
+from app.models.transcript import RawTranscript, Transcript
+from app.notifications.notification import get_channel_breaker, send_notifications
 from app.search.adapters import MeilisearchAdapter, SearchAdapter, TypesenseAdapter
+from app.search.buffer import IndexBuffer
+from app.search.helpers import Document
 from app.utils import api_client
+from app.utils.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenException,
+    get_breaker,
+)
+from app.utils.degradation import DegradationController, DegradationLevel
 from app.utils.exceptions import before_send
-from app.utils.storage import fetch_audio
-from app.whisper.base import TranscribeOptions, WhisperResult
+from app.utils.metrics import (
+    mark_process_dead,
+    observe_call_latency,
+    observe_queue_wait,
+    start_exporter,
+    time_stage,
+)
+from app.utils.priority import get_priority, to_broker_priority
+from app.utils.serialization import SERIALIZER, register_serializer
+from app.utils.task_status import (
+    FAILED,
+    INDEXED,
+    POST_PROCESSING,
+    QUEUED,
+    SUCCEEDED,
+    TRANSCRIBING,
+    get_result_id,
+    send_status,
+)
+from app.utils.storage import fetch_audio, fetch_audio_array
+from app.whisper.base import Audio, BaseWhisper, TranscribeOptions, WhisperResult
 from app.whisper.exceptions import WhisperException
-from app.whisper.task import API_IMPLEMENTATIONS, WhisperTask
-from app.whisper.transcribe import transcribe
+from app.whisper.result_cache import get_result_cache
+from app.whisper.task import API_IMPLEMENTATIONS, WhisperBatchTask, WhisperTask
+from app.whisper.transcribe import transcribe, transcribe_bulk
 
 sentry_dsn = os.getenv("SENTRY_DSN")
 if sentry_dsn:
@@ -50,6 +89,27 @@ if sentry_dsn:
 
 CELERY_DEFAULT_QUEUE = os.getenv("CELERY_DEFAULT_QUEUE", "transcribe")
 CELERY_GPU_QUEUE = f"{CELERY_DEFAULT_QUEUE}_gpu"
+# Work skipped while a downstream service is down is retried from here
+CELERY_DEFERRED_QUEUE = f"deferred_{CELERY_DEFAULT_QUEUE}"
+DEFERRED_MAX_RETRIES = int(os.getenv("DEFERRED_MAX_RETRIES", 30))
+
+# Batching only pays off when the worker can prefetch enough calls to fill a batch,
+# so CELERY_PREFETCH_MULTIPLIER should be 0 (or at least TRANSCRIBE_BATCH_SIZE)
+TRANSCRIBE_BATCH_SIZE = int(os.getenv("TRANSCRIBE_BATCH_SIZE", 16))
+TRANSCRIBE_BATCH_INTERVAL = float(os.getenv("TRANSCRIBE_BATCH_INTERVAL_MS", 500)) / 1000
+
+# Documents are indexed in bulk once this many are waiting, or after the delay (in seconds)
+SEARCH_INDEX_BUFFER_SIZE = int(os.getenv("SEARCH_INDEX_BUFFER_SIZE", 0))
+SEARCH_INDEX_BUFFER_DELAY = float(os.getenv("SEARCH_INDEX_BUFFER_DELAY", 5))
+SEARCH_INDEX_BUFFER_RETRIES = int(os.getenv("SEARCH_INDEX_BUFFER_RETRIES", 5))
+
+# Calls are indexed without a location rather than waiting longer than this (in seconds) on geocoding
+GEOCODING_TIMEOUT = float(os.getenv("GEOCODING_TIMEOUT", 10))
+
+# Messages and results can be sent as compressed msgpack instead of JSON, workers accept both
+# so they can be switched over one at a time
+register_serializer()
+serializer = os.getenv("CELERY_SERIALIZER", "json")
 
 broker_url = os.getenv("CELERY_BROKER_URL")
 result_backend = os.getenv("CELERY_RESULT_BACKEND")
@@ -62,7 +122,35 @@ celery = Celery(
     worker_prefetch_multiplier=int(os.getenv("CELERY_PREFETCH_MULTIPLIER", 1)),
 )
 celery.conf.task_default_queue = CELERY_DEFAULT_QUEUE
-search_adapters: list[SearchAdapter] = []
+celery.conf.update(
+    task_serializer=serializer,
+    result_serializer=serializer,
+    accept_content=["json", SERIALIZER],
+    result_accept_content=["json", SERIALIZER],
+    # Connections kept open for publishing tasks, shared by the API's ingest threads
+    broker_pool_limit=int(os.getenv("CELERY_BROKER_POOL_LIMIT", 10)),
+)
+# Load models when worker processes start instead of on their first task
+WHISPER_PRELOAD = os.getenv("WHISPER_PRELOAD", "").lower() == "true"
+if WHISPER_PRELOAD:
+    # Celery restarts processes that take longer than this to start, which loading a model easily does
+    celery.conf.worker_proc_alive_timeout = float(
+        os.getenv("WHISPER_PRELOAD_TIMEOUT", 600)
+    )
+# Priorities are opt-in, since RabbitMQ can't add them to queues that have already been declared without them
+CELERY_QUEUE_MAX_PRIORITY = int(os.getenv("CELERY_QUEUE_MAX_PRIORITY", 0))
+if CELERY_QUEUE_MAX_PRIORITY:
+    celery.conf.task_queue_max_priority = CELERY_QUEUE_MAX_PRIORITY
+    celery.conf.task_default_priority = to_broker_priority(
+        0, CELERY_QUEUE_MAX_PRIORITY, broker_url or ""
+    )
+search_adapters: list[SearchAdapter | IndexBuffer] = []
+degradation = DegradationController(
+    CELERY_DEFAULT_QUEUE
+    if os.getenv("WHISPER_IMPLEMENTATION") in API_IMPLEMENTATIONS
+    else CELERY_GPU_QUEUE,
+    cooldown=float(os.getenv("DEGRADATION_COOLDOWN", 60)),
+)
 
 recent_job_results: list[str] = []
 
@@ -76,17 +164,148 @@ def queue_task(
     whisper_implementation: Optional[str] = None,
     id: Optional[int | str] = None,
     index_name: Optional[str] = None,
+    batch: Optional[bool] = None,
+    connection: Optional[Connection] = None,
 ):
-    return (
-        transcribe_task.s(options, audio_url, whisper_implementation).set(
-            queue=CELERY_DEFAULT_QUEUE
-            if os.getenv("WHISPER_IMPLEMENTATION") in API_IMPLEMENTATIONS
-            else CELERY_GPU_QUEUE
+    """
+    Queue a call to be transcribed and then post-processed, returning the result of the post-processing.
+    Publishes on the broker connection if one is given, so many calls can be sent over the same one.
+    """
+    if batch is None:
+        batch = os.getenv("TRANSCRIBE_BATCH", "").lower() == "true"
+
+    transcribe_queue = (
+        CELERY_DEFAULT_QUEUE
+        if os.getenv("WHISPER_IMPLEMENTATION") in API_IMPLEMENTATIONS
+        else CELERY_GPU_QUEUE
+    )
+    # Let emergencies and calls that could trigger alerts skip ahead of the backlog,
+    # brokers ignore the priority when the queues weren't declared with them
+    priority = (
+        to_broker_priority(
+            get_priority(metadata), CELERY_QUEUE_MAX_PRIORITY, broker_url or ""
         )
-        | post_transcribe_task.s(metadata, audio_url, id, index_name).set(
-            queue=f"post_{CELERY_DEFAULT_QUEUE}"
+        if CELERY_QUEUE_MAX_PRIORITY
+        else 0
+    )
+    post_transcribe = post_transcribe_task.s(metadata, audio_url, id, index_name).set(
+        queue=f"post_{CELERY_DEFAULT_QUEUE}", priority=priority
+    )
+
+    if batch:
+        # The batch task publishes post_transcribe itself once the call is transcribed,
+        # so assign its ID now to hand back the same result a chain would
+        result = post_transcribe.freeze()
+        transcribe_batch_task.s(
+            options, audio_url, whisper_implementation, post_transcribe
+        ).apply_async(queue=transcribe_queue, priority=priority, connection=connection)  # type: ignore[call-arg]
+    else:
+        # Chains drop the producer option, but pass the connection on to the task they publish
+        result = (
+            transcribe_task.s(options, audio_url, whisper_implementation).set(
+                queue=transcribe_queue, priority=priority
+            )
+            | post_transcribe
+        ).apply_async(connection=connection)  # type: ignore[call-arg]
+    send_status(celery, result.id, QUEUED)
+    return result
+
+
+@signals.before_task_publish.connect
+def before_task_publish(headers=None, **kwargs):
+    # Stamp messages so the worker can tell how long they waited in the queue
+    if headers is not None:
+        headers["sent_at"] = time.time()
+        # post_transcribe workers never see the transcription queue, so tell them how far behind it is
+        if current_task and current_task.name in [
+            transcribe_task.name,
+            transcribe_batch_task.name,
+        ]:
+            headers["transcribe_queue_age"] = degradation.get_queue_age()
+
+
+# Number of child processes running tasks, set in the main process before the pool forks them
+pool_processes = 0
+
+
+@signals.worker_init.connect
+def worker_init(sender=None, **kwargs):
+    global pool_processes
+    # The prefork pool runs tasks in child processes, which the exporter only sees through PROMETHEUS_MULTIPROC_DIR
+    pool = str(getattr(sender, "pool_cls", ""))
+    if "prefork" in pool or "processes" in pool:
+        pool_processes = getattr(sender, "concurrency", 1)
+    start_exporter(child_processes=bool(pool_processes))
+    ready_file = os.getenv("WORKER_READY_FILE")
+    if ready_file:
+        for path in [ready_file, f"{ready_file}.processes"]:
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+def preload_models() -> None:
+    if WHISPER_PRELOAD:
+        implementations = [transcribe_task.default_implementation] + list(
+            filter(len, os.getenv("WHISPER_PRELOAD_IMPLEMENTATIONS", "").split(","))
         )
-    ).apply_async()
+        transcribe_task.preload(list(dict.fromkeys(implementations)))
+
+
+def mark_ready(ready_file: str) -> None:
+    # Signal to health checks that this worker is ready to take calls
+    with open(ready_file, "a"):
+        os.utime(ready_file)
+
+
+@signals.worker_process_init.connect
+def worker_process_init(**kwargs):
+    preload_models()
+
+    ready_file = os.getenv("WORKER_READY_FILE")
+    if ready_file:
+        # Each child records that it has preloaded, and the worker is ready once all of them have
+        with open(f"{ready_file}.processes", "a+") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            file.write(f"{os.getpid()}\n")
+            file.flush()
+            file.seek(0)
+            ready = len(set(file.read().split())) >= pool_processes
+        if ready:
+            mark_ready(ready_file)
+
+
+@signals.worker_ready.connect
+def worker_ready(**kwargs):
+    # Solo and thread pools run tasks in the main process, which never gets worker_process_init
+    if not pool_processes:
+        preload_models()
+        ready_file = os.getenv("WORKER_READY_FILE")
+        if ready_file:
+            mark_ready(ready_file)
+
+
+@inspect_command()
+def ready(state) -> dict[str, bool]:
+    """Report whether the worker has finished preloading, for the autoscaler to wait on"""
+    ready_file = os.getenv("WORKER_READY_FILE")
+    return {"ready": not ready_file or os.path.exists(ready_file)}
+
+
+@signals.worker_process_shutdown.connect
+def worker_process_shutdown(pid=None, **kwargs):
+    mark_process_dead(pid or os.getpid())
+
+
+@signals.task_prerun.connect
+def record_queue_wait(task=None, **kwargs):
+    if task is not None:
+        sent_at = getattr(task.request, "sent_at", None)
+        observe_queue_wait(task.name, sent_at)
+        if sent_at and task.name == transcribe_task.name:
+            degradation.observe_queue_age(time.time() - sent_at)
+        queue_age = getattr(task.request, "transcribe_queue_age", None)
+        if queue_age is not None:
+            degradation.observe_queue_age(queue_age)
 
 
 @signals.task_prerun.connect
@@ -119,6 +338,33 @@ def task_postrun(**kwargs):
         recent_job_results.pop()
 
 
+@signals.task_prerun.connect
+def send_running_status(task=None, **kwargs):
+    if task is None:
+        return
+    if task.name == transcribe_task.name:
+        send_status(celery, get_result_id(task.request), TRANSCRIBING)
+    elif task.name == post_transcribe_task.name:
+        send_status(celery, task.request.id, POST_PROCESSING)
+
+
+@signals.task_success.connect
+def send_success_status(sender=None, **kwargs):
+    if sender is not None and sender.name == post_transcribe_task.name:
+        send_status(celery, sender.request.id, SUCCEEDED)
+
+
+@signals.task_failure.connect
+def send_failure_status(sender=None, exception=None, **kwargs):
+    if sender is not None and sender.name in [
+        transcribe_task.name,
+        post_transcribe_task.name,
+    ]:
+        send_status(
+            celery, get_result_id(sender.request), FAILED, error=repr(exception)
+        )
+
+
 @signals.task_unknown.connect
 def task_unknown(**kwargs):
     logger.exception(kwargs["exc"])
@@ -143,6 +389,18 @@ def task_retry(**kwargs):
     logger.warning(f"Task {kwargs['request'].kwargsrepr} failed, retrying...")
 
 
+def load_audio(model: BaseWhisper, audio_url: str, options: TranscribeOptions) -> Audio:
+    worker_format = options.get("worker_audio_format")
+    # Decoding in memory skips the temp files and the ffmpeg process per call,
+    # but only some backends can take the decoded audio directly
+    if (
+        model.accepts_array
+        and os.getenv("AUDIO_DECODE_IN_MEMORY", "").lower() == "true"
+    ):
+        return fetch_audio_array(audio_url, worker_format)
+    return fetch_audio(audio_url, worker_format)
+
+
 @celery.task(base=WhisperTask, bind=True, name="transcribe_audio")
 def transcribe_task(
     self,
@@ -150,18 +408,144 @@ def transcribe_task(
     audio_url: str,
     whisper_implementation: Optional[str] = None,
 ) -> WhisperResult:
-    audio_file = fetch_audio(audio_url)
+    _, level = degradation.get_level()
+    options, implementation = degrade(
+        options, whisper_implementation, self.default_implementation, level
+    )
+    model = self.model(implementation)
+    audio = load_audio(model, audio_url, options)
     try:
         return transcribe(
-            model=self.model(whisper_implementation),
-            audio_file=audio_file,
+            model=model,
+            audio=audio,
             options=options,
+            cache=get_result_cache(self.backend),
+            implementation=implementation,
         )
     finally:
+        if isinstance(audio, str):
+            try:
+                os.unlink(audio)
+            except OSError:
+                pass
+
+
+@celery.task(
+    base=WhisperBatchTask,
+    bind=True,
+    name="transcribe_audio_batch",
+    flush_every=TRANSCRIBE_BATCH_SIZE,
+    flush_interval=TRANSCRIBE_BATCH_INTERVAL,
+)
+def transcribe_batch_task(self, requests: list[SimpleRequest]) -> None:
+    # Calls can only share a batch if they use the same model and VAD setting
+    batches: dict[tuple[Optional[str], bool], list[SimpleRequest]] = {}
+    for request in requests:
+        sent_at = (request.request_dict or {}).get("sent_at")
+        observe_queue_wait(self.name, sent_at)
+        if sent_at:
+            degradation.observe_queue_age(time.time() - sent_at)
+        options, _, whisper_implementation, _ = request.args
+        batches.setdefault((whisper_implementation, options["vad_filter"]), []).append(
+            request
+        )
+
+    _, level = degradation.get_level()
+    for (whisper_implementation, _), batch in batches.items():
+        implementation = degrade(
+            batch[0].args[0], whisper_implementation, self.default_implementation, level
+        )[1]
+        model = self.model(implementation)
+        audio_files: list[Audio] = []
+        fetched: list[SimpleRequest] = []
+        for request in batch:
+            try:
+                audio_files.append(load_audio(model, request.args[1], request.args[0]))
+                fetched.append(request)
+            except Exception as e:
+                logger.exception(e)
+                requeue_unbatched(request)
+
+        if not fetched:
+            continue
+        for request in fetched:
+            send_status(celery, signature(request.args[3]).id, TRANSCRIBING)
+
         try:
-            os.unlink(audio_file)
-        except OSError:
-            pass
+            results = transcribe_bulk(
+                model=model,
+                audio_files=audio_files,
+                options_list=[
+                    degrade(
+                        request.args[0],
+                        whisper_implementation,
+                        self.default_implementation,
+                        level,
+                    )[0]
+                    for request in fetched
+                ],
+                cache=get_result_cache(self.backend),
+                implementation=implementation,
+            )
+        except Exception as e:
+            logger.exception(e)
+            sentry_sdk.capture_exception(e)
+            for request in fetched:
+                requeue_unbatched(request)
+            continue
+
+        for request, result in zip(fetched, results):
+            post_transcribe = signature(request.args[3], app=celery)
+            if isinstance(result, WhisperException):
+                logger.warning(result)
+                self.backend.mark_as_failure(request.id, result, request=request)
+                self.backend.mark_as_failure(post_transcribe.id, result)
+                send_status(celery, post_transcribe.id, FAILED, error=repr(result))
+                continue
+            self.backend.mark_as_done(request.id, result, request=request)
+            post_transcribe.apply_async((result,))
+
+
+def degrade(
+    options: TranscribeOptions,
+    whisper_implementation: Optional[str],
+    default_implementation: str,
+    level: DegradationLevel,
+) -> tuple[TranscribeOptions, str]:
+    """
+    Apply the current degradation level to a call, switching to cheaper decode options and,
+    unless a specific implementation was requested, a smaller model
+    """
+    if "decode_options" in level:
+        options = {
+            **options,
+            "decode_options": {**options["decode_options"], **level["decode_options"]},
+        }
+    implementation = whisper_implementation or default_implementation
+    backend = implementation.split(":", 1)[0]
+    if (
+        not whisper_implementation
+        and "whisper_model" in level
+        and backend not in API_IMPLEMENTATIONS
+    ):
+        implementation = f"{backend}:{level['whisper_model']}"
+    return options, implementation
+
+
+def requeue_unbatched(request: SimpleRequest) -> None:
+    """
+    Send a call that could not be transcribed as part of a batch back through the
+    regular single-call task, so it gets the usual retry handling.
+    """
+    options, audio_url, whisper_implementation, post_transcribe = request.args
+    post_transcribe = signature(post_transcribe, app=celery)
+    (
+        transcribe_task.s(options, audio_url, whisper_implementation).set(
+            queue=request.delivery_info.get("routing_key") or CELERY_GPU_QUEUE,
+            priority=request.delivery_info.get("priority"),
+        )
+        | post_transcribe
+    ).apply_async()
 
 
 @celery.task(name="post_transcribe")
@@ -173,6 +557,7 @@ def post_transcribe_task(
     index_name: Optional[str] = None,
 ):
     logger.debug(result)
+    observe_call_latency(metadata, "transcribed")
 
     if "digital" in metadata["audio_type"]:
         from app.radio.digital import process_response
@@ -183,35 +568,327 @@ def post_transcribe_task(
             f"Audio type {metadata['audio_type']} not supported", requeue=False
         )
     try:
-        transcript = process_response(result, metadata)
+        with time_stage("process_response"):
+            transcript = process_response(result, metadata)
     except WhisperException as e:
         logger.warning(e)
         return None
 
-    geo = lookup_geo(metadata, transcript)
+    _, level = degradation.get_level()
+    executor = get_executor()
+    geo_future = executor.submit(
+        time_stage("geocoding")(lookup_geo),
+        metadata,
+        transcript,
+        use_llm=not level.get("skip_llm", False),
+    )
 
+    # Calls saved to the database have an ID, and get the transcript saved back to them
+    is_saved_call = bool(id)
     if not id:
         raw_metadata = json.dumps(metadata)
         id = sha256(raw_metadata.encode("utf-8")).hexdigest()
-    else:
-        api_client.call(
-            "patch",
-            f"calls/{id}",
-            json={"raw_transcript": transcript.transcript, "geo": geo},
+    document_id = id
+
+    # Save the transcript back to the API while the call is geocoded and indexed
+    futures: list[Future] = []
+    if is_saved_call:
+        futures.append(
+            executor.submit(
+                call_api,
+                "patch",
+                f"calls/{id}",
+                json={"raw_transcript": transcript.transcript},
+            )
+        )
+
+    # The location goes into every document, so find it before indexing anything
+    try:
+        geo = geo_future.result(timeout=GEOCODING_TIMEOUT)
+    except FutureTimeoutError:
+        logger.warning(
+            f"Geocoding took longer than {GEOCODING_TIMEOUT}s, continuing without a location"
+        )
+        geo = None
+    except CircuitOpenException as e:
+        logger.warning(f"{e}, deferring geocoding")
+        # The call is indexed without a location now, and again with it once it's found
+        defer(
+            deferred_geocode_task.s(
+                document_id,
+                is_saved_call,
+                metadata,
+                raw_audio_url,
+                transcript.transcript,
+                index_name,
+            ),
+            e.breaker,
+        )
+        geo = None
+    if is_saved_call and geo:
+        futures.append(
+            executor.submit(call_api, "patch", f"calls/{id}", json={"geo": geo})
+        )
+
+    def index_call(search: SearchAdapter | IndexBuffer, geo: GeoResponse | None) -> str:
+        stage = get_index_stage(search)
+        try:
+            return get_breaker(stage).call(
+                time_stage(stage)(search.index_call),
+                document_id,
+                metadata,
+                raw_audio_url,
+                transcript,
+                geo,
+                index_name,
+            )
+        except CircuitOpenException as e:
+            logger.warning(f"{e}, deferring indexing")
+            defer(
+                deferred_index_task.s(
+                    stage,
+                    document_id,
+                    metadata,
+                    raw_audio_url,
+                    transcript.transcript,
+                    geo,
+                    index_name,
+                ),
+                e.breaker,
+            )
+            # The document will be at the same URL once it's indexed
+            return get_search_url(
+                search,
+                document_id,
+                metadata,
+                raw_audio_url,
+                transcript,
+                geo,
+                index_name,
+            )
+
+    index_futures = [
+        executor.submit(index_call, search, geo) for search in get_search_adapters()
+    ]
+    search_urls = [future.result() for future in index_futures]
+    if not any(isinstance(search, IndexBuffer) for search in get_search_adapters()):
+        # Buffered calls are only indexed once the buffer is flushed, which records this instead
+        observe_call_latency(metadata, "indexed")
+    send_status(celery, post_transcribe_task.request.id, INDEXED)
+    for future in futures:
+        future.result()
+
+    search_url = search_urls[-1] if search_urls else ""
+
+    deferred_notifications = deferred_notifications_task.s(
+        raw_audio_url, metadata, transcript.transcript, geo, search_url
+    )
+    if level.get("defer_notifications"):
+        # Leave the workers to the backlog, the notifications are sent once it clears
+        logger.info("Queue backed up, deferring notifications")
+        deferred_notifications.apply_async(
+            queue=CELERY_DEFERRED_QUEUE, countdown=degradation.cooldown
         )
+    else:
+        with time_stage("notifications"):
+            skipped = send_notifications(
+                raw_audio_url, metadata, transcript, geo, search_url
+            )
+        if skipped:
+            # Only the channels that are down, so the others don't get the call twice
+            logger.warning(f"Deferring notifications to {len(skipped)} channels")
+            defer(
+                deferred_notifications.clone(kwargs={"channels": skipped}),
+                get_channel_breaker(skipped[0]),
+            )
+    observe_call_latency(metadata, "completed")
 
+    return transcript.txt
+
+
+def get_search_adapters() -> list[SearchAdapter | IndexBuffer]:
     global search_adapters
     if not search_adapters:
+        adapters: list[SearchAdapter] = []
         if os.getenv("MEILI_URL") and os.getenv("MEILI_MASTER_KEY"):
-            search_adapters.append(MeilisearchAdapter())
+            adapters.append(MeilisearchAdapter())
         if os.getenv("TYPESENSE_URL") and os.getenv("TYPESENSE_API_KEY"):
-            search_adapters.append(TypesenseAdapter())
+            adapters.append(TypesenseAdapter())
+        if SEARCH_INDEX_BUFFER_SIZE > 1:
+            search_adapters.extend(
+                IndexBuffer(
+                    adapter,
+                    SEARCH_INDEX_BUFFER_SIZE,
+                    SEARCH_INDEX_BUFFER_DELAY,
+                    SEARCH_INDEX_BUFFER_RETRIES,
+                    # Calls count as indexed once they're in the first search engine, like unbuffered ones
+                    on_indexed=observe_indexed if i == 0 else None,
+                )
+                for i, adapter in enumerate(adapters)
+            )
+        else:
+            search_adapters.extend(adapters)
+    return search_adapters
 
-    for search in search_adapters:
-        search_url = search.index_call(
-            id, metadata, raw_audio_url, transcript, geo, index_name
+
+def observe_indexed(documents: list[Document]) -> None:
+    for document in documents:
+        observe_call_latency(document, "indexed")
+
+
+def get_search_url(
+    search: SearchAdapter | IndexBuffer,
+    id: int | str,
+    metadata: Metadata,
+    raw_audio_url: str,
+    transcript: Transcript,
+    geo: GeoResponse | None,
+    index_name: Optional[str],
+) -> str:
+    adapter = search.adapter if isinstance(search, IndexBuffer) else search
+    document = adapter.build_document(id, metadata, raw_audio_url, transcript, geo)
+    return adapter.build_search_url(
+        document, adapter.get_index_name(metadata, index_name)
+    )
+
+
+def call_api(method: str, path: str, **kwargs) -> None:
+    try:
+        api_client.call(method, path, **kwargs)
+    except CircuitOpenException as e:
+        logger.warning(f"{e}, deferring {method.upper()} {path}")
+        defer(deferred_api_call_task.s(method, path, kwargs), e.breaker)
+
+
+def defer(task: Signature, breaker: CircuitBreaker) -> None:
+    """Send work for a service that is down to the deferred queue, to try again once the breaker can close"""
+    task.apply_async(queue=CELERY_DEFERRED_QUEUE, countdown=breaker.recovery_timeout)
+
+
+@celery.task(bind=True, name="deferred_index", max_retries=DEFERRED_MAX_RETRIES)
+def deferred_index_task(
+    self,
+    stage: str,
+    id: int | str,
+    metadata: Metadata,
+    raw_audio_url: str,
+    raw_transcript: RawTranscript,
+    geo: GeoResponse | None,
+    index_name: Optional[str],
+) -> None:
+    for search in get_search_adapters():
+        if get_index_stage(search) != stage:
+            continue
+        try:
+            get_breaker(stage).call(
+                search.index_call,
+                id,
+                metadata,
+                raw_audio_url,
+                Transcript(raw_transcript),
+                geo,
+                index_name,
+            )
+        except Exception as e:
+            raise self.retry(exc=e, countdown=get_breaker(stage).recovery_timeout)
+
+
+@celery.task(bind=True, name="deferred_geocode", max_retries=DEFERRED_MAX_RETRIES)
+def deferred_geocode_task(
+    self,
+    id: int | str,
+    is_saved_call: bool,
+    metadata: Metadata,
+    raw_audio_url: str,
+    raw_transcript: RawTranscript,
+    index_name: Optional[str],
+) -> None:
+    _, level = degradation.get_level()
+    try:
+        geo = lookup_geo(
+            metadata,
+            Transcript(raw_transcript),
+            use_llm=not level.get("skip_llm", False),
         )
+    except CircuitOpenException as e:
+        raise self.retry(exc=e, countdown=e.breaker.recovery_timeout)
+    if not geo:
+        return
 
-    send_notifications(raw_audio_url, metadata, transcript, geo, search_url)
+    if is_saved_call:
+        call_api("patch", f"calls/{id}", json={"geo": geo})
+    # Replace the documents indexed without a location, retrying like any other deferred indexing
+    for search in get_search_adapters():
+        deferred_index_task.s(
+            get_index_stage(search),
+            id,
+            metadata,
+            raw_audio_url,
+            raw_transcript,
+            geo,
+            index_name,
+        ).apply_async(queue=CELERY_DEFERRED_QUEUE)
 
-    return transcript.txt
+
+@celery.task(bind=True, name="deferred_api_call", max_retries=DEFERRED_MAX_RETRIES)
+def deferred_api_call_task(self, method: str, path: str, kwargs: dict) -> None:
+    try:
+        api_client.call(method, path, **kwargs)
+    except Exception as e:
+        raise self.retry(exc=e, countdown=get_breaker("api").recovery_timeout)
+
+
+@celery.task(bind=True, name="deferred_notifications", max_retries=DEFERRED_MAX_RETRIES)
+def deferred_notifications_task(
+    self,
+    raw_audio_url: str,
+    metadata: Metadata,
+    raw_transcript: RawTranscript,
+    geo: GeoResponse | None,
+    search_url: str,
+    channels: list[str] | None = None,
+) -> None:
+    _, level = degradation.get_level()
+    # Out of retries, send them anyway rather than dropping them
+    if level.get("defer_notifications") and self.request.retries < self.max_retries:
+        raise self.retry(countdown=degradation.cooldown)
+
+    # Calls older than MAX_CALL_AGE are dropped here, so notifications aren't sent long after the fact
+    skipped = send_notifications(
+        raw_audio_url,
+        metadata,
+        Transcript(raw_transcript),
+        geo,
+        search_url,
+        channels=channels,
+    )
+    if skipped:
+        breaker = get_channel_breaker(skipped[0])
+        raise self.retry(
+            exc=CircuitOpenException(breaker),
+            countdown=breaker.recovery_timeout,
+            kwargs={**self.request.kwargs, "channels": skipped},
+        )
+
+
+def get_index_stage(search: SearchAdapter | IndexBuffer) -> str:
+    adapter = search.adapter if isinstance(search, IndexBuffer) else search
+    return "index_" + type(adapter).__name__.removesuffix("Adapter").lower()
+
+
+@signals.worker_process_shutdown.connect
+@signals.worker_shutdown.connect
+def flush_index_buffers(**kwargs):
+    # Don't lose documents still waiting in a buffer when the worker stops
+    for search in search_adapters:
+        if isinstance(search, IndexBuffer):
+            search.close()
+
+
+@lru_cache()
+def get_executor() -> ThreadPoolExecutor:
+    # Created lazily so each forked worker process gets its own threads
+    return ThreadPoolExecutor(
+        max_workers=int(os.getenv("POST_TRANSCRIBE_THREADS", 8)),
+        thread_name_prefix="post_transcribe",
+    )
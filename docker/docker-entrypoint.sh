@@ -1,15 +1,22 @@
 #!/usr/bin/env bash
 set -Eeou pipefail
 
+# Metrics files from processes that are gone would be read as if they were still running, so start empty
+if [ -n "${PROMETHEUS_MULTIPROC_DIR-}" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
 if [ "$1" = 'api' ]; then
-    # Clean up any old temp files
-    /bin/sh -c "while true; do find /tmp -type f -mmin +10 -delete; sleep 60; done" &
+    # Clean up any old temp files, leaving the conversion cache files that were used in the last hour
+    /bin/sh -c "while true; do find /tmp -type f ! -path \"${PROMETHEUS_MULTIPROC_DIR:-/nonexistent}/*\" \( -mmin +60 -o -mmin +10 ! -path '/tmp/conversion-cache-*' \) -delete; sleep 60; done" &
     disown
 
     exec uv run uvicorn app.api:app --host 0.0.0.0 --log-level ${UVICORN_LOG_LEVEL:-info}
 elif [ "$1" = 'worker' ]; then
-    # Clean up any old temp files
-    /bin/sh -c "while true; do find /tmp -type f -mmin +10 -delete; sleep 60; done" &
+    # Clean up any old temp files, leaving the conversion cache files that were used in the last hour
+    # (and the ready file, which the health check looks for)
+    /bin/sh -c "while true; do find /tmp -type f ! -path \"${PROMETHEUS_MULTIPROC_DIR:-/nonexistent}/*\" ! -path \"${WORKER_READY_FILE:-/nonexistent}*\" \( -mmin +60 -o -mmin +10 ! -path '/tmp/conversion-cache-*' \) -delete; sleep 60; done" &
     disown
 
     if [ -z "${CELERY_HOSTNAME-}" ]; then
@@ -31,7 +38,10 @@ elif [ "$1" = 'worker' ]; then
         -c ${CELERY_CONCURRENCY:-1} \
         -l ${CELERY_LOGLEVEL:-info} \
         -n $CELERY_HOSTNAME \
-        -Q ${CELERY_QUEUES:-transcribe,post_transcribe}
+        -Q ${CELERY_QUEUES:-transcribe,post_transcribe,deferred_transcribe}
+elif [ "$1" = 'migrate' ]; then
+    # Run once, not by each API replica, which would race to apply the same revisions
+    exec uv run alembic upgrade head
 elif [ "$1" = 'flower' ]; then
     exec uv run celery --app=app.worker.celery flower --port=5555
 fi
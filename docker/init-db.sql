@@ -4,4 +4,6 @@ CREATE TABLE calls (
     raw_audio_url text,
     raw_transcript jsonb,
     geo jsonb
-)
+);
+
+-- Columns and indexes for GET /calls/ are added by the migrations in app/migrations, which the API runs on startup.
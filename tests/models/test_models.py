@@ -0,0 +1,213 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import psycopg
+
+from app.models import models
+
+
+def compile(statement) -> str:
+    return str(
+        statement.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+class TestGetCalls(unittest.TestCase):
+    def test_cursor_round_trip(self):
+        call = models.Call(
+            id=42,
+            raw_metadata={"start_time": 1673118015},  # type: ignore[typeddict-item]
+            raw_audio_url="",
+        )
+
+        for order in ["id", "-start_time"]:
+            cursor = models.encode_cursor(call, order)  # type: ignore[arg-type]
+            self.assertEqual(
+                models.decode_cursor(cursor, order),  # type: ignore[arg-type]
+                [1673118015, 42] if order == "-start_time" else [42],
+            )
+
+    def test_invalid_cursor(self):
+        cursor = models.encode_cursor(models.Call(id=42, raw_audio_url=""), "id")  # type: ignore[call-arg]
+        with self.assertRaises(ValueError):
+            models.decode_cursor(cursor, "start_time")
+        with self.assertRaises(ValueError):
+            models.decode_cursor("not a cursor", "id")
+
+    def test_seeks_past_cursor(self):
+        cursor = models.encode_cursor(
+            models.Call(
+                id=42,
+                raw_metadata={"start_time": 1673118015},  # type: ignore[typeddict-item]
+                raw_audio_url="",
+            ),
+            "-start_time",
+        )
+
+        sql = compile(
+            models.get_calls_statement(
+                {"short_name": "chi_cfd", "talkgroup": 1}, "-start_time", cursor, 50
+            )
+        )
+
+        self.assertIn(
+            "(calls.start_time, calls.id) < (1673118015, 42)",
+            sql,
+        )
+        self.assertIn("calls.short_name = 'chi_cfd'", sql)
+        self.assertNotIn("OFFSET", sql)
+        self.assertTrue(sql.endswith("LIMIT 50"))
+
+    def test_filters_on_generated_columns(self):
+        statement = models.get_calls_statement(
+            {
+                "talkgroup_tag": "Fire N",
+                "audio_type": "digital",
+                "transcript": "100% sure_",
+            }
+        )
+        sql = compile(statement)
+
+        self.assertIn("calls.talkgroup_tag = 'Fire N'", sql)
+        self.assertIn("calls.audio_type = 'digital'", sql)
+        self.assertIn("calls.transcript_plaintext ILIKE", sql)
+        self.assertNotIn("raw_metadata ->>", sql)
+        # Wildcards in the text are matched literally
+        self.assertIn(
+            "%100\\% sure\\_%",
+            statement.compile(dialect=postgresql.dialect()).params.values(),
+        )
+
+    def test_next_cursor_only_on_full_page(self):
+        db = MagicMock()
+        db.exec.return_value.all.return_value = [
+            models.Call(id=1, raw_audio_url=""),  # type: ignore[call-arg]
+            models.Call(id=2, raw_audio_url=""),  # type: ignore[call-arg]
+        ]
+
+        _, next_cursor = models.get_calls(db, {}, limit=2)
+        self.assertEqual(models.decode_cursor(next_cursor, "id"), [2])  # type: ignore[arg-type]
+
+        _, next_cursor = models.get_calls(db, {}, limit=3)
+        self.assertIsNone(next_cursor)
+
+
+class TestCountCalls(unittest.TestCase):
+    def setUp(self):
+        models.count_cache.clear()
+        self.db = MagicMock()
+
+    def test_estimates_from_table_statistics(self):
+        self.db.execute.return_value.scalar.return_value = 1200000
+
+        self.assertEqual(models.count_calls(self.db, {}, "estimate"), 1200000)
+        self.db.exec.assert_not_called()
+
+    def test_counts_tables_that_havent_been_analyzed(self):
+        self.db.execute.return_value.scalar.return_value = -1
+        self.db.exec.return_value.one.return_value = 12
+
+        self.assertEqual(models.count_calls(self.db, {}, "estimate"), 12)
+
+    def test_estimates_filtered_counts_with_parameters(self):
+        self.db.get_bind.return_value.dialect = psycopg.dialect()
+        explain = self.db.connection.return_value.exec_driver_sql
+        explain.return_value.scalar_one.return_value = [{"Plan": {"Plan Rows": 30}}]
+
+        filters = {"short_name": "chi_cfd'; DROP TABLE calls; --"}
+        self.assertEqual(models.count_calls(self.db, filters, "estimate"), 30)  # type: ignore[arg-type]
+
+        sql, params = explain.call_args.args
+        self.assertTrue(sql.startswith("EXPLAIN (FORMAT JSON) SELECT"))
+        self.assertNotIn("DROP TABLE", sql)
+        self.assertIn(filters["short_name"], params.values())
+
+    def test_caches_exact_counts(self):
+        self.db.exec.return_value.one.return_value = 12
+
+        self.assertEqual(models.count_calls(self.db, {"talkgroup": 1}, "exact"), 12)
+        self.assertEqual(models.count_calls(self.db, {"talkgroup": 1}, "exact"), 12)
+        self.assertEqual(self.db.exec.call_count, 1)
+
+        self.assertIsNone(models.count_calls(self.db, {}, "none"))
+
+
+class TestUpsertTalkgroups(unittest.TestCase):
+    def test_merges_calls_on_the_same_talkgroup(self):
+        calls = [
+            {
+                "short_name": "chi_cfd",
+                "talkgroup": 1,
+                "talkgroup_group": "Fire",
+                "talkgroup_tag": "Fire N",
+                "start_time": 1673118200,
+            },
+            {
+                "short_name": "chi_cfd",
+                "talkgroup": 1,
+                "talkgroup_group": "Fire",
+                "talkgroup_tag": "CFD Fire N",
+                "start_time": 1673118300,
+            },
+            {
+                "short_name": "chi_cfd",
+                "talkgroup": 2,
+                "talkgroup_group": "EMS",
+                "talkgroup_tag": "CFD EMS",
+                "start_time": 1673118100,
+            },
+        ]
+
+        sql = compile(models.upsert_talkgroups(calls))  # type: ignore[arg-type]
+
+        self.assertIn(
+            "('chi_cfd', 1, 'Fire', 'CFD Fire N', 1673118200, 1673118300, 2)", sql
+        )
+        self.assertIn(
+            "('chi_cfd', 2, 'EMS', 'CFD EMS', 1673118100, 1673118100, 1)", sql
+        )
+        self.assertIn("ON CONFLICT (short_name, talkgroup) DO UPDATE", sql)
+        self.assertIn("call_count = (talkgroups.call_count + excluded.call_count)", sql)
+
+    def test_sorts_talkgroups(self):
+        calls = [
+            {"short_name": short_name, "talkgroup": talkgroup, "start_time": 1673118100}
+            for short_name, talkgroup in [
+                ("chi_cpd", 2),
+                ("chi_cfd", 10),
+                ("chi_cfd", 9),
+            ]
+        ]
+
+        sql = compile(models.upsert_talkgroups(calls))  # type: ignore[arg-type]
+
+        positions = [
+            sql.index(f"('{short_name}', {talkgroup},")
+            for short_name, talkgroup in [
+                ("chi_cfd", 9),
+                ("chi_cfd", 10),
+                ("chi_cpd", 2),
+            ]
+        ]
+        self.assertEqual(positions, sorted(positions))
+
+    def test_create_call_updates_catalog(self):
+        db = MagicMock()
+        with open("tests/data/1-1673118015_477787500-call_1.json") as file:
+            metadata = json.load(file)
+
+        models.create_call(
+            db,
+            models.CallCreate(raw_metadata=metadata, raw_audio_url=""),  # type: ignore[arg-type]
+        )
+
+        self.assertIn("INSERT INTO talkgroups", compile(db.execute.call_args.args[0]))
+        db.commit.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
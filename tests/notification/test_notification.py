@@ -171,14 +171,20 @@ class TestNotify(unittest.TestCase):
         notification.notify(config, metadata, transcript, audio_file)
 
         # Perform assertions
-        mock_truncate_transcript.assert_called_once_with(transcript)
+        mock_truncate_transcript.assert_called_with(transcript)
         mock_build_suffix.assert_called_once_with(metadata, True, "")
-        apprise_mock.notify.assert_called_once_with(
+        # Each channel is sent to on its own
+        self.assertEqual(
+            [call.args[1] for call in mock_add_channels.call_args_list],
+            [["tgram://channel1"], ["tgram://channel2"]],
+        )
+        apprise_mock.notify.assert_called_with(
             body="<br />".join([transcript, "TG123"]),
             body_format=NotifyFormat.HTML,
             title="",
             attach=ANY,
         )
+        self.assertEqual(apprise_mock.notify.call_count, 2)
 
     @patch("app.notifications.notification.build_suffix")
     @patch("app.notifications.notification.truncate_transcript")
@@ -210,9 +216,39 @@ class TestNotify(unittest.TestCase):
         notification.notify(config, metadata, transcript, mp3_file, "", search_url)
 
         # Perform assertions
-        mock_truncate_transcript.assert_called_once_with(transcript)
+        mock_truncate_transcript.assert_called_with(transcript)
         mock_build_suffix.assert_called_once_with(metadata, True, search_url)
-        apprise_mock.notify.assert_called_once()
+        self.assertEqual(apprise_mock.notify.call_count, 2)
+
+    @patch("app.notifications.notification.build_suffix", Mock(return_value=""))
+    @patch("app.notifications.notification.add_channels")
+    def test_skips_channels_that_are_down(self, mock_add_channels):
+        config = {"channels": ["json://down.example.com", "json://up.example.com"]}
+        down = notification.get_channel_breaker("json://down.example.com")
+        up = notification.get_channel_breaker("json://up.example.com")
+        self.assertIsNot(down, up)
+        self.addCleanup(down.record_success)
+        for _ in range(down.failure_threshold):
+            down.record_failure()
+
+        skipped = notification.notify(config, {}, "Transcript", "audio.mp3")
+
+        self.assertEqual(skipped, ["json://down.example.com"])
+        self.assertEqual(
+            [call.args[1] for call in mock_add_channels.call_args_list],
+            [["json://down.example.com"], ["json://up.example.com"]],
+        )
+        mock_add_channels.return_value.notify.assert_called_once()
+
+    @patch("app.notifications.notification.build_suffix", Mock(return_value=""))
+    @patch("app.notifications.notification.add_channels")
+    def test_invalid_channels_dont_trip_the_breaker(self, mock_add_channels):
+        mock_add_channels.return_value.__bool__ = Mock(return_value=False)
+
+        notification.notify({"channels": ["invalid"]}, {}, "Transcript", "audio.mp3")
+
+        mock_add_channels.return_value.notify.assert_not_called()
+        self.assertEqual(notification.get_channel_breaker("invalid").failures, 0)
 
 
 class TestNotification(unittest.TestCase):
@@ -1,5 +1,6 @@
 import os
 from unittest import TestCase
+from unittest.mock import patch
 
 import meilisearch
 import typesense
@@ -17,6 +18,18 @@ original_s3_public_url = os.getenv("S3_PUBLIC_URL")
 load_dotenv(".env.testing.local", override=True)
 
 
+class TestEnsureIndex(TestCase):
+    @patch.object(MeilisearchAdapter, "upsert_index")
+    def test_creates_each_index_once(self, upsert_index):
+        adapter = MeilisearchAdapter()
+
+        adapter.ensure_index("calls_ensure_index_test")
+        adapter.ensure_index("calls_ensure_index_test")
+
+        # Without changing the settings of an index that's already there
+        upsert_index.assert_called_once_with("calls_ensure_index_test", update=False)
+
+
 class TestMeilisearchAdapter(TestCase):
     @classmethod
     def setUpClass(cls):
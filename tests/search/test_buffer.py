@@ -0,0 +1,138 @@
+import unittest
+from unittest.mock import Mock
+
+from app.search.buffer import IndexBuffer
+
+
+class TestIndexBuffer(unittest.TestCase):
+    def setUp(self):
+        self.adapter = Mock()
+        self.adapter.get_index_name.side_effect = (
+            lambda metadata, index_name=None: index_name or "calls"
+        )
+        self.adapter.build_search_url.side_effect = (
+            lambda doc, index_name: f"http://search/{index_name}/{doc['id']}"
+        )
+
+    def test_flushes_when_full(self):
+        buffer = IndexBuffer(self.adapter, max_size=2, max_delay=60)
+
+        buffer.add("calls", {"id": "1"})  # type: ignore[typeddict-item]
+        self.adapter.index_calls.assert_not_called()
+        buffer.add("calls", {"id": "2"})  # type: ignore[typeddict-item]
+        buffer.close()
+
+        self.adapter.index_calls.assert_called_once_with(
+            [{"id": "1"}, {"id": "2"}], "calls"
+        )
+
+    def test_flushes_after_delay(self):
+        buffer = IndexBuffer(self.adapter, max_size=100, max_delay=0.01)
+
+        buffer.add("calls", {"id": "1"})  # type: ignore[typeddict-item]
+        assert buffer.timer is not None
+        buffer.timer.join()
+        buffer.close()
+
+        self.adapter.index_calls.assert_called_once_with([{"id": "1"}], "calls")
+
+    def test_keeps_latest_version_of_document(self):
+        buffer = IndexBuffer(self.adapter, max_size=100, max_delay=60)
+
+        buffer.add("calls", {"id": "1", "transcript": "old"})  # type: ignore[typeddict-item]
+        buffer.add("calls", {"id": "1", "transcript": "new"})  # type: ignore[typeddict-item]
+        buffer.add("calls_2024_01", {"id": "2"})  # type: ignore[typeddict-item]
+        buffer.close()
+
+        self.adapter.index_calls.assert_any_call(
+            [{"id": "1", "transcript": "new"}], "calls"
+        )
+        self.adapter.index_calls.assert_any_call([{"id": "2"}], "calls_2024_01")
+
+    def test_index_call_returns_url(self):
+        self.adapter.build_document.return_value = {"id": "1"}
+        buffer = IndexBuffer(self.adapter, max_size=100, max_delay=60)
+
+        url = buffer.index_call("1", Mock(), "", Mock())
+        buffer.close()
+
+        self.assertEqual(url, "http://search/calls/1")
+        self.adapter.index_calls.assert_called_once_with([{"id": "1"}], "calls")
+
+    def test_requeues_on_failure(self):
+        self.adapter.index_calls.side_effect = [Exception("Unavailable"), True]
+        buffer = IndexBuffer(self.adapter, max_size=100, max_delay=60)
+
+        buffer.add("calls", {"id": "1"})  # type: ignore[typeddict-item]
+        buffer.flush().result()
+        self.assertIn("1", buffer.documents["calls"])
+        buffer.flush().result()
+        buffer.close()
+
+        self.assertEqual(self.adapter.index_calls.call_count, 2)
+        self.assertEqual(buffer.documents, {})
+        self.assertEqual(buffer.failures, {})
+
+    def test_gives_up_after_max_retries(self):
+        self.adapter.index_calls.side_effect = Exception("Unavailable")
+        buffer = IndexBuffer(self.adapter, max_size=100, max_delay=60, max_retries=1)
+
+        buffer.add("calls", {"id": "1"})  # type: ignore[typeddict-item]
+        buffer.flush().result()
+        self.assertIn("1", buffer.documents["calls"])
+        with self.assertLogs(level="ERROR") as logs:
+            buffer.flush().result()
+        buffer.close()
+
+        self.assertIn("Gave up indexing 1 documents into calls: 1", logs.output[-1])
+        self.assertEqual(buffer.documents, {})
+        self.assertEqual(self.adapter.index_calls.call_count, 2)
+
+    def test_logs_documents_lost_on_close(self):
+        self.adapter.index_calls.side_effect = Exception("Unavailable")
+        buffer = IndexBuffer(self.adapter, max_size=100, max_delay=60)
+
+        buffer.add("calls", {"id": "1"})  # type: ignore[typeddict-item]
+        with self.assertLogs(level="ERROR") as logs:
+            buffer.close()
+
+        self.assertIn("Gave up indexing 1 documents into calls: 1", logs.output[-1])
+
+    def test_close_is_idempotent(self):
+        buffer = IndexBuffer(self.adapter, max_size=100, max_delay=60)
+
+        buffer.add("calls", {"id": "1"})  # type: ignore[typeddict-item]
+        buffer.close()
+        buffer.close()
+        buffer.flush().result()
+
+        self.adapter.index_calls.assert_called_once_with([{"id": "1"}], "calls")
+
+    def test_indexes_directly_after_close(self):
+        buffer = IndexBuffer(self.adapter, max_size=100, max_delay=60)
+        buffer.close()
+
+        buffer.add("calls", {"id": "1"})  # type: ignore[typeddict-item]
+
+        self.adapter.index_calls.assert_called_once_with([{"id": "1"}], "calls")
+        self.assertIsNone(buffer.timer)
+
+        self.adapter.index_calls.side_effect = Exception("Unavailable")
+        with self.assertRaises(Exception):
+            buffer.add("calls", {"id": "2"})  # type: ignore[typeddict-item]
+
+    def test_reports_indexed_documents(self):
+        on_indexed = Mock()
+        buffer = IndexBuffer(
+            self.adapter, max_size=100, max_delay=60, on_indexed=on_indexed
+        )
+
+        buffer.add("calls", {"id": "1"})  # type: ignore[typeddict-item]
+        on_indexed.assert_not_called()
+        buffer.close()
+
+        on_indexed.assert_called_once_with([{"id": "1"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,407 @@
+import asyncio
+import json
+import os
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from app import api
+
+
+@patch.dict(os.environ, {"API_KEY": ""})
+@patch("app.api.worker.celery.connection_for_write", MagicMock())
+@patch("app.api.worker.queue_task")
+@patch("app.api.models.create_calls")
+@patch("app.api.storage.upload_raw_audio_stream")
+class TestCreateCalls(unittest.TestCase):
+    audio_file = "tests/data/1-1673118015_477787500-call_1.wav"
+    metadata_file = "tests/data/1-1673118015_477787500-call_1.json"
+
+    def setUp(self):
+        self.client = TestClient(api.app)
+        with open(self.metadata_file) as file:
+            self.metadata = json.load(file)
+
+    def post(self, calls, files=None):
+        return self.client.post(
+            "/calls/batch", data={"calls": json.dumps(calls)}, files=files or {}
+        )
+
+    def test_creates_calls(self, upload_raw_audio_stream, create_calls, queue_task):
+        upload_raw_audio_stream.return_value = (
+            "https://example.com/call_1.mp3",
+            "flac",
+        )
+        create_calls.return_value = [10, 11]
+        queue_task.side_effect = [MagicMock(id="task-10"), MagicMock(id="task-11")]
+
+        with open(self.audio_file, "rb") as audio:
+            r = self.post(
+                [
+                    {"metadata": self.metadata, "audio": "call_audio_0"},
+                    {
+                        "metadata": self.metadata,
+                        "audio_url": "https://example.com/call_2.mp3",
+                    },
+                ],
+                {"call_audio_0": audio},
+            )
+
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(
+            r.json()["calls"],
+            [
+                {"status": "queued", "call_id": 10, "task_id": "task-10"},
+                {"status": "queued", "call_id": 11, "task_id": "task-11"},
+            ],
+        )
+        # Every call is inserted at once
+        create_calls.assert_called_once()
+        self.assertEqual(
+            [call.raw_audio_url for call in create_calls.call_args.args[1]],
+            ["https://example.com/call_1.mp3", "https://example.com/call_2.mp3"],
+        )
+        # on the same broker connection
+        connections = {call.kwargs["connection"] for call in queue_task.call_args_list}
+        self.assertEqual(len(connections), 1)
+        # Workers only look for the rendition of calls that were uploaded with one
+        options = [call.args[2] for call in queue_task.call_args_list]
+        self.assertEqual(options[0]["worker_audio_format"], "flac")
+        self.assertNotIn("worker_audio_format", options[1])
+
+    def test_reports_each_failure(
+        self, upload_raw_audio_stream, create_calls, queue_task
+    ):
+        upload_raw_audio_stream.side_effect = ConnectionError("S3 is down")
+        create_calls.return_value = [12]
+        queue_task.return_value = MagicMock(id="task-12")
+
+        with open(self.audio_file, "rb") as audio:
+            r = self.post(
+                [
+                    {"metadata": self.metadata, "audio": "call_audio_0"},
+                    {"metadata": {**self.metadata, "call_length": 0.5}},
+                    {"metadata": self.metadata},
+                    {
+                        "metadata": self.metadata,
+                        "audio_url": "https://example.com/call_2.mp3",
+                    },
+                ],
+                {"call_audio_0": audio},
+            )
+
+        self.assertEqual(r.status_code, 207)
+        results = r.json()["calls"]
+        self.assertEqual(
+            [result["status"] for result in results],
+            ["error", "error", "error", "queued"],
+        )
+        self.assertIn("S3 is down", results[0]["error"])
+        self.assertEqual(results[1]["error"], "Call too short to transcribe")
+        self.assertEqual(results[2]["error"], "No audio provided")
+        self.assertEqual(results[3]["call_id"], 12)
+
+    @patch.dict(os.environ, {"DEDUP_CALLS": "true"})
+    def test_deduplicates_calls(
+        self, upload_raw_audio_stream, create_calls, queue_task
+    ):
+        api.duplicate_index.calls.clear()
+        upload_raw_audio_stream.return_value = ("https://example.com/call_1.mp3", None)
+        create_calls.side_effect = [ConnectionError("Database is down"), [13]]
+        queue_task.return_value = MagicMock(id="task-13")
+
+        def post():
+            with (
+                open(self.audio_file, "rb") as audio,
+                open(self.audio_file, "rb") as copy,
+            ):
+                return self.post(
+                    [
+                        {"metadata": self.metadata, "audio": "call_audio_0"},
+                        {"metadata": self.metadata, "audio": "call_audio_1"},
+                    ],
+                    {"call_audio_0": audio, "call_audio_1": copy},
+                )
+
+        failed = post().json()["calls"]
+        self.assertEqual([result["status"] for result in failed], ["error", "error"])
+
+        # Calls that failed to save aren't skipped when the batch is retried,
+        # and whichever copy is ingested first, the other points to it
+        results = post().json()["calls"]
+        self.assertCountEqual(
+            results,
+            [
+                {"status": "queued", "call_id": 13, "task_id": "task-13"},
+                {"status": "duplicate", "task_id": "task-13", "duplicate_of": 13},
+            ],
+        )
+
+    def test_rejects_invalid_batches(self, *_):
+        for calls in ["{}", "not json", "[1]"]:
+            self.assertEqual(
+                self.client.post("/calls/batch", data={"calls": calls}).status_code,
+                422,
+            )
+        with patch.dict(os.environ, {"CALLS_BATCH_MAX_SIZE": "1"}):
+            self.assertEqual(self.post([{}, {}]).status_code, 413)
+
+
+@patch.dict(os.environ, {"API_KEY": "", "DEDUP_CALLS": "false"})
+@patch("app.api.worker.queue_task")
+@patch("app.api.models.create_call")
+@patch("app.api.storage.upload_raw_audio_stream")
+class TestCreateCall(unittest.TestCase):
+    audio_file = "tests/data/1-1673118015_477787500-call_1.wav"
+    metadata_file = "tests/data/1-1673118015_477787500-call_1.json"
+
+    def setUp(self):
+        self.client = TestClient(api.app)
+        with open(self.metadata_file) as file:
+            self.metadata = json.load(file)
+
+    def post(self):
+        with open(self.audio_file, "rb") as audio:
+            return self.client.post(
+                "/calls",
+                files={
+                    "call_json": ("call.json", json.dumps(self.metadata)),
+                    "call_audio": audio,
+                },
+            )
+
+    def assertNotOnEventLoop(self, *args, **kwargs):
+        # Blocking work would hold up every other request if it ran on the event loop
+        with self.assertRaises(RuntimeError):
+            asyncio.get_running_loop()
+
+    def test_saves_call(self, upload_raw_audio_stream, create_call, queue_task):
+        upload_raw_audio_stream.return_value = ("https://example.com/call_1.mp3", None)
+        create_call.return_value = MagicMock(id=42)
+        queue_task.return_value = MagicMock(id="task-42")
+
+        r = self.post()
+
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.json(), {"task_id": "task-42"})
+        call = create_call.call_args.kwargs["call"]
+        for key in ["short_name", "talkgroup", "start_time"]:
+            self.assertEqual(call.raw_metadata[key], self.metadata[key])
+        self.assertEqual(call.raw_audio_url, "https://example.com/call_1.mp3")
+        # The task is queued with the ID of the saved call
+        self.assertEqual(queue_task.call_args.args[4], 42)
+
+    def test_runs_blocking_work_in_limited_threads(
+        self, upload_raw_audio_stream, create_call, queue_task
+    ):
+        upload_raw_audio_stream.side_effect = lambda *args: (
+            self.assertNotOnEventLoop(),
+            ("https://example.com/call_1.mp3", None),
+        )[1]
+        create_call.side_effect = lambda **kwargs: (
+            self.assertNotOnEventLoop(),
+            MagicMock(id=42),
+        )[1]
+        queue_task.side_effect = lambda *args, **kwargs: (
+            self.assertNotOnEventLoop(),
+            MagicMock(id="task-42"),
+        )[1]
+        run_blocking = api.run_blocking
+        limited = []
+
+        async def record(limiter, func, *args):
+            limited.append((limiter, func.func if isinstance(func, partial) else func))
+            return await run_blocking(limiter, func, *args)
+
+        with patch("app.api.run_blocking", side_effect=record):
+            r = self.post()
+
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(
+            limited,
+            [
+                (api.ingest_limiter, upload_raw_audio_stream),
+                (api.db_limiter, api.save_call),
+                (api.publish_limiter, queue_task),
+            ],
+        )
+
+
+@patch.dict(os.environ, {"API_KEY": "", "DEDUP_CALLS": "true"})
+@patch("app.api.save_call")
+@patch("app.api.worker.queue_task")
+@patch("app.api.storage.upload_raw_audio_stream")
+class TestDeduplication(unittest.TestCase):
+    audio_file = "tests/data/1-1673118015_477787500-call_1.wav"
+    metadata_file = "tests/data/1-1673118015_477787500-call_1.json"
+
+    def setUp(self):
+        api.duplicate_index.calls.clear()
+        self.client = TestClient(api.app, raise_server_exceptions=False)
+        with open(self.metadata_file) as file:
+            self.metadata = json.load(file)
+
+    def post(self):
+        with open(self.audio_file, "rb") as audio:
+            return self.client.post(
+                "/calls",
+                files={
+                    "call_json": ("call.json", json.dumps(self.metadata)),
+                    "call_audio": audio,
+                },
+            )
+
+    def post_concurrently(self, upload_raw_audio_stream, first_upload):
+        """Post a call, and a copy of it while the first is still being uploaded"""
+        uploading, release = threading.Event(), threading.Event()
+
+        def upload(*args):
+            if not uploading.is_set():
+                uploading.set()
+                release.wait(5)
+                return first_upload()
+            return "https://example.com/call_2.mp3", None
+
+        upload_raw_audio_stream.side_effect = upload
+        waiting = threading.Event()
+        check_and_add = api.duplicate_index.check_and_add
+
+        def check(*args):
+            recent_call, is_duplicate = check_and_add(*args)
+            if is_duplicate:
+                waiting.set()
+            return recent_call, is_duplicate
+
+        with patch.object(api.duplicate_index, "check_and_add", side_effect=check):
+            with ThreadPoolExecutor(2) as executor:
+                first = executor.submit(self.post)
+                self.assertTrue(uploading.wait(5))
+                copy = executor.submit(self.post)
+                self.assertTrue(waiting.wait(5))
+                release.set()
+                return first.result(), copy.result()
+
+    def test_copies_get_the_first_calls_task(
+        self, upload_raw_audio_stream, queue_task, save_call
+    ):
+        save_call.return_value = 10
+        queue_task.return_value = MagicMock(id="task-10")
+
+        first, copy = self.post_concurrently(
+            upload_raw_audio_stream, lambda: ("https://example.com/call_1.mp3", None)
+        )
+
+        self.assertEqual(first.json(), {"task_id": "task-10"})
+        self.assertEqual(copy.json(), {"task_id": "task-10", "duplicate_of": 10})
+        save_call.assert_called_once()
+
+    def test_copies_are_ingested_when_the_first_fails(
+        self, upload_raw_audio_stream, queue_task, save_call
+    ):
+        save_call.return_value = 11
+        queue_task.return_value = MagicMock(id="task-11")
+
+        def fail():
+            raise ConnectionError("S3 is down")
+
+        first, copy = self.post_concurrently(upload_raw_audio_stream, fail)
+
+        self.assertEqual(first.status_code, 500)
+        self.assertEqual(copy.status_code, 201)
+        self.assertEqual(copy.json(), {"task_id": "task-11"})
+
+    def test_failed_calls_are_not_skipped(
+        self, upload_raw_audio_stream, queue_task, save_call
+    ):
+        save_call.side_effect = [ConnectionError("Database is down"), 12]
+        upload_raw_audio_stream.return_value = ("https://example.com/call_1.mp3", None)
+        queue_task.return_value = MagicMock(id="task-12")
+
+        self.assertEqual(self.post().status_code, 500)
+
+        r = self.post()
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.json(), {"task_id": "task-12"})
+
+
+@patch.dict(os.environ, {"API_KEY": ""})
+@patch.object(api.task_status_hub, "start", MagicMock())
+class TestStreamStatus(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(api.app)
+
+    @patch("app.api.get_final_status")
+    def test_streams_until_tasks_finish(self, get_final_status):
+        get_final_status.return_value = {"task_id": "done", "status": "succeeded"}
+        api.task_status_hub.publish({"task_id": "running", "status": "indexed"})
+        api.task_status_hub.publish({"task_id": "running", "status": "succeeded"})
+
+        with self.client.stream(
+            "GET", "/tasks/stream", params={"task_id": ["running", "done"]}
+        ) as r:
+            self.assertEqual(
+                r.headers["content-type"], "text/event-stream; charset=utf-8"
+            )
+            events = [
+                json.loads(line.removeprefix("data: "))
+                for line in r.iter_lines()
+                if line.startswith("data: ")
+            ]
+
+        self.assertEqual(
+            events,
+            [
+                {"task_id": "running", "status": "succeeded"},
+                {"task_id": "done", "status": "succeeded"},
+            ],
+        )
+        # Only tasks the stream hadn't seen are looked up in the result backend
+        get_final_status.assert_called_once_with("done")
+        self.assertEqual(api.task_status_hub.subscribers, {})
+
+    def stream(self, task_id: str) -> list[tuple[str, dict]]:
+        with self.client.stream(
+            "GET", "/tasks/stream", params={"task_id": task_id}
+        ) as r:
+            lines = [
+                line for line in r.iter_lines() if line.startswith(("event", "data"))
+            ]
+        return [
+            (event.removeprefix("event: "), json.loads(data.removeprefix("data: ")))
+            for event, data in zip(lines[::2], lines[1::2])
+        ]
+
+    @patch.dict(os.environ, {"TASK_STATUS_KEEPALIVE": "0.05"})
+    @patch("app.api.get_final_status")
+    def test_rechecks_backend_for_missed_events(self, get_final_status):
+        # The task finishes after it's first looked up, but before the hub gets its events
+        get_final_status.side_effect = [
+            None,
+            None,
+            {"task_id": "missed", "status": "succeeded"},
+        ]
+
+        self.assertEqual(
+            self.stream("missed"),
+            [("status", {"task_id": "missed", "status": "succeeded"})],
+        )
+        self.assertEqual(get_final_status.call_count, 3)
+
+    @patch.dict(
+        os.environ,
+        {"TASK_STATUS_KEEPALIVE": "0.05", "TASK_STATUS_STREAM_TIMEOUT": "0.2"},
+    )
+    @patch("app.api.get_final_status", MagicMock(return_value=None))
+    def test_gives_up_on_unknown_tasks(self):
+        self.assertEqual(
+            self.stream("unknown"), [("timeout", {"task_ids": ["unknown"]})]
+        )
+        self.assertEqual(api.task_status_hub.subscribers, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -54,17 +54,23 @@ class TestEndToEnd(unittest.TestCase):
         task_status = result.get("task_status", "PENDING")
         task_id = result["task_id"]
 
-        tries = 0
-        while task_status in ["PENDING", "RETRY"]:
-            tries += 1
-            self.assertLess(tries, 100, "Timed out waiting for task to complete")
-            sleep(1)
+        if task_status in ["PENDING", "RETRY"]:
+            # The stream ends once the task has succeeded or failed
+            with requests.get(
+                url=f"{api_base_url}/tasks/stream",
+                params={"task_id": task_id},
+                timeout=100,
+                headers=headers,
+                stream=True,
+            ) as r:
+                r.raise_for_status()
+                for _ in r.iter_lines():
+                    pass
             r = requests.get(
                 url=f"{api_base_url}/tasks/{task_id}", timeout=5, headers=headers
             )
             r.raise_for_status()
             result = r.json()
-            task_status = result["task_status"]
         # Make sure we got the correct task while also throwing out something that would mess up our comparison alter
         self.assertEqual(task_id, result.pop("task_id"))
         return result
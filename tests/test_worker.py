@@ -0,0 +1,492 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, Mock, PropertyMock, call, patch
+
+from celery_batches import SimpleRequest
+
+from app import worker
+from app.search.adapters import MeilisearchAdapter
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenException
+from app.whisper.exceptions import WhisperException
+from app.whisper.task import WhisperBatchTask
+
+
+class TestDegradation(unittest.TestCase):
+    @patch.object(worker.degradation, "get_queue_age", MagicMock(return_value=400))
+    def test_passes_queue_age_on_to_post_transcribe(self):
+        headers: dict = {}
+        with patch(
+            "app.worker.current_task", SimpleNamespace(name=worker.transcribe_task.name)
+        ):
+            worker.before_task_publish(headers=headers)
+        self.assertEqual(headers["transcribe_queue_age"], 400)
+
+        # Calls published by the API don't know the queue age
+        headers = {}
+        with patch("app.worker.current_task", None):
+            worker.before_task_publish(headers=headers)
+        self.assertNotIn("transcribe_queue_age", headers)
+
+    @patch.object(worker.degradation, "observe_queue_age")
+    def test_post_transcribe_observes_queue_age(self, observe_queue_age):
+        task = SimpleNamespace(
+            name=worker.post_transcribe_task.name,
+            request=SimpleNamespace(sent_at=None, transcribe_queue_age=400),
+        )
+
+        worker.record_queue_wait(task=task)
+
+        observe_queue_age.assert_called_once_with(400)
+
+    @patch("app.worker.send_notifications")
+    @patch.object(worker.degradation, "get_level")
+    def test_defers_notifications_until_backlog_clears(
+        self, get_level, send_notifications
+    ):
+        args = ("https://example.com/call.mp3", {}, [], None, "")
+        send_notifications.return_value = []
+
+        get_level.return_value = (3, {"defer_notifications": True})
+        with patch.object(worker.deferred_notifications_task, "retry") as retry:
+            retry.side_effect = RuntimeError()
+            with self.assertRaises(RuntimeError):
+                worker.deferred_notifications_task(*args)
+        send_notifications.assert_not_called()
+
+        get_level.return_value = (0, {})
+        worker.deferred_notifications_task(*args)
+        send_notifications.assert_called_once()
+
+    @patch("app.worker.send_notifications", return_value=[])
+    @patch.object(
+        worker.degradation,
+        "get_level",
+        MagicMock(return_value=(3, {"defer_notifications": True})),
+    )
+    def test_sends_deferred_notifications_when_out_of_retries(self, send_notifications):
+        worker.deferred_notifications_task.apply(
+            args=("https://example.com/call.mp3", {}, [], None, ""),
+            retries=worker.DEFERRED_MAX_RETRIES,
+        )
+
+        send_notifications.assert_called_once()
+
+    @patch("app.worker.send_notifications")
+    @patch("app.worker.get_channel_breaker", MagicMock())
+    @patch.object(worker.degradation, "get_level", MagicMock(return_value=(0, {})))
+    def test_retries_only_skipped_channels(self, send_notifications):
+        send_notifications.return_value = ["tgram://down"]
+
+        with patch.object(worker.deferred_notifications_task, "retry") as retry:
+            retry.side_effect = RuntimeError()
+            with self.assertRaises(RuntimeError):
+                worker.deferred_notifications_task(
+                    "https://example.com/call.mp3", {}, [], None, ""
+                )
+
+        self.assertEqual(retry.call_args.kwargs["kwargs"]["channels"], ["tgram://down"])
+
+
+@patch("app.worker.observe_call_latency", MagicMock())
+@patch.object(worker.degradation, "get_level", MagicMock(return_value=(0, {})))
+class TestPostTranscribe(unittest.TestCase):
+    def setUp(self):
+        with open("tests/data/1-1673118015_477787500-call_1.json") as file:
+            self.metadata = json.load(file)
+        self.transcript = MagicMock(transcript=[], txt="Test")
+        self.search = MagicMock(spec=MeilisearchAdapter)
+        self.search.index_call.return_value = "https://example.com/search"
+        # Records the order of the calls across every mock attached to it
+        self.calls = Mock()
+        self.calls.attach_mock(self.search.index_call, "index_call")
+
+        patcher = patch("app.worker.get_search_adapters", return_value=[self.search])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for target, kwargs in (
+            ("app.radio.digital.process_response", {"return_value": self.transcript}),
+            ("app.worker.call_api", {}),
+            ("app.worker.send_notifications", {"return_value": []}),
+            ("app.worker.lookup_geo", {}),
+        ):
+            patcher = patch(target, **kwargs)
+            mock = patcher.start()
+            self.addCleanup(patcher.stop)
+            self.calls.attach_mock(mock, target.rsplit(".", 1)[1])
+
+    def post_transcribe(self):
+        return worker.post_transcribe_task(
+            {}, self.metadata, "https://example.com/call.mp3", 1
+        )
+
+    def test_indexes_once_with_location(self):
+        geo = {"geo": {"lat": 1.0, "lng": 2.0}, "geo_formatted_address": "Main St"}
+        self.calls.lookup_geo.return_value = geo
+
+        self.assertEqual(self.post_transcribe(), "Test")
+
+        self.search.index_call.assert_called_once()
+        self.assertEqual(self.search.index_call.call_args.args[4], geo)
+        self.calls.call_api.assert_has_calls(
+            [
+                call("patch", "calls/1", json={"raw_transcript": []}),
+                call("patch", "calls/1", json={"geo": geo}),
+            ]
+        )
+        self.assertEqual(
+            self.calls.send_notifications.call_args.args[3:],
+            (geo, "https://example.com/search"),
+        )
+
+    def test_indexes_once_without_location(self):
+        self.calls.lookup_geo.return_value = None
+
+        self.post_transcribe()
+
+        self.search.index_call.assert_called_once()
+        self.assertIsNone(self.search.index_call.call_args.args[4])
+        self.calls.call_api.assert_called_once_with(
+            "patch", "calls/1", json={"raw_transcript": []}
+        )
+
+    @patch.object(worker, "GEOCODING_TIMEOUT", 0.01)
+    def test_does_not_wait_on_slow_geocoding(self):
+        geocoded = threading.Event()
+        self.addCleanup(geocoded.set)
+
+        def lookup_geo(*args, **kwargs):
+            geocoded.wait(5)
+
+        self.calls.lookup_geo.side_effect = lookup_geo
+
+        self.post_transcribe()
+
+        self.assertIsNone(self.search.index_call.call_args.args[4])
+        self.calls.send_notifications.assert_called_once()
+
+    @patch("app.worker.defer")
+    def test_defers_geocoding_while_geocoder_is_down(self, defer):
+        breaker = CircuitBreaker("geocoder")
+        self.calls.lookup_geo.side_effect = CircuitOpenException(breaker)
+
+        self.post_transcribe()
+
+        self.assertIsNone(self.search.index_call.call_args.args[4])
+        task, defer_breaker = defer.call_args.args
+        self.assertEqual(task.task, worker.deferred_geocode_task.name)
+        self.assertEqual(task.args[:2], (1, True))
+        self.assertIs(defer_breaker, breaker)
+        self.calls.send_notifications.assert_called_once()
+
+    def test_notifies_after_saving_and_indexing(self):
+        self.calls.lookup_geo.return_value = None
+
+        self.post_transcribe()
+
+        names = [name for name, _, _ in self.calls.mock_calls]
+        self.assertEqual(names[0], "process_response")
+        # The transcript is saved while the call is geocoded
+        self.assertCountEqual(names[1:3], ["lookup_geo", "call_api"])
+        self.assertEqual(names[3], "index_call")
+        self.assertEqual(names[4], "send_notifications")
+
+    def test_does_not_save_unsaved_calls(self):
+        self.calls.lookup_geo.return_value = None
+
+        worker.post_transcribe_task({}, self.metadata, "https://example.com/call.mp3")
+
+        self.calls.call_api.assert_not_called()
+        self.search.index_call.assert_called_once()
+
+
+@patch.object(worker.degradation, "get_level", MagicMock(return_value=(0, {})))
+@patch("app.worker.get_search_adapters")
+@patch("app.worker.call_api")
+@patch("app.worker.lookup_geo")
+class TestDeferredGeocode(unittest.TestCase):
+    args = (1, True, {}, "https://example.com/call.mp3", [], None)
+
+    @patch.object(worker.deferred_index_task, "apply_async")
+    def test_saves_and_reindexes_with_location(
+        self, apply_async, lookup_geo, call_api, get_search_adapters
+    ):
+        geo = {"geo": {"lat": 1.0, "lng": 2.0}, "geo_formatted_address": "Main St"}
+        lookup_geo.return_value = geo
+        get_search_adapters.return_value = [MagicMock(spec=MeilisearchAdapter)]
+
+        worker.deferred_geocode_task(*self.args)
+
+        call_api.assert_called_once_with("patch", "calls/1", json={"geo": geo})
+        apply_async.assert_called_once()
+        self.assertEqual(apply_async.call_args.args[0][5], geo)
+        self.assertEqual(
+            apply_async.call_args.kwargs, {"queue": worker.CELERY_DEFERRED_QUEUE}
+        )
+
+    @patch.object(worker.deferred_index_task, "apply_async")
+    def test_nothing_to_do_without_location(
+        self, apply_async, lookup_geo, call_api, get_search_adapters
+    ):
+        lookup_geo.return_value = None
+
+        worker.deferred_geocode_task(*self.args)
+
+        call_api.assert_not_called()
+        apply_async.assert_not_called()
+
+    def test_retries_while_geocoder_is_down(
+        self, lookup_geo, call_api, get_search_adapters
+    ):
+        lookup_geo.side_effect = CircuitOpenException(CircuitBreaker("geocoder"))
+
+        with patch.object(worker.deferred_geocode_task, "retry") as retry:
+            retry.side_effect = RuntimeError()
+            with self.assertRaises(RuntimeError):
+                worker.deferred_geocode_task(*self.args)
+
+        call_api.assert_not_called()
+
+
+@patch("app.worker.start_exporter", MagicMock())
+@patch("app.worker.preload_models")
+@patch.object(worker, "pool_processes", 0)
+class TestWorkerReady(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.ready_file = os.path.join(directory.name, "ready")
+        patcher = patch.dict(os.environ, {"WORKER_READY_FILE": self.ready_file})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ready_once_every_process_has_preloaded(self, preload_models):
+        worker.worker_init(
+            SimpleNamespace(
+                pool_cls="celery.concurrency.prefork:TaskPool", concurrency=2
+            )
+        )
+        worker.worker_ready()
+        preload_models.assert_not_called()
+
+        with patch("os.getpid", return_value=100):
+            worker.worker_process_init()
+        self.assertFalse(os.path.exists(self.ready_file))
+        with patch("os.getpid", return_value=101):
+            worker.worker_process_init()
+        self.assertTrue(os.path.exists(self.ready_file))
+        self.assertEqual(preload_models.call_count, 2)
+
+        # A restarted worker starts over
+        worker.worker_init(
+            SimpleNamespace(
+                pool_cls="celery.concurrency.prefork:TaskPool", concurrency=2
+            )
+        )
+        self.assertFalse(os.path.exists(self.ready_file))
+
+    def test_preloads_in_main_process_without_children(self, preload_models):
+        for pool in [
+            "celery.concurrency.solo:TaskPool",
+            "celery.concurrency.thread:TaskPool",
+        ]:
+            with self.subTest(pool=pool):
+                preload_models.reset_mock()
+                worker.worker_init(SimpleNamespace(pool_cls=pool, concurrency=4))
+                self.assertFalse(os.path.exists(self.ready_file))
+
+                # Only ready once the models have loaded
+                preload_models.side_effect = lambda: self.assertFalse(
+                    os.path.exists(self.ready_file)
+                )
+                worker.worker_ready()
+
+                preload_models.assert_called_once()
+                self.assertTrue(os.path.exists(self.ready_file))
+
+    def test_reports_ready(self, preload_models):
+        self.assertEqual(worker.ready(None), {"ready": False})
+        worker.mark_ready(self.ready_file)
+        self.assertEqual(worker.ready(None), {"ready": True})
+
+
+def make_request(id: str, vad_filter: bool, implementation: str | None = None):
+    options = {"vad_filter": vad_filter, "decode_options": {}}
+    post_transcribe = worker.post_transcribe_task.s({}, f"{id}.mp3").set(
+        task_id=f"post-{id}"
+    )
+    return SimpleRequest(
+        id=id,
+        name=worker.transcribe_batch_task.name,
+        args=(
+            options,
+            f"https://example.com/{id}.mp3",
+            implementation,
+            post_transcribe,
+        ),
+        kwargs={},
+        delivery_info={"routing_key": "transcribe_gpu"},
+        hostname="worker",
+        ignore_result=False,
+        reply_to=None,
+        correlation_id=None,
+        request_dict={},
+    )
+
+
+@patch.dict(os.environ, {"WHISPER_IMPLEMENTATION": "whisper", "WHISPER_MODEL": "base"})
+@patch("app.worker.send_status", MagicMock())
+@patch("app.worker.get_result_cache", MagicMock(return_value=None))
+@patch.object(worker.degradation, "get_level", MagicMock(return_value=(0, {})))
+@patch("app.worker.requeue_unbatched")
+@patch("app.worker.transcribe_bulk")
+@patch("app.worker.load_audio")
+@patch("celery.canvas.Signature.apply_async")
+@patch.object(WhisperBatchTask, "backend", new_callable=PropertyMock)
+@patch.object(WhisperBatchTask, "model")
+class TestTranscribeBatch(unittest.TestCase):
+    def transcribe_bulk(self, model, audio_files, options_list, **kwargs):
+        return [
+            WhisperException("No speech")
+            if "fails" in audio
+            else {"text": audio, "segments": [], "language": "en"}
+            for audio in audio_files
+        ]
+
+    def test_groups_calls_by_model_and_vad(
+        self,
+        model,
+        backend_property,
+        apply_async,
+        load_audio,
+        transcribe_bulk,
+        requeue_unbatched,
+    ):
+        backend = backend_property.return_value
+        load_audio.side_effect = lambda model, url, options: url
+        transcribe_bulk.side_effect = self.transcribe_bulk
+        requests = [
+            make_request("a", True),
+            make_request("b", False),
+            make_request("c", True),
+            make_request("d", True, "whisper:tiny"),
+        ]
+
+        worker.transcribe_batch_task.run(requests)
+
+        self.assertEqual(
+            [call.args for call in model.call_args_list],
+            [("whisper:base",), ("whisper:base",), ("whisper:tiny",)],
+        )
+        self.assertEqual(
+            [call.kwargs["audio_files"] for call in transcribe_bulk.call_args_list],
+            [
+                ["https://example.com/a.mp3", "https://example.com/c.mp3"],
+                ["https://example.com/b.mp3"],
+                ["https://example.com/d.mp3"],
+            ],
+        )
+        self.assertEqual(backend.mark_as_done.call_count, 4)
+        self.assertEqual(apply_async.call_count, 4)
+        requeue_unbatched.assert_not_called()
+
+    def test_marks_each_call_done_or_failed(
+        self,
+        model,
+        backend_property,
+        apply_async,
+        load_audio,
+        transcribe_bulk,
+        requeue_unbatched,
+    ):
+        backend = backend_property.return_value
+        load_audio.side_effect = lambda model, url, options: url
+        transcribe_bulk.side_effect = self.transcribe_bulk
+        requests = [make_request("a", True), make_request("fails", True)]
+
+        worker.transcribe_batch_task.run(requests)
+
+        backend.mark_as_done.assert_called_once_with(
+            "a",
+            {"text": "https://example.com/a.mp3", "segments": [], "language": "en"},
+            request=requests[0],
+        )
+        self.assertEqual(
+            [call.args[0] for call in backend.mark_as_failure.call_args_list],
+            ["fails", "post-fails"],
+        )
+        # Only the call that was transcribed goes on to post_transcribe
+        apply_async.assert_called_once_with(
+            ({"text": "https://example.com/a.mp3", "segments": [], "language": "en"},)
+        )
+
+    def test_requeues_calls_that_fail_to_load(
+        self,
+        model,
+        backend_property,
+        apply_async,
+        load_audio,
+        transcribe_bulk,
+        requeue_unbatched,
+    ):
+        backend = backend_property.return_value
+        load_audio.side_effect = [RuntimeError("404"), "b.wav"]
+        transcribe_bulk.side_effect = self.transcribe_bulk
+        requests = [make_request("a", True), make_request("b", True)]
+
+        worker.transcribe_batch_task.run(requests)
+
+        requeue_unbatched.assert_called_once_with(requests[0])
+        self.assertEqual(transcribe_bulk.call_args.kwargs["audio_files"], ["b.wav"])
+        backend.mark_as_done.assert_called_once()
+
+    def test_requeues_the_batch_when_transcription_fails(
+        self,
+        model,
+        backend_property,
+        apply_async,
+        load_audio,
+        transcribe_bulk,
+        requeue_unbatched,
+    ):
+        backend = backend_property.return_value
+        load_audio.side_effect = lambda model, url, options: url
+        transcribe_bulk.side_effect = RuntimeError("CUDA out of memory")
+        requests = [make_request("a", True), make_request("b", True)]
+
+        worker.transcribe_batch_task.run(requests)
+
+        self.assertEqual(
+            [call.args[0] for call in requeue_unbatched.call_args_list], requests
+        )
+        backend.mark_as_done.assert_not_called()
+        backend.mark_as_failure.assert_not_called()
+
+
+@patch("app.worker.transcribe_task.s")
+class TestRequeueUnbatched(unittest.TestCase):
+    def test_sends_call_through_single_task(self, transcribe_s):
+        request = make_request("a", True, "whisper:tiny")
+        chain = transcribe_s.return_value.set.return_value.__or__.return_value
+
+        worker.requeue_unbatched(request)
+
+        transcribe_s.assert_called_once_with(
+            request.args[0], "https://example.com/a.mp3", "whisper:tiny"
+        )
+        transcribe_s.return_value.set.assert_called_once_with(
+            queue="transcribe_gpu", priority=None
+        )
+        # Chained to the same post_transcribe task, so its result ID doesn't change
+        post_transcribe = (
+            transcribe_s.return_value.set.return_value.__or__.call_args.args[0]
+        )
+        self.assertEqual(post_transcribe.id, "post-a")
+        chain.apply_async.assert_called_once_with()
+
+
+if __name__ == "__main__":
+    unittest.main()
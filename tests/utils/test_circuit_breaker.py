@@ -0,0 +1,108 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from app.utils.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenException,
+)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def fail(self, breaker: CircuitBreaker, times: int = 1) -> None:
+        for _ in range(times):
+            with self.assertRaises(ConnectionError):
+                breaker.call(Mock(side_effect=ConnectionError()))
+
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker("test", failure_threshold=3)
+
+        self.fail(breaker, 2)
+        self.assertEqual(breaker.state, CLOSED)
+        self.fail(breaker)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertTrue(breaker.is_open())
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker("test", failure_threshold=3)
+
+        self.fail(breaker, 2)
+        self.assertEqual(breaker.call(lambda: "ok"), "ok")
+        self.fail(breaker, 2)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_fails_fast_when_open(self):
+        breaker = CircuitBreaker("test", failure_threshold=1)
+        self.fail(breaker)
+
+        func = Mock()
+        with self.assertRaises(CircuitOpenException) as context:
+            breaker.call(func)
+        func.assert_not_called()
+        self.assertIs(context.exception.breaker, breaker)
+
+    @patch("app.utils.circuit_breaker.time.time")
+    def test_probe_success_closes(self, time):
+        breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=60)
+        time.return_value = 1000
+        self.fail(breaker)
+
+        time.return_value = 1059
+        with self.assertRaises(CircuitOpenException):
+            breaker.call(Mock())
+
+        time.return_value = 1060
+        self.assertFalse(breaker.is_open())
+        breaker.before_call()
+        self.assertEqual(breaker.state, HALF_OPEN)
+        # Only the probe is let through until it finishes
+        with self.assertRaises(CircuitOpenException):
+            breaker.call(Mock())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+
+    @patch("app.utils.circuit_breaker.time.time")
+    def test_probe_failure_reopens(self, time):
+        breaker = CircuitBreaker("test", failure_threshold=3, recovery_timeout=60)
+        time.return_value = 1000
+        self.fail(breaker, 3)
+
+        time.return_value = 1060
+        self.fail(breaker)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(breaker.opened_at, 1060)
+        self.assertTrue(breaker.is_open())
+
+    @patch("app.utils.circuit_breaker.time.time")
+    def test_probe_records_any_exception(self, time):
+        breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=60)
+        time.return_value = 1000
+        self.fail(breaker)
+
+        time.return_value = 1060
+        with self.assertRaises(KeyboardInterrupt):
+            breaker.call(Mock(side_effect=KeyboardInterrupt()))
+        self.assertEqual(breaker.state, OPEN)
+
+    @patch("app.utils.circuit_breaker.time.time")
+    def test_lost_probe_times_out(self, time):
+        breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=60)
+        time.return_value = 1000
+        self.fail(breaker)
+
+        # A probe is let through, but never reports back
+        time.return_value = 1060
+        breaker.before_call()
+        time.return_value = 1119
+        self.assertTrue(breaker.is_open())
+
+        time.return_value = 1120
+        self.assertFalse(breaker.is_open())
+        self.assertEqual(breaker.call(lambda: "ok"), "ok")
+        self.assertEqual(breaker.state, CLOSED)
+
+
+if __name__ == "__main__":
+    unittest.main()
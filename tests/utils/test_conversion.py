@@ -1,9 +1,27 @@
+import json
 import os
 import unittest
+import wave
 from subprocess import CompletedProcess
 from unittest.mock import patch
 
-from app.utils.conversion import _convert_file
+import av
+import numpy as np
+
+from app.utils.conversion import (
+    MP3_FORMAT,
+    OGG_FORMAT,
+    SAMPLE_RATE,
+    WAV_FORMAT,
+    _build_ffmpeg_args,
+    _convert,
+    _convert_file,
+    _encode_file,
+    convert_to_wav,
+    decode_audio,
+    get_duration,
+    write_wav,
+)
 from app.models.metadata import Metadata
 
 
@@ -113,6 +131,134 @@ class TestConversion(unittest.TestCase):
 
         os.remove(result)
 
+    def test_build_ffmpeg_args(self):
+        self.assertEqual(
+            _build_ffmpeg_args(WAV_FORMAT),
+            ["-c:a", "pcm_s16le", "-ar", "16000", "-ac", "1"],
+        )
+        self.assertEqual(
+            _build_ffmpeg_args(MP3_FORMAT), ["-c:a", "libmp3lame", "-b:a", "32k"]
+        )
+        self.assertEqual(
+            _build_ffmpeg_args(OGG_FORMAT), ["-c:a", "libopus", "-b:a", "128k"]
+        )
+
+    @patch("app.utils.conversion._convert_file")
+    @patch("app.utils.conversion._encode_file")
+    def test_convert_falls_back_to_ffmpeg(self, encode_file, convert_file):
+        encode_file.side_effect = av.error.InvalidDataError(1094995529, "Invalid data")
+        convert_file.return_value = "output.mp3"
+
+        self.assertEqual(
+            _convert(self.audio_file, "mp3", MP3_FORMAT, self.metadata), "output.mp3"
+        )
+        convert_file.assert_called_once_with(
+            self.audio_file,
+            "mp3",
+            ["-c:a", "libmp3lame", "-b:a", "32k"],
+            self.metadata,
+        )
+
+
+class TestEncodeFile(unittest.TestCase):
+    audio_file = "tests/data/1-1673118015_477787500-call_1.wav"
+    metadata_file = "tests/data/1-1673118015_477787500-call_1.json"
+
+    def setUp(self):
+        with open(self.metadata_file) as file:
+            self.metadata: Metadata = json.load(file)
+        with wave.open(self.audio_file) as wav:
+            self.duration = wav.getnframes() / wav.getframerate()
+
+    def encode(self, format, output_format, metadata=None):
+        result = _encode_file(self.audio_file, format, output_format, metadata)
+        self.addCleanup(os.remove, result)
+        return av.open(result)
+
+    def test_encode_wav(self):
+        with self.encode("wav", WAV_FORMAT) as container:
+            stream = container.streams.audio[0]
+            self.assertEqual(stream.codec_context.name, "pcm_s16le")
+            self.assertEqual(stream.rate, SAMPLE_RATE)
+            self.assertEqual(stream.channels, 1)
+            self.assertAlmostEqual(
+                container.duration / av.time_base, self.duration, places=1
+            )
+
+    def test_encode_mp3(self):
+        with self.encode("mp3", MP3_FORMAT, self.metadata) as container:
+            stream = container.streams.audio[0]
+            self.assertEqual(stream.codec_context.name, "mp3float")
+            self.assertAlmostEqual(
+                container.duration / av.time_base, self.duration, delta=0.2
+            )
+            self.assertEqual(container.metadata["title"], "CFD Fire N")
+            self.assertEqual(container.metadata["artist"], "E96, Fire Main")
+            self.assertEqual(container.metadata["album"], "Chicago Fire Department")
+
+    def test_encode_ogg(self):
+        with self.encode("ogg", OGG_FORMAT, self.metadata) as container:
+            stream = container.streams.audio[0]
+            self.assertEqual(stream.codec_context.name, "opus")
+            # Ogg stores the tags as comments on the stream
+            self.assertEqual(stream.metadata["composer"], "trunk-recorder")
+            self.assertEqual(stream.metadata["date"], "2023-01-07")
+
+    def test_get_duration(self):
+        self.assertAlmostEqual(get_duration(self.audio_file), self.duration, places=2)
+
+
+class TestDecodeAudio(unittest.TestCase):
+    audio_file = "tests/data/1-1673118015_477787500-call_1.wav"
+
+    def test_decode_audio(self):
+        with open(self.audio_file, "rb") as file:
+            audio = decode_audio(file.read())
+
+        with wave.open(self.audio_file) as wav:
+            duration = wav.getnframes() / wav.getframerate()
+
+        self.assertEqual(audio.dtype, np.float32)
+        self.assertEqual(audio.ndim, 1)
+        self.assertAlmostEqual(len(audio) / SAMPLE_RATE, duration, places=1)
+        self.assertLessEqual(np.abs(audio).max(), 1.0)
+
+    def test_write_wav(self):
+        audio = np.sin(np.linspace(0, 100, SAMPLE_RATE)).astype(np.float32) * 0.5
+
+        result = write_wav(audio)
+        try:
+            with wave.open(result) as wav:
+                self.assertEqual(wav.getnchannels(), 1)
+                self.assertEqual(wav.getframerate(), SAMPLE_RATE)
+                self.assertEqual(wav.getnframes(), len(audio))
+            with open(result, "rb") as file:
+                decoded = decode_audio(file.read())
+            np.testing.assert_allclose(decoded, audio, atol=1e-3)
+        finally:
+            os.remove(result)
+
+
+class TestConvertToWav(unittest.TestCase):
+    @patch("app.utils.conversion.get_conversion_cache")
+    def test_skips_files_that_are_already_wav(self, get_conversion_cache):
+        source = write_wav(np.zeros(SAMPLE_RATE, dtype=np.float32))
+        self.addCleanup(os.remove, source)
+
+        result = convert_to_wav(source)
+        self.addCleanup(os.remove, result)
+
+        get_conversion_cache.assert_not_called()
+        self.assertNotEqual(result, source)
+        with open(result, "rb") as file, open(source, "rb") as original:
+            self.assertEqual(file.read(), original.read())
+
+    @patch("app.utils.conversion.get_conversion_cache")
+    def test_converts_other_files(self, get_conversion_cache):
+        get_conversion_cache.return_value.convert.return_value = "converted.wav"
+
+        self.assertEqual(convert_to_wav(TestEncodeFile.audio_file), "converted.wav")
+
 
 if __name__ == "__main__":
     unittest.main()
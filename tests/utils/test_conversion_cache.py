@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from app.utils.conversion_cache import ConversionCache
+
+
+class TestConversionCache(unittest.TestCase):
+    def setUp(self):
+        self.sources = [self.make_file(f"call {i}".encode()) for i in range(4)]
+
+    def make_file(self, content: bytes, suffix: str = ".wav") -> str:
+        file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+        file.write(content)
+        file.close()
+        self.addCleanup(self.remove, file.name)
+        return file.name
+
+    def remove(self, path: str) -> None:
+        if os.path.exists(path):
+            os.remove(path)
+
+    def converter(self, content: bytes = b"converted") -> Mock:
+        return Mock(side_effect=lambda: self.make_file(content, ".mp3"))
+
+    def convert(self, cache: ConversionCache, source: str, converter: Mock) -> str:
+        result = cache.convert(source, "mp3", {"bit_rate": 32000}, converter)
+        self.addCleanup(self.remove, result)
+        return result
+
+    def test_reuses_conversion(self):
+        cache = ConversionCache()
+        converter = self.converter()
+
+        first = self.convert(cache, self.sources[0], converter)
+        # Callers delete their copy when they're done with it
+        os.remove(first)
+        second = self.convert(cache, self.sources[0], converter)
+
+        converter.assert_called_once()
+        self.assertNotEqual(first, second)
+        with open(second, "rb") as file:
+            self.assertEqual(file.read(), b"converted")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_key_includes_params(self):
+        cache = ConversionCache()
+        converter = self.converter()
+
+        self.convert(cache, self.sources[0], converter)
+        cache.convert(self.sources[0], "mp3", {"bit_rate": 64000}, converter)
+
+        self.assertEqual(converter.call_count, 2)
+
+    def test_evicts_least_recently_used_entry(self):
+        cache = ConversionCache(max_entries=2)
+        converter = self.converter()
+
+        self.convert(cache, self.sources[0], converter)
+        self.convert(cache, self.sources[1], converter)
+        self.convert(cache, self.sources[0], converter)
+        evicted = cache.files[next(iter(cache.files))]["path"]
+        self.convert(cache, self.sources[2], converter)
+
+        self.assertEqual(len(cache.files), 2)
+        self.assertEqual(cache.evictions, 1)
+        self.assertFalse(os.path.exists(evicted))
+        self.convert(cache, self.sources[0], converter)
+        self.assertEqual(converter.call_count, 3)
+
+    def test_evicts_to_stay_within_bytes(self):
+        cache = ConversionCache(max_bytes=25)
+        converter = self.converter(b"0123456789")
+
+        for source in self.sources[:3]:
+            self.convert(cache, source, converter)
+
+        self.assertEqual(len(cache.files), 2)
+        self.assertEqual(cache.size, 20)
+
+    def test_reconverts_missing_file(self):
+        cache = ConversionCache()
+        converter = self.converter()
+
+        self.convert(cache, self.sources[0], converter)
+        os.remove(cache.files[next(iter(cache.files))]["path"])
+        result = self.convert(cache, self.sources[0], converter)
+
+        self.assertEqual(converter.call_count, 2)
+        self.assertTrue(os.path.exists(result))
+
+    def test_hits_keep_files_from_the_temp_cleaner(self):
+        cache = ConversionCache()
+        self.convert(cache, self.sources[0], self.converter())
+        path = cache.files[next(iter(cache.files))]["path"]
+        os.utime(path, (0, 0))
+
+        self.convert(cache, self.sources[0], self.converter())
+
+        self.assertGreater(os.path.getmtime(path), 0)
+
+    def test_disabled(self):
+        cache = ConversionCache(max_entries=0)
+        converter = self.converter()
+
+        self.convert(cache, self.sources[0], converter)
+        self.convert(cache, self.sources[0], converter)
+
+        self.assertEqual(converter.call_count, 2)
+        self.assertFalse(cache.files)
+
+
+if __name__ == "__main__":
+    unittest.main()
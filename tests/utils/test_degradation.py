@@ -0,0 +1,66 @@
+import unittest
+from unittest.mock import patch
+
+from app.utils.degradation import DegradationController, DegradationLevel
+
+LEVELS: list[DegradationLevel] = [
+    {"min_queue_depth": 10, "decode_options": {"beam_size": 1}},
+    {"min_queue_depth": 100, "min_queue_age": 300, "skip_llm": True},
+]
+
+
+@patch("app.utils.degradation.get_degradation_config", return_value=LEVELS)
+class TestDegradationController(unittest.TestCase):
+    def test_no_config(self, get_config):
+        get_config.return_value = []
+        controller = DegradationController("transcribe_gpu")
+
+        self.assertEqual(controller.get_level(), (0, {}))
+
+    @patch("app.utils.degradation.get_queue_depth")
+    def test_steps_up_immediately(self, get_queue_depth, _):
+        controller = DegradationController("transcribe_gpu")
+
+        get_queue_depth.return_value = 5
+        self.assertEqual(controller.get_level()[0], 0)
+        get_queue_depth.return_value = 20
+        self.assertEqual(controller.get_level(), (1, LEVELS[0]))
+        get_queue_depth.return_value = 20
+        controller.observe_queue_age(400)
+        self.assertEqual(controller.get_level(), (2, LEVELS[1]))
+
+    @patch("app.utils.degradation.get_queue_depth")
+    @patch("app.utils.degradation.time.time")
+    def test_steps_down_after_cooldown(self, time, get_queue_depth, _):
+        controller = DegradationController("transcribe_gpu", cooldown=60)
+        time.return_value = 1000
+        get_queue_depth.return_value = 500
+        self.assertEqual(controller.get_level()[0], 2)
+
+        get_queue_depth.return_value = 0
+        self.assertEqual(controller.get_level()[0], 2)
+        time.return_value = 1059
+        self.assertEqual(controller.get_level()[0], 2)
+        time.return_value = 1060
+        self.assertEqual(controller.get_level()[0], 1)
+        time.return_value = 1120
+        self.assertEqual(controller.get_level()[0], 0)
+
+    @patch("app.utils.degradation.get_queue_depth", return_value=None)
+    @patch("app.utils.degradation.time.time")
+    def test_queue_age_goes_stale(self, time, get_queue_depth, _):
+        controller = DegradationController("transcribe_gpu", cooldown=60)
+        time.return_value = 1000
+        controller.observe_queue_age(400)
+        self.assertEqual(controller.get_level()[0], 2)
+
+        # No tasks have come in since, so the queue has drained
+        time.return_value = 1060
+        self.assertEqual(controller.get_queue_age(), 0)
+        controller.get_level()
+        time.return_value = 1120
+        self.assertEqual(controller.get_level()[0], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
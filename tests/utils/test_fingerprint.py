@@ -0,0 +1,78 @@
+import unittest
+
+import numpy as np
+
+from app.utils.conversion import decode_audio
+from app.utils.fingerprint import DuplicateIndex, fingerprint, similarity
+
+
+def load(filename: str) -> np.ndarray:
+    with open(filename, "rb") as file:
+        return decode_audio(file.read())
+
+
+class TestFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.audio = load("tests/data/1-1673118015_477787500-call_1.wav")
+        self.other_audio = load("tests/data/11-1673118186_460378000-call_0.wav")
+        # The same call recorded at another site: starting a bit later, quieter and noisier
+        noise = np.random.default_rng(0).standard_normal(len(self.audio) - 1234)
+        self.copy = (self.audio[1234:] * 0.8 + noise * 0.02).astype(np.float32)
+
+    def test_similarity(self):
+        audio_fingerprint = fingerprint(self.audio)
+
+        self.assertGreater(similarity(audio_fingerprint, fingerprint(self.copy)), 0.5)
+        self.assertLess(
+            similarity(audio_fingerprint, fingerprint(self.other_audio)), 0.15
+        )
+        self.assertEqual(similarity(audio_fingerprint, []), 0)
+
+    def test_duplicate_index(self):
+        index = DuplicateIndex(window=30, threshold=0.3)
+
+        call, is_duplicate = index.check_and_add(
+            ("chi_cfd", 1), 1000, fingerprint(self.audio)
+        )
+        self.assertFalse(is_duplicate)
+        call["task_id"] = "abc"
+
+        duplicate, is_duplicate = index.check_and_add(
+            ("chi_cfd", 1), 1001, fingerprint(self.copy)
+        )
+        self.assertTrue(is_duplicate)
+        self.assertEqual(duplicate["task_id"], "abc")
+
+        # Same audio on another talkgroup, or much later, isn't a duplicate
+        self.assertFalse(
+            index.check_and_add(("chi_cfd", 2), 1001, fingerprint(self.copy))[1]
+        )
+        self.assertFalse(
+            index.check_and_add(("chi_cfd", 1), 1100, fingerprint(self.copy))[1]
+        )
+        self.assertFalse(
+            index.check_and_add(("chi_cfd", 1), 1002, fingerprint(self.other_audio))[1]
+        )
+
+    def test_forgets_calls_that_fail(self):
+        index = DuplicateIndex(window=30, threshold=0.3)
+
+        call, _ = index.check_and_add(("chi_cfd", 1), 1000, fingerprint(self.audio))
+        index.finish(call)
+
+        self.assertTrue(call["done"].is_set())
+        # so the next copy is let through
+        copy, is_duplicate = index.check_and_add(
+            ("chi_cfd", 1), 1001, fingerprint(self.copy)
+        )
+        self.assertFalse(is_duplicate)
+
+        copy["task_id"] = "abc"
+        index.finish(copy)
+        self.assertTrue(
+            index.check_and_add(("chi_cfd", 1), 1002, fingerprint(self.audio))[1]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
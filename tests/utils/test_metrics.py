@@ -0,0 +1,59 @@
+import os
+import time
+import unittest
+from unittest.mock import patch
+
+from prometheus_client import REGISTRY
+
+from app.utils.metrics import observe_call_latency, start_exporter, time_stage
+
+
+def get_sample(name: str, labels: dict[str, str]) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetrics(unittest.TestCase):
+    def test_time_stage(self):
+        count = get_sample("transcribe_stage_duration_seconds_count", {"stage": "test"})
+        failures = get_sample("transcribe_stage_failures_total", {"stage": "test"})
+
+        with time_stage("test"):
+            pass
+        with self.assertRaises(ValueError):
+            with time_stage("test"):
+                raise ValueError()
+
+        self.assertEqual(
+            get_sample("transcribe_stage_duration_seconds_count", {"stage": "test"}),
+            count + 2,
+        )
+        self.assertEqual(
+            get_sample("transcribe_stage_failures_total", {"stage": "test"}),
+            failures + 1,
+        )
+
+    def test_observe_call_latency(self):
+        total = get_sample("transcribe_call_latency_seconds_sum", {"stage": "test"})
+
+        observe_call_latency({"stop_time": int(time.time()) - 30}, "test")  # type: ignore[typeddict-item]
+
+        self.assertAlmostEqual(
+            get_sample("transcribe_call_latency_seconds_sum", {"stage": "test"}),
+            total + 30,
+            delta=2,
+        )
+
+    @patch("app.utils.metrics.start_http_server")
+    def test_exporter_needs_multiproc_dir_for_child_processes(self, start_http_server):
+        with patch.dict(os.environ, {"METRICS_PORT": "9100"}):
+            os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+            with self.assertRaises(RuntimeError):
+                start_exporter(child_processes=True)
+            start_http_server.assert_not_called()
+
+            start_exporter()
+            start_http_server.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
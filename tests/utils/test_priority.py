@@ -0,0 +1,60 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from app.utils.priority import (
+    ALERT_PRIORITY,
+    DEFAULT_PRIORITY,
+    EMERGENCY_PRIORITY,
+    TALKGROUP_TAG_PRIORITY,
+    get_priority,
+    to_broker_priority,
+)
+
+
+class TestPriority(unittest.TestCase):
+    def setUp(self):
+        self.metadata = {
+            "emergency": 0,
+            "talkgroup": 1,
+            "short_name": "chi_cfd",
+            "talkgroup_group_tag": "Fire Tac",
+        }
+        self.config = {
+            "^1@chi_cfd$": {
+                "channels": [],
+                "append_talkgroup": False,
+                "alerts": [{"channels": ["tgram://bot/123"]}],
+            }
+        }
+
+    @patch("app.utils.priority.get_notifications_config", return_value={})
+    def test_get_priority(self, _):
+        self.assertEqual(get_priority(self.metadata), DEFAULT_PRIORITY)  # type: ignore[arg-type]
+
+        with patch.dict(
+            os.environ, {"PRIORITY_TALKGROUP_TAGS": "Fire Dispatch, Fire Tac"}
+        ):
+            self.assertEqual(get_priority(self.metadata), TALKGROUP_TAG_PRIORITY)  # type: ignore[arg-type]
+
+        self.metadata["emergency"] = 1
+        self.assertEqual(get_priority(self.metadata), EMERGENCY_PRIORITY)  # type: ignore[arg-type]
+
+    def test_get_priority_with_alerts(self):
+        with patch(
+            "app.utils.priority.get_notifications_config", return_value=self.config
+        ):
+            self.assertEqual(get_priority(self.metadata), ALERT_PRIORITY)  # type: ignore[arg-type]
+
+            self.metadata["talkgroup"] = 2
+            self.assertEqual(get_priority(self.metadata), DEFAULT_PRIORITY)  # type: ignore[arg-type]
+
+    def test_to_broker_priority(self):
+        self.assertEqual(to_broker_priority(EMERGENCY_PRIORITY, 9, "amqp://"), 9)
+        self.assertEqual(to_broker_priority(DEFAULT_PRIORITY, 9, "amqp://"), 0)
+        self.assertEqual(to_broker_priority(ALERT_PRIORITY, 3, "amqp://"), 2)
+        self.assertEqual(to_broker_priority(EMERGENCY_PRIORITY, 9, "redis://"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from datetime import datetime
+
+from kombu.serialization import dumps, loads
+
+from app.utils.serialization import (
+    COMPRESSED,
+    SERIALIZER,
+    UNCOMPRESSED,
+    register_serializer,
+)
+
+
+class TestSerialization(unittest.TestCase):
+    def setUp(self):
+        register_serializer()
+
+    def roundtrip(self, obj):
+        content_type, content_encoding, data = dumps(obj, serializer=SERIALIZER)
+        return data, loads(data, content_type, content_encoding)
+
+    def test_small_payloads_are_not_compressed(self):
+        data, result = self.roundtrip({"text": "Engine 96 on scene", "language": "en"})
+
+        self.assertEqual(data[:1], UNCOMPRESSED)
+        self.assertEqual(result, {"text": "Engine 96 on scene", "language": "en"})
+
+    def test_large_payloads_are_compressed(self):
+        segments = [
+            {"start": i, "end": i + 1, "text": "Engine 96 on scene"} for i in range(100)
+        ]
+
+        data, result = self.roundtrip([{"segments": segments}, ("a", 1)])
+
+        self.assertEqual(data[:1], COMPRESSED)
+        self.assertLess(len(data), 1024)
+        # Tuples come back as lists, the same as with JSON
+        self.assertEqual(result, [{"segments": segments}, ["a", 1]])
+
+    def test_dates(self):
+        _, result = self.roundtrip({"date_done": datetime(2024, 1, 1, 12, 30)})
+
+        self.assertEqual(result, {"date_done": "2024-01-01T12:30:00"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,220 @@
+import io
+import json
+import os
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import av
+import requests
+
+from app.utils import storage
+
+
+class TestUploadRawAudioStream(unittest.TestCase):
+    audio_file = "tests/data/1-1673118015_477787500-call_1.wav"
+    metadata_file = "tests/data/1-1673118015_477787500-call_1.json"
+
+    def setUp(self):
+        with open(self.metadata_file) as file:
+            self.metadata = json.load(file)
+        self.uploaded: dict[str, bytes] = {}
+
+    def upload_fileobj(self, file, remote_path):
+        self.uploaded[remote_path] = file.read()
+        return f"https://example.com/{remote_path}"
+
+    @patch("app.utils.storage.upload_fileobj")
+    def test_streams_mp3(self, upload_fileobj):
+        upload_fileobj.side_effect = self.upload_fileobj
+
+        with open(self.audio_file, "rb") as audio:
+            url, worker_format = storage.upload_raw_audio_stream(self.metadata, audio)
+
+        remote_path = "2023/01/07/19/20230107_190015_chi_cfd_1.mp3"
+        self.assertEqual(url, f"https://example.com/{remote_path}")
+        self.assertIsNone(worker_format)
+        with av.open(io.BytesIO(self.uploaded[remote_path])) as container:
+            self.assertEqual(container.streams.audio[0].codec_context.name, "mp3float")
+            self.assertAlmostEqual(container.duration / av.time_base, 5.4, delta=0.2)
+            self.assertEqual(container.metadata["title"], "CFD Fire N")
+
+    @patch("app.utils.storage.upload_raw_audio")
+    @patch("app.utils.storage.delete_file")
+    @patch("app.utils.storage.encode_mp3_stream")
+    @patch("app.utils.storage.upload_fileobj")
+    def test_falls_back_to_file_when_encoding_fails(
+        self, upload_fileobj, encode_mp3_stream, delete_file, upload_raw_audio
+    ):
+        upload_fileobj.side_effect = self.upload_fileobj
+
+        def encode(audio, output, metadata):
+            output.write(b"partial")
+            raise av.error.InvalidDataError(1094995529, "Invalid data")
+
+        encode_mp3_stream.side_effect = encode
+        upload_raw_audio.return_value = "https://example.com/fallback.mp3"
+
+        with open(self.audio_file, "rb") as audio:
+            url, _ = storage.upload_raw_audio_stream(self.metadata, audio)
+
+        self.assertEqual(url, "https://example.com/fallback.mp3")
+        delete_file.assert_called_once_with(
+            "2023/01/07/19/20230107_190015_chi_cfd_1.mp3"
+        )
+        upload_raw_audio.assert_called_once()
+
+    @patch("app.utils.storage.upload_fileobj")
+    def test_upload_failure(self, upload_fileobj):
+        upload_fileobj.side_effect = ConnectionError()
+
+        with open(self.audio_file, "rb") as audio:
+            with self.assertRaises(ConnectionError):
+                storage.upload_raw_audio_stream(self.metadata, audio)
+
+    @patch("app.utils.storage.upload_fileobj")
+    def test_upload_failure_waits_for_encoder(self, upload_fileobj):
+        upload_fileobj.side_effect = ConnectionError()
+        encoded = threading.Event()
+
+        def encode(audio, output):
+            time.sleep(0.1)
+            encoded.set()
+
+        with open(self.audio_file, "rb") as audio:
+            with self.assertRaises(ConnectionError):
+                storage.stream_upload(audio, "call.mp3", encode)
+            # The caller can close the audio once it returns
+            self.assertTrue(encoded.is_set())
+
+    @patch.dict(os.environ, {"WORKER_AUDIO_FORMAT": "flac"})
+    @patch("app.utils.storage.upload_fileobj")
+    def test_uploads_worker_audio(self, upload_fileobj):
+        upload_fileobj.side_effect = self.upload_fileobj
+
+        with open(self.audio_file, "rb") as audio:
+            _, worker_format = storage.upload_raw_audio_stream(self.metadata, audio)
+
+        self.assertEqual(worker_format, "flac")
+        self.assertIn("2023/01/07/19/20230107_190015_chi_cfd_1.mp3", self.uploaded)
+        remote_path = "2023/01/07/19/20230107_190015_chi_cfd_1.flac"
+        with av.open(io.BytesIO(self.uploaded[remote_path])) as container:
+            stream = container.streams.audio[0]
+            self.assertEqual(stream.codec_context.name, "flac")
+            self.assertEqual(stream.rate, 16000)
+            self.assertEqual(stream.channels, 1)
+
+    @patch.dict(os.environ, {"WORKER_AUDIO_FORMAT": "flac"})
+    @patch("app.utils.storage.upload_fileobj")
+    def test_uploads_worker_audio_alongside_mp3(self, upload_fileobj):
+        started = threading.Barrier(2, timeout=5)
+
+        def upload(file, remote_path):
+            # Both uploads have to be running at once to get past this
+            started.wait()
+            return self.upload_fileobj(file, remote_path)
+
+        upload_fileobj.side_effect = upload
+
+        with open(self.audio_file, "rb") as audio:
+            _, worker_format = storage.upload_raw_audio_stream(self.metadata, audio)
+
+        self.assertEqual(worker_format, "flac")
+        self.assertEqual(len(self.uploaded), 2)
+
+    @patch.dict(os.environ, {"WORKER_AUDIO_FORMAT": "flac"})
+    @patch("app.utils.storage.upload_fileobj")
+    def test_worker_audio_failure(self, upload_fileobj):
+        def upload(file, remote_path):
+            if remote_path.endswith(".flac"):
+                raise ConnectionError()
+            return self.upload_fileobj(file, remote_path)
+
+        upload_fileobj.side_effect = upload
+
+        with open(self.audio_file, "rb") as audio:
+            url, worker_format = storage.upload_raw_audio_stream(self.metadata, audio)
+
+        self.assertTrue(url.endswith(".mp3"))
+        # Workers aren't told about a rendition that isn't there
+        self.assertIsNone(worker_format)
+
+
+@patch("app.utils.storage.requests.get")
+class TestFetchWorkerAudio(unittest.TestCase):
+    audio_url = "https://example.com/2023/01/07/19/20230107_190015_chi_cfd_1.mp3"
+    worker_audio_url = "https://example.com/2023/01/07/19/20230107_190015_chi_cfd_1.ogg"
+
+    def respond(self, get, responses):
+        def get_response(url, stream):
+            self.assertTrue(stream)
+            response = MagicMock()
+            content = responses[url]
+            if isinstance(content, Exception):
+                response.__enter__.return_value.raise_for_status.side_effect = content
+            else:
+                response.__enter__.return_value.iter_content.return_value = content
+            return response
+
+        get.side_effect = get_response
+
+    def test_prefers_worker_audio(self, get):
+        self.respond(get, {self.worker_audio_url: [b"op", b"us"]})
+
+        self.assertEqual(
+            storage.fetch_worker_audio_data(self.audio_url, "opus"), (b"opus", "ogg")
+        )
+
+    def test_falls_back_to_mp3(self, get):
+        self.respond(
+            get,
+            {
+                self.worker_audio_url: requests.HTTPError("404"),
+                self.audio_url: [b"mp3"],
+            },
+        )
+
+        self.assertEqual(
+            storage.fetch_worker_audio_data(self.audio_url, "opus"), (b"mp3", "mp3")
+        )
+
+    def test_drops_partial_worker_audio(self, get):
+        def interrupted():
+            yield b"op"
+            raise requests.ConnectionError()
+
+        self.respond(
+            get, {self.worker_audio_url: interrupted(), self.audio_url: [b"mp3"]}
+        )
+
+        self.assertEqual(
+            storage.fetch_worker_audio_data(self.audio_url, "opus"), (b"mp3", "mp3")
+        )
+
+    def test_skips_calls_without_worker_audio(self, get):
+        self.respond(get, {self.audio_url: [b"mp3"]})
+
+        self.assertEqual(
+            storage.fetch_worker_audio_data(self.audio_url), (b"mp3", "mp3")
+        )
+        get.assert_called_once()
+
+    @patch("app.utils.storage.convert_to_wav")
+    def test_fetch_audio_streams_to_file(self, convert_to_wav, get):
+        self.respond(get, {self.audio_url: [b"mp", b"3"]})
+
+        def convert(path):
+            with open(path, "rb") as file:
+                self.assertEqual(file.read(), b"mp3")
+            return "call.wav"
+
+        convert_to_wav.side_effect = convert
+
+        self.assertEqual(storage.fetch_audio(self.audio_url), "call.wav")
+        # The download is removed once it's converted
+        self.assertFalse(os.path.exists(convert_to_wav.call_args.args[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from app.utils.task_status import (
+    INDEXED,
+    QUEUED,
+    SUCCEEDED,
+    TaskStatusHub,
+    get_result_id,
+    send_status,
+)
+
+
+class TestGetResultId(unittest.TestCase):
+    def test_last_task_in_chain(self):
+        request = SimpleNamespace(
+            id="transcribe",
+            chain=[{"task": "post_transcribe", "options": {"task_id": "post"}}],
+        )
+
+        self.assertEqual(get_result_id(request), "post")
+
+    def test_task_outside_chain(self):
+        self.assertEqual(get_result_id(SimpleNamespace(id="post", chain=None)), "post")
+
+
+@patch.dict("app.utils.task_status.dispatchers", clear=True)
+@patch("app.utils.task_status.EventDispatcher")
+class TestSendStatus(unittest.TestCase):
+    def test_sends_event(self, EventDispatcher):
+        send_status(MagicMock(), "post", QUEUED)
+
+        EventDispatcher.return_value.send.assert_called_once_with(
+            "call-status",
+            retry=True,
+            retry_policy={"max_retries": 1},
+            uuid="post",
+            status=QUEUED,
+        )
+
+    def test_reuses_dispatcher(self, EventDispatcher):
+        app = MagicMock()
+
+        send_status(app, "post", QUEUED)
+        send_status(app, "post", INDEXED)
+
+        EventDispatcher.assert_called_once()
+        self.assertEqual(EventDispatcher.return_value.send.call_count, 2)
+
+    def test_never_raises(self, EventDispatcher):
+        EventDispatcher.return_value.send.side_effect = ConnectionError()
+
+        send_status(MagicMock(), "post", QUEUED)
+
+
+@patch.object(TaskStatusHub, "start", MagicMock())
+class TestTaskStatusHub(unittest.IsolatedAsyncioTestCase):
+    async def test_delivers_statuses(self):
+        hub = TaskStatusHub(MagicMock())
+        hub.publish({"task_id": "a", "status": QUEUED})
+
+        queue = hub.subscribe(["a", "b"])
+        self.assertEqual((await queue.get())["status"], QUEUED)
+
+        # Events come in on the receiver thread
+        thread = threading.Thread(
+            target=hub.publish, args=({"task_id": "b", "status": INDEXED},)
+        )
+        thread.start()
+        thread.join()
+        status = await asyncio.wait_for(queue.get(), timeout=1)
+        self.assertEqual(status, {"task_id": "b", "status": INDEXED})
+
+        hub.unsubscribe(["a", "b"], queue)
+        hub.publish({"task_id": "a", "status": SUCCEEDED})
+        await asyncio.sleep(0)
+        self.assertTrue(queue.empty())
+        self.assertEqual(hub.subscribers, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
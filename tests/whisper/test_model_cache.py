@@ -0,0 +1,69 @@
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+
+from app.whisper.model_cache import ModelCache, estimate_footprint
+
+
+class TestModelCache(unittest.TestCase):
+    def test_estimate_footprint(self):
+        self.assertEqual(estimate_footprint("whisper:small.en"), 2000)
+        self.assertEqual(estimate_footprint("faster-whisper:large-v3"), 5000)
+        self.assertEqual(estimate_footprint("faster-whisper:distil-large-v3"), 3000)
+        self.assertEqual(estimate_footprint("deepgram:nova-2"), 0)
+
+    def test_evicts_least_recently_used(self):
+        loader = Mock(side_effect=lambda implementation: Mock(name=implementation))
+        cache = ModelCache(loader, budget=7000)
+
+        small = cache.get("whisper:small.en")
+        cache.get("whisper:medium.en")
+        # Using the small model makes the medium model the least recently used
+        self.assertIs(cache.get("whisper:small.en"), small)
+        cache.get("faster-whisper:medium.en")
+
+        self.assertIn("whisper:small.en", cache)
+        self.assertNotIn("whisper:medium.en", cache)
+        self.assertIn("faster-whisper:medium.en", cache)
+        self.assertEqual((cache.hits, cache.loads, cache.evictions), (1, 3, 1))
+
+    def test_no_budget(self):
+        cache = ModelCache(Mock(), budget=0)
+
+        for model in ["tiny.en", "small.en", "medium.en", "large-v3"]:
+            cache.get(f"whisper:{model}")
+
+        self.assertEqual(cache.evictions, 0)
+
+    def test_concurrent_loads_are_collapsed(self):
+        def load(implementation):
+            time.sleep(0.05)
+            return Mock()
+
+        loader = Mock(side_effect=load)
+        cache = ModelCache(loader)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get("whisper:base")))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        loader.assert_called_once_with("whisper:base")
+        self.assertEqual(len(set(map(id, results))), 1)
+
+    def test_failed_load_releases_budget(self):
+        cache = ModelCache(Mock(side_effect=RuntimeError("CUDA out of memory")), 4000)
+
+        with self.assertRaises(RuntimeError):
+            cache.get("whisper:small.en")
+
+        self.assertEqual(cache.footprints, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
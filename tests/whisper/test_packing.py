@@ -0,0 +1,136 @@
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+from app.radio.digital import get_closest_src
+from app.utils.conversion import SAMPLE_RATE
+from app.whisper.base import TranscribeOptions, WhisperResult
+from app.whisper.packing import pack_calls, split_result
+from app.whisper.transcribe import transcribe_bulk
+
+OPTIONS: TranscribeOptions = {
+    "initial_prompt": "",
+    "cleanup": False,
+    "vad_filter": False,
+    "decode_options": {},
+    "cleanup_config": [],
+}
+
+
+def seconds(duration: float, value: float = 0.1):
+    return np.full(int(duration * SAMPLE_RATE), value, dtype=np.float32)
+
+
+class TestPackCalls(unittest.TestCase):
+    def test_packs_calls_into_windows(self):
+        packs = pack_calls(
+            [(0, seconds(5)), (1, seconds(20)), (2, seconds(8)), (3, seconds(12))],
+            max_duration=30,
+            gap=1,
+        )
+
+        self.assertEqual(
+            [[call["index"] for call in pack["calls"]] for pack in packs],
+            [[1, 2], [3, 0]],
+        )
+        self.assertEqual(len(packs[0]["audio"]), 29 * SAMPLE_RATE)
+        self.assertEqual(packs[0]["calls"][1]["start"], 21)
+        self.assertEqual(packs[1]["calls"][1]["duration"], 5)
+        # The gap between calls is silent
+        self.assertFalse(packs[0]["audio"][20 * SAMPLE_RATE : 21 * SAMPLE_RATE].any())
+
+    def test_long_call_gets_its_own_window(self):
+        packs = pack_calls([(0, seconds(45)), (1, seconds(3))], max_duration=30)
+
+        self.assertEqual(len(packs), 2)
+        self.assertEqual(len(packs[0]["audio"]), 45 * SAMPLE_RATE)
+
+
+class TestSplitResult(unittest.TestCase):
+    def test_rebases_segments(self):
+        packs = pack_calls([(0, seconds(6)), (1, seconds(4))], gap=1)
+        result: WhisperResult = {
+            "text": " Engine 96 on scene. Main message received.",
+            "segments": [
+                {"start": 0.5, "end": 2.5, "text": " Engine 96 on scene."},
+                {"start": 4.0, "end": 6.2, "text": " Command established."},
+                {"start": 7.1, "end": 9.0, "text": " Main message received."},
+            ],
+            "language": "en",
+        }
+
+        first, second = split_result(result, packs[0], gap=1)
+
+        self.assertEqual(first["text"], " Engine 96 on scene. Command established.")
+        self.assertEqual(first["segments"][1]["end"], 6)
+        self.assertEqual(second["text"], " Main message received.")
+        self.assertAlmostEqual(second["segments"][0]["start"], 0.1)
+        self.assertAlmostEqual(second["segments"][0]["end"], 2.0)
+
+        sources = [
+            {"src": 1410967, "pos": 0.0, "tag": "E96"},
+            {"src": 911005, "pos": 2.0, "tag": "Fire Main"},
+        ]
+        self.assertEqual(
+            get_closest_src(sources, second["segments"][0])["tag"],  # type: ignore[arg-type]
+            "E96",
+        )
+
+
+@patch.dict(os.environ, {"WHISPER_PACK_CALLS": "true"})
+class TestTranscribePacked(unittest.TestCase):
+    def transcribe_window(self, audio_files, options_list, language="en"):
+        # Pretend each call in the window was transcribed as one segment
+        results = []
+        for audio in audio_files:
+            if isinstance(audio, str):
+                self.assertTrue(os.path.exists(audio))
+                self.window_files.append(audio)
+                results.append({"text": "", "segments": [], "language": "en"})
+                continue
+            voiced = np.flatnonzero(np.diff(np.concatenate([[0], audio != 0, [0]])))
+            segments = [
+                {
+                    "start": start / SAMPLE_RATE,
+                    "end": end / SAMPLE_RATE,
+                    "text": f" {(end - start) // SAMPLE_RATE} seconds.",
+                }
+                for start, end in zip(voiced[::2], voiced[1::2])
+            ]
+            results.append({"text": "", "segments": segments, "language": "en"})
+        return results
+
+    def setUp(self):
+        self.window_files: list[str] = []
+        self.model = MagicMock(accepts_array=True)
+        self.model.transcribe_bulk.side_effect = self.transcribe_window
+
+    def test_transcribe_bulk(self):
+        results = transcribe_bulk(
+            self.model,
+            [seconds(5), seconds(3), seconds(8)],
+            [OPTIONS, OPTIONS, {**OPTIONS, "initial_prompt": "Engine 96"}],
+        )
+
+        # Calls with a different prompt can't share a window
+        self.assertEqual(len(self.model.transcribe_bulk.call_args.args[0]), 2)
+        self.assertEqual(
+            [result["text"] for result in results],  # type: ignore[index]
+            [" 5 seconds.", " 3 seconds.", " 8 seconds."],
+        )
+        self.assertEqual(results[1]["segments"][0]["start"], 0)  # type: ignore[index]
+        self.assertEqual(results[1]["segments"][0]["end"], 3)  # type: ignore[index]
+
+    def test_writes_windows_for_models_without_array_support(self):
+        self.model.accepts_array = False
+
+        transcribe_bulk(self.model, [seconds(5), seconds(3)], [OPTIONS, OPTIONS])
+
+        self.assertEqual(len(self.window_files), 1)
+        self.assertFalse(os.path.exists(self.window_files[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
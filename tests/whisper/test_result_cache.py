@@ -0,0 +1,108 @@
+import os
+import unittest
+from unittest.mock import Mock, patch
+
+import numpy as np
+
+from app.whisper.base import TranscribeOptions, WhisperResult
+from app.whisper.result_cache import MemoryStore, TranscriptionCache, get_result_cache
+from app.whisper.transcribe import transcribe
+
+
+class TestTranscriptionCache(unittest.TestCase):
+    def setUp(self):
+        self.audio = np.linspace(-0.5, 0.5, 16000, dtype=np.float32)
+        self.options: TranscribeOptions = {
+            "initial_prompt": "",
+            "cleanup": False,
+            "vad_filter": False,
+            "decode_options": {"beam_size": 5},
+            "cleanup_config": [],
+        }
+        self.result: WhisperResult = {
+            "text": "Engine 96 on scene",
+            "segments": [{"start": 0, "end": 1, "text": "Engine 96 on scene"}],
+            "language": "en",
+        }
+
+    def test_build_key_depends_on_audio_and_options(self):
+        key = TranscriptionCache.build_key(
+            self.audio, self.options, "whisper:small.en", "en"
+        )
+
+        self.assertEqual(
+            key,
+            TranscriptionCache.build_key(
+                self.audio.copy(), self.options, "whisper:small.en", "en"
+            ),
+        )
+        self.assertNotEqual(
+            key,
+            TranscriptionCache.build_key(
+                self.audio[1:], self.options, "whisper:small.en", "en"
+            ),
+        )
+        self.assertNotEqual(
+            key,
+            TranscriptionCache.build_key(
+                self.audio,
+                {**self.options, "decode_options": {"beam_size": 1}},
+                "whisper:small.en",
+                "en",
+            ),
+        )
+        self.assertNotEqual(
+            key,
+            TranscriptionCache.build_key(
+                self.audio, self.options, "faster-whisper:small.en", "en"
+            ),
+        )
+
+    def test_get_promotes_to_earlier_stores(self):
+        local = MemoryStore()
+        shared = MemoryStore()
+        shared.set("key", self.result)
+        cache = TranscriptionCache([local, shared])
+
+        self.assertEqual(cache.get("key"), self.result)
+        self.assertEqual(local.get("key"), self.result)
+        self.assertIsNone(cache.get("missing"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_disabled_by_default(self):
+        self.addCleanup(get_result_cache.cache_clear)
+        with patch.dict(os.environ, clear=True):
+            get_result_cache.cache_clear()
+            self.assertIsNone(get_result_cache())
+        with patch.dict(os.environ, {"TRANSCRIBE_CACHE": "memory"}):
+            get_result_cache.cache_clear()
+            cache = get_result_cache()
+            assert cache is not None
+            self.assertIsInstance(cache.stores[0], MemoryStore)
+
+    def test_memory_store_returns_copies(self):
+        store = MemoryStore()
+        store.set("key", self.result)
+
+        result = store.get("key")
+        assert result is not None
+        result["segments"].clear()
+
+        self.assertEqual(store.get("key"), self.result)
+
+    def test_transcribe_uses_cache(self):
+        model = Mock()
+        model.accepts_array = True
+        model.transcribe.return_value = self.result
+        cache = TranscriptionCache([MemoryStore()])
+
+        first = transcribe(model, self.audio, self.options, cache=cache)
+        second = transcribe(model, self.audio, self.options, cache=cache)
+
+        self.assertEqual(first, second)
+        model.transcribe.assert_called_once()
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
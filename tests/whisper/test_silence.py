@@ -0,0 +1,111 @@
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+from app.utils.conversion import SAMPLE_RATE, decode_audio, write_wav
+from app.whisper.base import TranscribeOptions
+from app.whisper.exceptions import WhisperException
+from app.whisper.silence import read_wav, trim_silence
+from app.whisper.transcribe import transcribe, transcribe_bulk
+
+OPTIONS: TranscribeOptions = {
+    "initial_prompt": "",
+    "cleanup": False,
+    "vad_filter": False,
+    "decode_options": {},
+    "cleanup_config": [],
+}
+
+
+class TestTrimSilence(unittest.TestCase):
+    audio_file = "tests/data/1-1673118015_477787500-call_1.wav"
+
+    def setUp(self):
+        with open(self.audio_file, "rb") as file:
+            self.speech = decode_audio(file.read())
+        rng = np.random.default_rng(0)
+        self.noise = (rng.standard_normal(SAMPLE_RATE * 3) * 0.05).astype(np.float32)
+
+    def test_trims_silent_edges(self):
+        silence = np.zeros(SAMPLE_RATE * 2, dtype=np.float32)
+        audio = np.concatenate([silence, self.speech, silence])
+
+        trimmed, offset = trim_silence(audio, padding=0.2)
+
+        self.assertAlmostEqual(offset, 1.8, delta=0.05)
+        self.assertLess(len(trimmed), len(self.speech) + SAMPLE_RATE)
+        self.assertGreaterEqual(len(trimmed), len(self.speech) * 0.9)
+
+    def test_trims_noise(self):
+        audio = np.concatenate([self.noise, self.speech])
+
+        _, offset = trim_silence(audio, padding=0)
+
+        self.assertAlmostEqual(offset, 3, delta=0.1)
+
+    def test_rejects_noise(self):
+        with self.assertRaises(WhisperException):
+            trim_silence(self.noise)
+        with self.assertRaises(WhisperException):
+            trim_silence(np.zeros(SAMPLE_RATE * 3, dtype=np.float32))
+
+    def test_read_wav(self):
+        audio_file = write_wav(self.speech)
+        try:
+            audio = read_wav(audio_file)
+            assert audio is not None
+            np.testing.assert_allclose(audio, self.speech, atol=1e-3)
+        finally:
+            os.remove(audio_file)
+
+
+@patch.dict(os.environ, {"SILENCE_TRIM": "true"})
+class TestTranscribeTrimmed(unittest.TestCase):
+    def setUp(self):
+        with open(TestTrimSilence.audio_file, "rb") as file:
+            speech = decode_audio(file.read())
+        self.audio = np.concatenate([np.zeros(SAMPLE_RATE * 2, np.float32), speech])
+        self.model = MagicMock(accepts_array=True)
+        self.model.transcribe.return_value = {
+            "text": "Engine 96 on scene",
+            "segments": [{"start": 0.5, "end": 2.0, "text": "Engine 96 on scene"}],
+            "language": "en",
+        }
+
+    def test_offsets_segments(self):
+        result = transcribe(self.model, self.audio, OPTIONS)
+
+        trimmed = self.model.transcribe.call_args.args[0]
+        offset = (len(self.audio) - len(trimmed)) / SAMPLE_RATE
+        self.assertGreater(offset, 1.5)
+        self.assertAlmostEqual(result["segments"][0]["start"], 0.5 + offset)
+        self.assertAlmostEqual(result["segments"][0]["end"], 2.0 + offset)
+
+    def test_rejects_file_without_speech(self):
+        audio_file = write_wav(np.zeros(SAMPLE_RATE * 3, dtype=np.float32))
+
+        with self.assertRaises(WhisperException):
+            transcribe(self.model, audio_file, OPTIONS)
+        self.model.transcribe.assert_not_called()
+        self.assertFalse(os.path.exists(audio_file))
+
+    def test_bulk_rejects_only_calls_without_speech(self):
+        self.model.transcribe_bulk.side_effect = lambda audio_files, *_, **__: [
+            self.model.transcribe.return_value for _ in audio_files
+        ]
+
+        results = transcribe_bulk(
+            self.model,
+            [np.zeros(SAMPLE_RATE * 3, dtype=np.float32), self.audio],
+            [OPTIONS, OPTIONS],
+        )
+
+        self.assertIsInstance(results[0], WhisperException)
+        self.assertNotIsInstance(results[1], WhisperException)
+        self.assertEqual(len(self.model.transcribe_bulk.call_args.args[0]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
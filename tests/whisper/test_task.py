@@ -0,0 +1,69 @@
+import os
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
+
+from app.whisper.task import WhisperTask
+
+
+class TestWhisperTask(unittest.TestCase):
+    def setUp(self):
+        WhisperTask._model_cache = None
+
+    def tearDown(self):
+        WhisperTask._model_cache = None
+
+    def test_preload_warms_up_local_models(self):
+        model = Mock()
+        model.accepts_array = False
+        task = WhisperTask()
+
+        with patch.object(WhisperTask, "initialize_model", return_value=model):
+            task.preload(["faster-whisper:small.en"])
+
+        self.assertIs(task.model("faster-whisper:small.en"), model)
+        model.transcribe.assert_called_once()
+        # Models that only read files get a temporary WAV, which is cleaned up afterwards
+        audio = model.transcribe.call_args.args[0]
+        self.assertIsInstance(audio, str)
+        self.assertFalse(os.path.exists(audio))
+
+    def test_preload_skips_warm_up_for_apis(self):
+        model = Mock()
+        task = WhisperTask()
+
+        with patch.object(WhisperTask, "initialize_model", return_value=model):
+            task.preload(["deepgram:nova-2"])
+
+        model.transcribe.assert_not_called()
+
+    def test_preload_skips_warm_up_for_remote_servers(self):
+        model = Mock()
+        task = WhisperTask()
+
+        with patch.object(WhisperTask, "initialize_model", return_value=model):
+            task.preload(["whisper-asr-api:large-v3"])
+
+        model.transcribe.assert_not_called()
+
+    @patch("app.whisper.whisper_asr_api.WhisperAsrApi")
+    def test_loads_different_implementations_at_once(self, whisper_asr_api):
+        # Each load only finishes once the other one has started
+        loading = threading.Barrier(2, timeout=5)
+        whisper_asr_api.side_effect = lambda **kwargs: loading.wait()
+        task = WhisperTask()
+
+        with ThreadPoolExecutor(2) as executor:
+            futures = [
+                executor.submit(task.model, f"whisper-asr-api:{model}")
+                for model in ["small", "large"]
+            ]
+            for future in futures:
+                future.result()
+
+        self.assertEqual(whisper_asr_api.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
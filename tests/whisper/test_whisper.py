@@ -1,11 +1,13 @@
 import unittest
 import csv
 import json
+import os
+from unittest.mock import patch
 from app.utils.cache import get_ttl_hash
 from app.whisper.config import get_transcript_cleanup_config
 from app.whisper.exceptions import WhisperException
 from app.models.transcript import RawTranscript
-from app.whisper.transcribe import WhisperResult, cleanup_transcript
+from app.whisper.transcribe import WhisperResult, cleanup_transcript, compact_result
 
 
 transcript_cleanup_config = get_transcript_cleanup_config(
@@ -74,5 +76,40 @@ class TestTranscript(unittest.TestCase):
             self.assertGreater(hallucination_count, edited_count)
 
 
+class TestCompactResult(unittest.TestCase):
+    def setUp(self):
+        self.result: WhisperResult = {
+            "text": "Engine 96 on scene",
+            "segments": [
+                {
+                    "start": 0,
+                    "end": 1.5,
+                    "text": "Engine 96 on scene",
+                    "tokens": [50364, 2469],
+                    "avg_logprob": -0.2,
+                }  # type: ignore[typeddict-unknown-key]
+            ],
+            "language": "en",
+        }
+
+    def test_compact_result(self):
+        self.assertEqual(
+            compact_result(self.result),
+            {
+                "text": "Engine 96 on scene",
+                "segments": [{"start": 0, "end": 1.5, "text": "Engine 96 on scene"}],
+                "language": "en",
+                "version": 1,
+            },
+        )
+
+    @patch.dict(os.environ, {"WHISPER_RESULT_FIELDS": "avg_logprob"})
+    def test_compact_result_with_fields(self):
+        self.assertEqual(
+            compact_result(self.result)["segments"][0],
+            {"start": 0, "end": 1.5, "text": "Engine 96 on scene", "avg_logprob": -0.2},
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from unittest.mock import Mock
+
+import pytest
+
+# Only installed in the whispers2t image
+pytest.importorskip("torch")
+pytest.importorskip("whisper_s2t")
+
+from app.whisper.whisper_s2t import WhisperS2T  # noqa: E402
+
+
+class TestWhisperS2T(unittest.TestCase):
+    def setUp(self):
+        # Skip loading a real model
+        self.whisper = WhisperS2T.__new__(WhisperS2T)
+        self.whisper.model = Mock()
+        output = [
+            [{"start_time": 0.0, "end_time": 1.5, "text": "Engine 1 responding"}],
+            [
+                {"start_time": 0.0, "end_time": 1.0, "text": "Medic 2"},
+                {"start_time": 1.0, "end_time": 2.0, "text": "copy"},
+            ],
+        ]
+        self.whisper.model.transcribe.return_value = output
+        self.whisper.model.transcribe_with_vad.return_value = output
+
+    def test_transcribe_bulk(self):
+        results = self.whisper.transcribe_bulk(
+            ["a.wav", "b.wav"],
+            [
+                {"vad_filter": False, "initial_prompt": "Engine"},  # type: ignore[typeddict-item]
+                {"vad_filter": False, "initial_prompt": "Medic"},  # type: ignore[typeddict-item]
+            ],
+        )
+
+        self.whisper.model.transcribe.assert_called_once_with(
+            ["a.wav", "b.wav"],
+            lang_codes=["en", "en"],
+            tasks=["transcribe", "transcribe"],
+            initial_prompts=["Engine", "Medic"],
+            batch_size=16,
+        )
+        self.whisper.model.transcribe_with_vad.assert_not_called()
+        self.assertEqual(
+            results,
+            [
+                {
+                    "segments": [
+                        {"start": 0.0, "end": 1.5, "text": "Engine 1 responding"}
+                    ],
+                    "text": "Engine 1 responding\n",
+                    "language": "en",
+                },
+                {
+                    "segments": [
+                        {"start": 0.0, "end": 1.0, "text": "Medic 2"},
+                        {"start": 1.0, "end": 2.0, "text": "copy"},
+                    ],
+                    "text": "Medic 2\ncopy\n",
+                    "language": "en",
+                },
+            ],
+        )
+
+    def test_transcribe_bulk_with_vad(self):
+        self.whisper.transcribe_bulk(
+            ["a.wav", "b.wav"],
+            [
+                {"vad_filter": True, "initial_prompt": ""},  # type: ignore[typeddict-item]
+                {"vad_filter": True, "initial_prompt": ""},  # type: ignore[typeddict-item]
+            ],
+        )
+
+        self.whisper.model.transcribe_with_vad.assert_called_once()
+        self.whisper.model.transcribe.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()